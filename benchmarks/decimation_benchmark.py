@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Frame-rate decimation benchmark.
+Decodes a file source through cumulative copies of the SOURCE_PIPELINE stages
+(decode, +videoscale, +videoconvert) in four variants and reports the process CPU
+time of each run, so the per-stage saving of each option can be reproduced:
+  full       - neither option
+  videorate  - drop-only decimation to --fps after the decoder (inference_fps)
+  skip-frame - decoder skips non-reference frames (decoder_skip_frame)
+  both       - both options
+With --output the per-stage table is also written as JSON, to be kept with the
+hardware it was measured on.
+
+Usage:
+    python benchmarks/decimation_benchmark.py --input resources/example.mp4 --fps 8
+    python benchmarks/decimation_benchmark.py --fps 8 --output decimation_rpi5.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from hailo_apps_infra1.gstreamer_helper_pipelines import VIDEORATE_PIPELINE
+
+STAGES = {
+    "decode": "",
+    "scale": "videoscale n-threads=2 ! video/x-raw, width=1280, height=720 ! ",
+    "convert": "videoscale n-threads=2 ! video/x-raw, width=1280, height=720 ! "
+               "videoconvert n-threads=3 ! video/x-raw, format=RGB ! ",
+}
+
+
+# Variant name: (decimate to --fps, decoder skip-frame)
+VARIANTS = {
+    "full": (False, False),
+    "videorate": (True, False),
+    "skip-frame": (False, True),
+    "both": (True, True),
+}
+
+
+def build_pipeline(input_path, stages, fps, skip_frame):
+    decoder_options = ' skip-frame=1' if skip_frame else ''
+    return (
+        f'filesrc location={input_path} ! qtdemux ! h264parse ! '
+        f'avdec_h264 max-threads=1{decoder_options} ! '
+        f'{VIDEORATE_PIPELINE("bench_videorate", fps)}'
+        f'{stages}'
+        f'fakesink name=sink sync=false signal-handoffs=true'
+    )
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_once(pipeline_string):
+    pipeline = Gst.parse_launch(pipeline_string)
+    frames = 0
+
+    def on_handoff(*args):
+        nonlocal frames
+        frames += 1
+
+    pipeline.get_by_name("sink").connect("handoff", on_handoff)
+    start_cpu, start_wall = cpu_seconds(), time.monotonic()
+    pipeline.set_state(Gst.State.PLAYING)
+    message = pipeline.get_bus().timed_pop_filtered(Gst.CLOCK_TIME_NONE, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    cpu, wall = cpu_seconds() - start_cpu, time.monotonic() - start_wall
+    pipeline.set_state(Gst.State.NULL)
+    if message.type == Gst.MessageType.ERROR:
+        err, debug = message.parse_error()
+        raise RuntimeError(f"{err}: {debug}")
+    return cpu, wall, frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame-rate decimation CPU benchmark")
+    parser.add_argument("--input", default=os.path.join(os.path.dirname(__file__), '../resources/example.mp4'),
+                        help="H.264 MP4 file to decode")
+    parser.add_argument("--fps", type=int, default=8, help="Decimated inference frame rate")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant (best run is reported)")
+    parser.add_argument("--output", default=None, help="Also write the per-stage CPU seconds to this JSON file")
+    args = parser.parse_args()
+
+    Gst.init(None)
+    print(f"{'stages':<10} {'variant':<11} {'frames':>8} {'cpu_s':>8} {'wall_s':>8}")
+    results = {}
+    for stage_name, stages in STAGES.items():
+        for variant, (decimate, skip_frame) in VARIANTS.items():
+            pipeline_string = build_pipeline(args.input, stages, args.fps if decimate else None, skip_frame)
+            runs = [run_once(pipeline_string) for _ in range(args.repeat)]
+            cpu, wall, frames = min(runs)
+            results[(stage_name, variant)] = cpu
+            print(f"{stage_name:<10} {variant:<11} {frames:>8} {cpu:>8.2f} {wall:>8.2f}")
+
+    print(f"\nPer-stage CPU seconds (cumulative difference), saving against full, decimation to {args.fps} fps:")
+    per_stage = {}
+    previous = None
+    for stage_name in STAGES:
+        stage_cpu = {
+            variant: results[(stage_name, variant)] - (results[(previous, variant)] if previous else 0.0)
+            for variant in VARIANTS
+        }
+        per_stage[stage_name] = stage_cpu
+        full = stage_cpu["full"]
+        columns = "  ".join(
+            f"{variant}={cpu:6.2f} ({100.0 * (1.0 - cpu / full) if full > 0 else 0.0:5.1f}%)"
+            for variant, cpu in stage_cpu.items() if variant != "full")
+        print(f"  {stage_name:<10} full={full:6.2f}  {columns}")
+        previous = stage_name
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "machine": platform.machine(),
+                "platform": platform.platform(),
+                "gstreamer": Gst.version_string(),
+                "input": os.path.basename(args.input),
+                "fps": args.fps,
+                "repeat": args.repeat,
+                "per_stage_cpu_seconds": per_stage,
+            }, f, indent=4)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Count payload encoding benchmark.
+Builds the count events of a simulated site (count_full, count_delta, count_summary and
+initial_data) and reports payload size and serialization time for JSON, as Socket.IO sends it,
+and for PayloadCodec's msgpack encoding with interned names.
+
+Usage:
+    python benchmarks/payload_encoding_benchmark.py --cameras 4 --zones 3 --history 500
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from payload_codec import PayloadCodec, ENCODING_MSGPACK, msgpack
+
+
+def build_payloads(cameras, zones, history):
+    data = {
+        f"camera{c + 1}": {"zones": {
+            f"zone{z + 1}": {
+                "top_left": [100, 200], "bottom_right": [900, 1000],
+                "in_count": 1234, "out_count": 1200, "inside_ids": [17, 23, 42],
+                "history": [
+                    {"id": i, "action": "Entered" if i % 2 else "Exited", "time": "2024-05-01 12:34:56"}
+                    for i in range(history)
+                ],
+            }
+            for z in range(zones)
+        }}
+        for c in range(cameras)
+    }
+    delta = {"cameras": {"camera1": {"version": 42, "previous": 41, "zones": {
+        "zone1": {"in_count": 1235, "inside_ids": [17, 23, 42, 51], "occupancy": 4,
+                  "events": [{"id": 51, "action": "Entered", "time": "2024-05-01 12:35:01"}]},
+    }}}}
+    summary = {"cameras": {
+        camera_id: {zone: {"in_count": z["in_count"], "out_count": z["out_count"], "occupancy": len(z["inside_ids"])}
+                    for zone, z in camera["zones"].items()}
+        for camera_id, camera in data.items()
+    }}
+    return {
+        "count_delta": delta,
+        "count_summary": summary,
+        "count_full": {"cameras": {c: {"version": 42, "zones": d["zones"]} for c, d in data.items()},
+                       "active_camera": "camera1"},
+        "initial_data": {"data": data, "active_camera": "camera1", "cameras": list(data)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON and msgpack count payloads")
+    parser.add_argument("--cameras", type=int, default=4, help="Number of cameras")
+    parser.add_argument("--zones", type=int, default=3, help="Zones per camera")
+    parser.add_argument("--history", type=int, default=200, help="History events per zone")
+    parser.add_argument("--repeat", type=int, default=200, help="Serializations timed per payload")
+    args = parser.parse_args()
+
+    if msgpack is None:
+        sys.exit("msgpack is not installed (pip install msgpack)")
+
+    codec = PayloadCodec()
+    print(f"{'event':<14} {'json bytes':>11} {'msgpack bytes':>14} {'ratio':>6} {'json ms':>8} {'msgpack ms':>11}")
+    for event, payload in build_payloads(args.cameras, args.zones, args.history).items():
+        codec.encode(payload, ENCODING_MSGPACK)  # intern the names first, as a running server has
+        json_bytes = len(json.dumps(payload, separators=(",", ":")).encode())
+        packed_bytes = len(codec.encode(payload, ENCODING_MSGPACK))
+        json_ms = 1000 * timeit.timeit(lambda: json.dumps(payload, separators=(",", ":")), number=args.repeat) / args.repeat
+        packed_ms = 1000 * timeit.timeit(lambda: codec.encode(payload, ENCODING_MSGPACK), number=args.repeat) / args.repeat
+        print(f"{event:<14} {json_bytes:>11} {packed_bytes:>14} {packed_bytes / json_bytes:>6.2f} "
+              f"{json_ms:>8.3f} {packed_ms:>11.3f}")
+    print(f"name table: {codec.names.version} names")
+
+
+if __name__ == "__main__":
+    main()
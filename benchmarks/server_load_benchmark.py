@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Server mode load benchmark.
+Serves the web routes with simulated cameras in a child process per server mode (threading and
+gevent). As GStreamer does, plain threads publish the frames. The benchmark then opens N
+concurrent MJPEG viewers while pollers request /get_counts and /get_snapshot. For each mode and
+viewer count it reports:
+  - how many viewers were served
+  - frames per second per viewer
+  - p50/p99 latency of the polled requests
+  - errors
+  - CPU use and OS threads of the server process
+
+Usage:
+    python benchmarks/server_load_benchmark.py --viewers 10,50,100,200 --duration 20
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO_ROOT)
+
+
+class SimulatedCounts:
+    """Stands in for MultiSourceZoneVisitorCounter: versioned zones whose counts change as frames arrive."""
+
+    def __init__(self, cameras, zones=3):
+        self.data = {
+            f"camera{c + 1}": {"zones": {
+                f"zone{z + 1}": {"top_left": [0, 0], "bottom_right": [100, 100], "in_count": 0,
+                                 "out_count": 0, "inside_ids": [], "history": []}
+                for z in range(zones)
+            }}
+            for c in range(cameras)
+        }
+        self.active_camera = "camera1"
+        self.zones_version = 0
+        self.count_versions = {}
+
+    def get_version(self, camera_id=None):
+        if camera_id is not None:
+            return self.zones_version, self.count_versions.get(camera_id, 0)
+        return self.zones_version, sum(self.count_versions.values())
+
+    def set_active_camera(self, camera_id):
+        self.active_camera = camera_id
+        return True
+
+    def get_snapshot(self):
+        return self.data
+
+    def step(self, camera_id, frame):
+        # Copy-on-write like the real counter: changed zones and their histories are copied
+        event = {"id": frame, "action": "Entered", "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+        zones = {zone: dict(zone_data, in_count=zone_data["in_count"] + 1, history=zone_data["history"] + [event])
+                 for zone, zone_data in self.data[camera_id]["zones"].items()}
+        self.data = dict(self.data, **{camera_id: {"zones": zones}})
+        self.count_versions[camera_id] = self.count_versions.get(camera_id, 0) + 1
+
+
+class SimulatedPipeline:
+    """The parts of PipelineManager the routes read."""
+
+    def __init__(self, cameras):
+        self.video_sources = [f"rtsp://simulated/{c + 1}" for c in range(cameras)]
+        self.count_broadcaster = None
+
+    def is_running(self):
+        return True
+
+    def get_source_status(self):
+        return {}
+
+    def get_latency_stats(self):
+        return {"cameras": {}, "profiles": {}}
+
+    def get_queue_levels(self):
+        return {}
+
+
+def serve(args):
+    """Child process: run the routes in one server mode with simulated cameras."""
+    from server_mode import patch_for_server_mode
+    patch_for_server_mode(args.serve)
+
+    import numpy as np
+    from flask import Flask
+    from server_mode import create_socketio, run_server
+    from frame_hub import FrameHub
+    from jpeg_encoder import JpegEncoder
+    from video_stream import VideoStreamManager
+    from history_index import HistoryIndex
+    from web_routes import register_routes
+
+    app = Flask(__name__)
+    socketio = create_socketio(app)
+    user_data = SimulatedCounts(args.cameras)
+    frame_buffers = {}
+    frame_hub = FrameHub(JpegEncoder())
+    video_stream_manager = VideoStreamManager(frame_buffers, user_data, frame_hub=frame_hub)
+    register_routes(app, user_data, SimulatedPipeline(args.cameras), video_stream_manager,
+                    history_index=HistoryIndex(user_data))
+
+    base = np.zeros((720, 1280, 3), np.uint8)
+    base[:, :, 0] = np.linspace(0, 255, 1280, dtype=np.uint8)
+    base[:, :, 1] = np.linspace(0, 255, 720, dtype=np.uint8)[:, None]
+
+    def publish(camera_id):
+        # A plain OS thread, like GStreamer's streaming threads
+        frame_number = 0
+        while True:
+            frame_number += 1
+            frame = np.roll(base, 8 * frame_number, axis=1)
+            frame_buffers[camera_id] = frame
+            frame_hub.publish(camera_id, frame)
+            if frame_number % 10 == 0:
+                user_data.step(camera_id, frame_number)
+            time.sleep(1.0 / args.fps)
+
+    for camera_id in user_data.data:
+        threading.Thread(target=publish, args=(camera_id,), daemon=True).start()
+    run_server(socketio, app, "127.0.0.1", args.port)
+
+
+def read_process_stats(pid):
+    """Return (CPU seconds, OS threads) of a process from /proc, or (None, None)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK"), int(fields[17])
+    except (OSError, IndexError, ValueError):
+        return None, None
+
+
+def viewer(port, camera_id, stop, frames, index, errors):
+    import http.client
+    try:
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        connection.request("GET", f"/video_feed?camera_id={camera_id}&width=640&quality=70")
+        response = connection.getresponse()
+        tail = b""
+        while not stop.is_set():
+            chunk = response.read1(65536)
+            if not chunk:
+                break
+            data = tail + chunk
+            frames[index] += data.count(b"--frame\r\n")
+            tail = data[-9:]
+        connection.close()
+    except Exception:
+        errors.append(index)
+
+
+def poller(port, camera_ids, stop, latencies, errors):
+    import http.client
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    paths = [f"/get_counts?camera_id={camera_ids[0]}&history=false", f"/get_snapshot?camera_id={camera_ids[0]}&width=320",
+             "/get_zones"]
+    request_number = 0
+    while not stop.is_set():
+        path = paths[request_number % len(paths)]
+        request_number += 1
+        started = time.perf_counter()
+        try:
+            connection.request("GET", path)
+            connection.getresponse().read()
+            latencies.append(time.perf_counter() - started)
+        except Exception:
+            errors.append(path)
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        time.sleep(0.1)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else float("nan")
+
+
+def run_load(mode, pid, args, viewer_count):
+    camera_ids = [f"camera{c + 1}" for c in range(args.cameras)]
+    stop = threading.Event()
+    frames = [0] * viewer_count
+    viewer_errors, poll_errors, latencies = [], [], []
+    threads = [threading.Thread(target=viewer, args=(args.port, camera_ids[i % len(camera_ids)], stop, frames, i,
+                                                     viewer_errors), daemon=True)
+               for i in range(viewer_count)]
+    threads += [threading.Thread(target=poller, args=(args.port, camera_ids, stop, latencies, poll_errors), daemon=True)
+                for _ in range(args.pollers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    frames_start = list(frames)
+    del latencies[:]
+    cpu_start, _ = read_process_stats(pid)
+    time.sleep(args.duration)
+    cpu_end, os_threads = read_process_stats(pid)
+    rates = sorted((end - start) / args.duration for start, end in zip(frames_start, frames))
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    latencies.sort()
+    served = sum(1 for rate in rates if rate > 0)
+    cpu = f"{100 * (cpu_end - cpu_start) / args.duration:.0f}%" if cpu_start is not None else "n/a"
+    print(f"{mode:>9} {viewer_count:>7} {served:>7} {sum(rates) / len(rates):>9.1f} {rates[0]:>8.1f} "
+          f"{1000 * percentile(latencies, 0.5):>7.1f} {1000 * percentile(latencies, 0.99):>7.1f} "
+          f"{len(viewer_errors) + len(poll_errors):>6} {cpu:>6} {os_threads if os_threads is not None else 'n/a':>8}")
+    time.sleep(2)  # let the server drop the finished viewers
+
+
+def wait_until_serving(port, process, timeout=30.0):
+    import http.client
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            connection.request("GET", "/health")
+            if connection.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare server modes under concurrent MJPEG viewers")
+    parser.add_argument("--modes", default="threading,gevent", help="Comma separated server modes")
+    parser.add_argument("--viewers", default="10,50,100,200", help="Comma separated viewer counts")
+    parser.add_argument("--cameras", type=int, default=4, help="Number of simulated cameras")
+    parser.add_argument("--fps", type=float, default=15.0, help="Published frames per second per camera")
+    parser.add_argument("--pollers", type=int, default=4, help="Clients polling JSON and snapshot endpoints")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds per viewer count")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds before measuring")
+    parser.add_argument("--port", type=int, default=5098, help="Port of the benchmark server")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    print(f"{'mode':>9} {'viewers':>7} {'served':>7} {'fps mean':>9} {'fps min':>8} {'p50 ms':>7} {'p99 ms':>7} "
+          f"{'errors':>6} {'cpu':>6} {'threads':>8}")
+    for mode in args.modes.split(","):
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", mode, "--port", str(args.port),
+             "--cameras", str(args.cameras), "--fps", str(args.fps)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_until_serving(args.port, process):
+                print(f"{mode:>9} server did not start (is {mode} installed?)")
+                continue
+            for viewer_count in [int(count) for count in args.viewers.split(",")]:
+                run_load(mode, process.pid, args, viewer_count)
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
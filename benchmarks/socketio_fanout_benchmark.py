@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Socket.IO count fan-out benchmark.
+Runs the count broadcaster and the Socket.IO handlers in-process with simulated cameras whose
+counts change on every frame, connects N python-socketio clients and measures the server-side
+cost of each broadcast (time spent in CountBroadcaster.flush, which includes queueing the
+event for every recipient) and what the clients receive, in two modes:
+  all   - every client subscribes to every camera (what broadcasting to everyone costs)
+  rooms - every client subscribes to one camera, as script2.js does
+
+Usage:
+    python benchmarks/socketio_fanout_benchmark.py --clients 50 --cameras 4 --duration 20
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import socketio
+from flask import Flask
+from flask_socketio import SocketIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from count_broadcaster import CountBroadcaster
+from socketio_handlers import register_socketio_handlers
+
+
+class SimulatedCounts:
+    """Stands in for MultiSourceZoneVisitorCounter: zones whose counts change on every frame."""
+
+    def __init__(self, cameras, zones):
+        self.data = {
+            f"camera{c + 1}": {"zones": {
+                f"zone{z + 1}": {"top_left": [0, 0], "bottom_right": [100, 100], "in_count": 0,
+                                 "out_count": 0, "inside_ids": [], "history": []}
+                for z in range(zones)
+            }}
+            for c in range(cameras)
+        }
+        self.active_camera = "camera1"
+
+    def set_active_camera(self, camera_id):
+        self.active_camera = camera_id
+        return True
+
+    def get_snapshot(self):
+        return self.data
+
+    def step(self, camera_id, frame):
+        # Copy-on-write like the real counter: changed zones and their histories are copied
+        zones = {}
+        for zone, zone_data in self.data[camera_id]["zones"].items():
+            zone_data = zones[zone] = dict(zone_data, inside_ids=list(range(frame % 5)))
+            if frame % 10 == 0:
+                zone_data["in_count"] += 1
+                zone_data["history"] = zone_data["history"] + [{"id": frame, "action": "Entered", "time": "2024-01-01 00:00:00"}]
+        self.data = dict(self.data, **{camera_id: {"zones": zones}})
+
+
+def run(mode, args):
+    app = Flask(__name__)
+    server = SocketIO(app, async_mode="threading")
+    user_data = SimulatedCounts(args.cameras, args.zones)
+    broadcaster = CountBroadcaster(server, user_data, rate=args.rate)
+    register_socketio_handlers(server, user_data, count_broadcaster=broadcaster)
+
+    flush_times = []
+    flush = broadcaster.flush
+
+    def timed_flush():
+        started = time.perf_counter()
+        flush()
+        flush_times.append(time.perf_counter() - started)
+
+    broadcaster.flush = timed_flush
+    threading.Thread(target=server.run, args=(app,), kwargs={"port": args.port, "allow_unsafe_werkzeug": True},
+                     daemon=True).start()
+    time.sleep(1.0)
+
+    camera_ids = list(user_data.data)
+    received = {"messages": 0, "bytes": 0}
+    received_lock = threading.Lock()
+    clients = []
+    for index in range(args.clients):
+        client = socketio.Client()
+
+        @client.on("count_delta")
+        def on_delta(data):
+            with received_lock:
+                received["messages"] += 1
+                received["bytes"] += len(json.dumps(data))
+
+        client.connect(f"http://127.0.0.1:{args.port}")
+        subscription = camera_ids if mode == "all" else [camera_ids[index % len(camera_ids)]]
+        client.emit("subscribe", {"camera_ids": subscription})
+        clients.append(client)
+
+    broadcaster.start()
+    cpu_start = resource.getrusage(resource.RUSAGE_SELF)
+    stop = time.monotonic() + args.duration
+    frame = 0
+    while time.monotonic() < stop:
+        frame += 1
+        for camera_id in camera_ids:
+            user_data.step(camera_id, frame)
+            broadcaster.mark_dirty(camera_id)
+        time.sleep(1.0 / args.fps)
+    cpu_end = resource.getrusage(resource.RUSAGE_SELF)
+
+    for client in clients:
+        client.disconnect()
+    times = sorted(flush_times) or [0.0]
+    cpu = (cpu_end.ru_utime - cpu_start.ru_utime) + (cpu_end.ru_stime - cpu_start.ru_stime)
+    print(f"{mode:>5}: {args.clients} clients, {len(flush_times)} flushes, "
+          f"flush mean/p95 {1000 * sum(times) / len(times):.2f}/{1000 * times[int(0.95 * (len(times) - 1))]:.2f} ms, "
+          f"{received['messages'] / args.clients / args.duration:.1f} msg/s and "
+          f"{received['bytes'] / args.clients / args.duration / 1024:.1f} KiB/s per client, "
+          f"process CPU {100 * cpu / args.duration:.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Socket.IO count fan-out with and without per-camera rooms")
+    parser.add_argument("--clients", type=int, default=50, help="Number of simulated clients")
+    parser.add_argument("--cameras", type=int, default=4, help="Number of simulated cameras")
+    parser.add_argument("--zones", type=int, default=3, help="Zones per camera")
+    parser.add_argument("--fps", type=float, default=25.0, help="Simulated frames per second per camera")
+    parser.add_argument("--rate", type=float, default=4.0, help="Broadcaster rate (COUNT_UPDATE_RATE)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per mode")
+    parser.add_argument("--port", type=int, default=5099, help="Base port of the in-process servers")
+    parser.add_argument("--mode", choices=["all", "rooms", "both"], default="both")
+    args = parser.parse_args()
+
+    modes = ["all", "rooms"] if args.mode == "both" else [args.mode]
+    for index, mode in enumerate(modes):
+        args.port += index
+        run(mode, args)
+
+
+if __name__ == "__main__":
+    main()
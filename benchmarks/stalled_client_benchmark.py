@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Stalled video client benchmark.
+Serves the web routes with simulated cameras in a child process per server mode (as
+server_load_benchmark does), opens N /video_feed viewers that read the first bytes and then stop
+reading, and follows the server's open sockets in /proc until the stalled connections are dropped.
+Reports per mode how long the server took to disconnect them; STREAM_SLOW_CLIENT_TIMEOUT is the
+expected bound, "never" means stalled clients hold their connections (and in threading mode
+their threads) for good.
+
+Usage:
+    python benchmarks/stalled_client_benchmark.py --modes threading,gevent --stalled 5 --wait 30
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from config import STREAM_SLOW_CLIENT_TIMEOUT
+from server_load_benchmark import wait_until_serving
+from video_channel_benchmark import server_resources
+
+
+def open_stalled_viewer(port, camera_id):
+    """Request a video feed, read its first bytes and never read again."""
+    connection = socket.socket()
+    # A small receive buffer, so the server's writes block soon after the client stops reading
+    connection.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    connection.connect(("127.0.0.1", port))
+    connection.sendall(f"GET /video_feed?camera_id={camera_id} HTTP/1.1\r\nHost: benchmark\r\n\r\n".encode())
+    connection.recv(4096)
+    return connection
+
+
+def run_mode(mode, args):
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "server_load_benchmark.py"),
+         "--serve", mode, "--port", str(args.port), "--cameras", "1", "--fps", str(args.fps)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_until_serving(args.port, process):
+            print(f"{mode:>9} server did not start (is {mode} installed?)")
+            return
+        time.sleep(1.0)
+        _, baseline = server_resources(process.pid)
+        viewers = [open_stalled_viewer(args.port, "camera1") for _ in range(args.stalled)]
+        started = time.monotonic()
+        _, peak = server_resources(process.pid)
+        disconnected_after = None
+        while time.monotonic() - started < args.wait:
+            time.sleep(0.5)
+            _, sockets = server_resources(process.pid)
+            if sockets <= baseline:
+                disconnected_after = time.monotonic() - started
+                break
+        result = f"{disconnected_after:.1f}" if disconnected_after is not None else "never"
+        print(f"{mode:>9} {args.stalled:>7} {peak - baseline:>12} {result:>18}")
+        for viewer in viewers:
+            viewer.close()
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long stalled MJPEG viewers keep their connections")
+    parser.add_argument("--modes", default="threading,gevent", help="Comma separated server modes")
+    parser.add_argument("--stalled", type=int, default=5, help="Viewers that stop reading")
+    parser.add_argument("--fps", type=float, default=15.0, help="Published frames per second")
+    parser.add_argument("--wait", type=float, default=3 * STREAM_SLOW_CLIENT_TIMEOUT,
+                        help="Seconds to wait for the server to drop the stalled viewers")
+    parser.add_argument("--port", type=int, default=5097, help="Port of the benchmark server")
+    args = parser.parse_args()
+
+    print(f"slow client timeout {STREAM_SLOW_CLIENT_TIMEOUT:.1f}s")
+    print(f"{'mode':>9} {'stalled':>7} {'open sockets':>12} {'disconnected after':>18}")
+    for mode in args.modes.split(","):
+        run_mode(mode, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Zone state stress benchmark.
+Hammers one MultiSourceZoneVisitorCounter with concurrent writers and readers and reports
+throughput and reader errors:
+  writers - one thread per camera calling update_counts with simulated people walking across
+            the frame, plus one thread resetting and resizing zones through the HTTP-side methods
+  readers - threads serializing the snapshot (like save_data and the JSON endpoints), flushing
+            the CountBroadcaster and querying the HistoryIndex
+Readers use the published snapshots without locks, so any error they hit (e.g. "dictionary
+changed size during iteration") means a writer modified a published snapshot; errors are listed
+at the end and make the exit status non-zero. The data file is redirected to a temporary file.
+
+Usage:
+    python benchmarks/state_stress_benchmark.py --cameras 4 --zones 4 --readers 8 --duration 20
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import zone_counter
+from count_broadcaster import CountBroadcaster
+from history_index import HistoryIndex
+
+
+class NullSocketIO:
+    """Stands in for Flask-SocketIO: counts emits instead of sending them."""
+
+    def __init__(self):
+        self.emits = 0
+
+    def emit(self, event, *args, **kwargs):
+        self.emits += 1
+
+
+def zone_corners(zone_index, zones, width=1920, height=1080):
+    """Corners of the zone_index-th of zones side-by-side zones."""
+    zone_width = width // zones
+    return [zone_index * zone_width + 10, height // 4], [(zone_index + 1) * zone_width - 10, height * 3 // 4]
+
+
+def simulate_people(people, frame, width=1920, height=1080):
+    """Detections of people walking back and forth across the frame at different speeds."""
+    detected = set()
+    for person_id in range(people):
+        speed = 5 + person_id % 7
+        x = (frame * speed + person_id * 137) % (2 * width)
+        x = x if x < width else 2 * width - x
+        y = height // 4 + (person_id * 61) % (height // 2)
+        detected.add((person_id, x - 40, y - 150, x + 40, y))
+    return detected
+
+
+def run(args):
+    counter = zone_counter.MultiSourceZoneVisitorCounter()
+    camera_ids = [f"camera{c + 1}" for c in range(args.cameras)]
+    counter.reset_cameras(camera_ids)
+    for camera_id in camera_ids:
+        for z in range(args.zones):
+            counter.create_or_update_zone(camera_id, f"zone{z + 1}", *zone_corners(z, args.zones))
+    # Count quickly, so histories grow during the run
+    counter.min_dwell_time = 0.1
+    counter.exit_grace_time = 0.1
+
+    socketio = NullSocketIO()
+    broadcaster = CountBroadcaster(socketio, counter)
+    history_index = HistoryIndex(counter)
+    stop = threading.Event()
+    ops = Counter()
+    errors = Counter()
+    ops_lock = threading.Lock()
+
+    def record(kind, error=None):
+        with ops_lock:
+            ops[kind] += 1
+            if error is not None:
+                errors[f"{kind}: {type(error).__name__}: {error}"] += 1
+
+    def writer(camera_id):
+        frame = 0
+        while not stop.is_set():
+            counter.update_counts(camera_id, simulate_people(args.people, frame))
+            broadcaster.mark_dirty(camera_id)
+            frame += 1
+            record("update_counts")
+            if args.fps:
+                time.sleep(1.0 / args.fps)
+
+    def editor():
+        rng = random.Random(1)
+        while not stop.is_set():
+            camera_id = rng.choice(camera_ids)
+            z = rng.randrange(args.zones)
+            if rng.random() < 0.5:
+                counter.reset_zone_counts(camera_id, f"zone{z + 1}")
+            else:
+                top_left, bottom_right = zone_corners(z, args.zones)
+                bottom_right[1] -= rng.randrange(50)
+                counter.create_or_update_zone(camera_id, f"zone{z + 1}", top_left, bottom_right)
+            broadcaster.mark_dirty(camera_id)
+            record("zone_edit")
+            time.sleep(args.edit_interval)
+
+    def reader(index):
+        readers = (
+            ("serialize", lambda: json.dumps(counter.get_snapshot())),
+            ("flush", broadcaster.flush),
+            ("history_query", lambda: history_index.query(limit=50)),
+        )
+        kind, read = readers[index % len(readers)]
+        while not stop.is_set():
+            try:
+                read()
+                record(kind)
+            except Exception as e:
+                record(kind, e)
+            if args.read_interval:
+                time.sleep(args.read_interval)
+
+    threads = [threading.Thread(target=writer, args=(camera_id,), daemon=True) for camera_id in camera_ids]
+    threads.append(threading.Thread(target=editor, daemon=True))
+    threads.extend(threading.Thread(target=reader, args=(i,), daemon=True) for i in range(args.readers))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=5.0)
+    elapsed = time.perf_counter() - started
+
+    events = sum(len(zone_data["history"]) for camera_data in counter.get_snapshot().values()
+                 for zone_data in camera_data["zones"].values())
+    print(f"\n{args.cameras} cameras x {args.zones} zones, {args.people} people, {args.readers} readers, "
+          f"{elapsed:.1f} s")
+    for kind, count in sorted(ops.items()):
+        print(f"  {kind:<15} {count:>9} ops  {count / elapsed:>10.1f} ops/s")
+    print(f"  history events {events}, broadcaster emits {socketio.emits}, "
+          f"history reindexes {history_index.get_stats()['reindexed_zones']}")
+    if errors:
+        print(f"  {sum(errors.values())} reader errors:")
+        for error, count in errors.most_common():
+            print(f"    {count:>6} x {error}")
+    else:
+        print("  no reader errors")
+    return not errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress concurrent zone state writers and readers")
+    parser.add_argument("--cameras", type=int, default=4, help="Number of cameras, one writer each")
+    parser.add_argument("--zones", type=int, default=4, help="Zones per camera")
+    parser.add_argument("--people", type=int, default=20, help="Simulated people per camera")
+    parser.add_argument("--readers", type=int, default=6, help="Reader threads (serialize, flush, history query)")
+    parser.add_argument("--fps", type=float, default=0, help="Frames per second per writer (0 = as fast as possible)")
+    parser.add_argument("--read-interval", type=float, default=0.001,
+                        help="Seconds each reader sleeps between reads (0 = spin, which starves writers of the GIL)")
+    parser.add_argument("--edit-interval", type=float, default=0.05, help="Seconds between zone edits")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        zone_counter.HISTORY_FILE = os.path.join(directory, "state_stress.json")
+        success = run(args)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Video channel benchmark.
+Connects N viewers of one camera to a running server, first as multipart /video_feed
+clients and then as Socket.IO video channel subscribers, and reports the frames each
+viewer received together with the server's thread and open socket counts read from
+/proc, so the cost of both transports can be compared on the same machine.
+
+Usage:
+    python benchmarks/video_channel_benchmark.py --server-pid $(pgrep -f main.py) --clients 20
+"""
+
+import argparse
+import os
+import threading
+import time
+import requests
+import socketio
+
+
+def server_resources(pid):
+    """Return (threads, open sockets) of the server process."""
+    with open(f"/proc/{pid}/status") as status:
+        threads = next(int(line.split()[1]) for line in status if line.startswith("Threads:"))
+    fd_dir = f"/proc/{pid}/fd"
+    sockets = 0
+    for fd in os.listdir(fd_dir):
+        try:
+            sockets += os.readlink(os.path.join(fd_dir, fd)).startswith("socket:")
+        except OSError:
+            pass
+    return threads, sockets
+
+
+def mjpeg_viewer(url, stop, counts, index):
+    with requests.get(url, stream=True, timeout=10) as response:
+        for chunk in response.iter_content(chunk_size=65536):
+            counts[index] += chunk.count(b"--frame")
+            if stop.is_set():
+                return
+
+
+def socket_viewer(base_url, camera_id, options, stop, counts, index):
+    client = socketio.Client()
+
+    @client.on("video_frame")
+    def on_frame(frame):
+        counts[index] += 1
+        client.emit("video_ack", {"seq": frame["seq"]})
+
+    client.connect(base_url, transports=["websocket"])
+    client.emit("video_subscribe", {"camera_id": camera_id, **options})
+    stop.wait()
+    client.disconnect()
+
+
+def run(name, target, args_for, clients, duration, pid):
+    stop = threading.Event()
+    counts = [0] * clients
+    threads = [threading.Thread(target=target, args=(*args_for(index), stop, counts, index), daemon=True)
+               for index in range(clients)]
+    baseline = server_resources(pid)
+    for thread in threads:
+        thread.start()
+    time.sleep(duration / 2)
+    loaded = server_resources(pid)
+    time.sleep(duration / 2)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    fps = [count / duration for count in counts]
+    print(f"{name:>8}: {clients} clients, "
+          f"fps min/mean {min(fps):.1f}/{sum(fps) / len(fps):.1f}, "
+          f"server threads {baseline[0]} -> {loaded[0]}, sockets {baseline[1]} -> {loaded[1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare MJPEG and Socket.IO video channel viewers")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="Server base URL")
+    parser.add_argument("--server-pid", type=int, required=True, help="PID of the server process (for /proc stats)")
+    parser.add_argument("--camera", default="camera1", help="Camera to view")
+    parser.add_argument("--clients", type=int, default=10, help="Number of concurrent viewers")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per transport")
+    parser.add_argument("--width", type=int, help="Requested frame width")
+    parser.add_argument("--quality", type=int, help="Requested JPEG quality")
+    args = parser.parse_args()
+
+    options = {key: value for key, value in (("width", args.width), ("quality", args.quality)) if value is not None}
+    query = "".join(f"&{key}={value}" for key, value in options.items())
+    feed_url = f"{args.url}/video_feed?camera_id={args.camera}{query}"
+
+    run("mjpeg", mjpeg_viewer, lambda index: (feed_url,), args.clients, args.duration, args.server_pid)
+    time.sleep(2)  # let the server drop the finished feeds before measuring the next baseline
+    run("socketio", socket_viewer, lambda index: (args.url, args.camera, options),
+        args.clients, args.duration, args.server_pid)
+
+
+if __name__ == "__main__":
+    main()
@@ -51,15 +51,113 @@ def get_active_sources(filename=CONFIG_FILE):
     config = load_config(filename)
     return config.get("video_sources", [])
 
+def normalize_video_source(source):
+    """
+    Normalize a camera source entry.
+    An entry is either a plain URL (used for analysis and viewing) or a dict with
+    'url' (analysis substream), an optional 'view_url' (main stream, viewed on demand),
+    an optional 'inference_fps' (frames per second passed on to inference), an optional
+    'decoder_skip_frame' (RTSP decoders skip non-reference frames) and an optional
+    'latency_profile' (one of LATENCY_PROFILES).
+    """
+    if isinstance(source, str):
+        source = {"url": source}
+    if not isinstance(source, dict) or not source.get("url"):
+        raise ValueError(f"Invalid video source entry: {source!r}")
+
+    inference_fps = source.get("inference_fps", DEFAULT_INFERENCE_FPS)
+    if inference_fps is not None and (not isinstance(inference_fps, (int, float)) or inference_fps <= 0):
+        raise ValueError(f"Invalid inference_fps for {source['url']}: {inference_fps!r}")
+
+    decoder_skip_frame = source.get("decoder_skip_frame", DEFAULT_DECODER_SKIP_FRAME)
+    if not isinstance(decoder_skip_frame, bool):
+        raise ValueError(f"Invalid decoder_skip_frame for {source['url']}: {decoder_skip_frame!r}")
+
+    latency_profile = source.get("latency_profile") or DEFAULT_LATENCY_PROFILE
+    if latency_profile not in LATENCY_PROFILES:
+        raise ValueError(f"Unknown latency_profile for {source['url']}: {latency_profile!r} "
+                         f"(expected one of {', '.join(LATENCY_PROFILES)})")
+
+    return {
+        "url": source["url"],
+        "view_url": source.get("view_url") or None,
+        "inference_fps": inference_fps,
+        "decoder_skip_frame": decoder_skip_frame,
+        "latency_profile": latency_profile,
+    }
+
 
 # Model configurations
 MODEL_PATHS = {
     "yolov8s": "../resources/yolov8s_h8l.hef",
 }
 
+# (width, height) of the model input; None reads it from the HEF. The inference videoscale is only
+# left out when this size is known and the cropper already delivers it
+HEF_INPUT_SIZE = None
+
 # File paths
 HISTORY_FILE = "multisource1.json"
 
+# Default inference frame rate for cameras without 'inference_fps' (None = full camera rate)
+DEFAULT_INFERENCE_FPS = None
+
+# Default for cameras without 'decoder_skip_frame': let RTSP decoders skip non-reference frames.
+# Independent of inference_fps, so the two savings can be measured (and enabled) separately
+DEFAULT_DECODER_SKIP_FRAME = False
+
+# Latency profiles, selectable per camera with 'latency_profile'.
+# queues maps queue name patterns (matched within the camera's own branch, later patterns win)
+# to queue settings. Queues between hailocropper and hailoaggregator are never made leaky:
+# the aggregator needs every frame on both of its inputs.
+#   rtsp_latency: rtspsrc jitter buffer latency in ms
+#   rtsp_drop_on_latency: drop packets that arrive later than rtsp_latency
+#   pipeline_latency: pipeline latency in ms (the pipeline uses the largest of its cameras)
+LATENCY_PROFILES = {
+    # The settings the pipeline has always used
+    "balanced": {
+        "rtsp_latency": 200,
+        "rtsp_drop_on_latency": True,
+        "pipeline_latency": 300,
+        "queues": {},
+    },
+    # Count on the newest frame: drop stale frames before inference and display
+    "low-latency": {
+        "rtsp_latency": 50,
+        "rtsp_drop_on_latency": True,
+        "pipeline_latency": 100,
+        "queues": {
+            "src_*": {"leaky": "downstream", "max_size_buffers": 1},
+            "inference_wrapper_*_input_q": {"leaky": "downstream", "max_size_buffers": 1},
+            "*display*_q": {"leaky": "downstream", "max_size_buffers": 1},
+        },
+    },
+    # Keep the accelerator busy: deeper queues, nothing dropped inside the pipeline
+    "max-throughput": {
+        "rtsp_latency": 500,
+        "rtsp_drop_on_latency": True,
+        "pipeline_latency": 500,
+        "queues": {
+            "*": {"leaky": "no", "max_size_buffers": 8},
+            "*_bypass_q": {"leaky": "no", "max_size_buffers": 32},
+        },
+    },
+    # Recorded footage: never drop a frame, latency does not matter
+    "lossless-file": {
+        "rtsp_latency": 2000,
+        "rtsp_drop_on_latency": False,
+        "pipeline_latency": 2000,
+        "queues": {
+            "*": {"leaky": "no", "max_size_buffers": 30},
+            "*_bypass_q": {"leaky": "no", "max_size_buffers": 100},
+        },
+    },
+}
+DEFAULT_LATENCY_PROFILE = "balanced"
+
+# Number of glass-to-count latency samples kept per camera
+LATENCY_STATS_WINDOW = 300
+
 # Default frame dimensions
 DEFAULT_FRAME_HEIGHT = 1080
 DEFAULT_FRAME_WIDTH = 1920
@@ -80,15 +178,24 @@ DEFAULT_ZONE_CONFIG = {
 SERVER_HOST = "0.0.0.0"
 SERVER_PORT = 5000
 DEBUG_MODE = False
+SERVER_MODE = os.environ.get("COUNTER_SERVER_MODE", "threading")  # "threading" (Werkzeug) or "gevent"
+SERVER_THREADPOOL_SIZE = 8            # gevent mode: OS threads for blocking calls made from the event loop
 
 # CORS settings
 CORS_ALLOWED_ORIGINS = "*" #["http://localhost:3000"]
 
-# Socket.IO settings
-SOCKETIO_ASYNC_MODE = 'threading'
+# Socket.IO settings (the async mode follows SERVER_MODE)
+COUNT_UPDATE_RATE = 4.0               # count_delta broadcasts per second (changes in between are coalesced)
+COUNT_SUMMARY_INTERVAL = 2.0          # seconds between count_summary emits to the all-cameras summary room
+COUNT_STREAM_RATE = 1.0               # /api/stream/counts events per second unless a client asks for another
+COUNT_STREAM_BACKLOG = 256            # count broadcasts kept so reconnecting stream clients resume from Last-Event-ID
+COUNT_STREAM_HEARTBEAT = 15.0         # seconds between keep-alive comments on an idle count stream
 
 # Image encoding settings
 JPEG_QUALITY = 100
+JPEG_ENCODER_WORKERS = 0              # encoder threads, 0 = one per CPU core
+JPEG_ENCODER_TURBOJPEG = True         # use libjpeg-turbo (PyTurboJPEG) when installed, OpenCV otherwise
+JPEG_ENCODER_STATS_WINDOW = 300       # encodes per camera kept for latency/throughput statistics
 
 # Template file
 TEMPLATE_FILE = "index3.html"
@@ -98,4 +205,53 @@ DEBOUNCE_TIME = 2.0
 BOUNDARY_BUFFER = 20
 POSITION_HISTORY_SIZE=5
 
+# Source supervision settings
+SOURCE_RECONNECT_BASE_DELAY = 1.0     # seconds before the first reconnect attempt
+SOURCE_RECONNECT_MAX_DELAY = 60.0     # upper bound for the exponential backoff
+SOURCE_RECONNECT_JITTER = 0.2         # +/- fraction applied to every backoff delay
+SOURCE_RECONNECT_MAX_ATTEMPTS = 10    # consecutive failures before a source is marked failed (0 = retry forever)
+SOURCE_CONNECT_TIMEOUT = 20.0         # seconds to wait for the first buffer after (re)connecting
+SOURCE_STALL_TIMEOUT = 10.0           # seconds without buffers before a live source is restarted
+
+# Main (viewing) stream settings
+MAIN_STREAM_IDLE_TIMEOUT = 30.0       # seconds a main stream stays connected after its last viewer leaves
+MAIN_STREAM_SNAPSHOT_WAIT = 5.0       # seconds a snapshot waits for the main stream's first frame
+
+# Video feed settings
+STREAM_FRAME_WAIT_TIMEOUT = 1.0       # seconds a viewer waits for a new frame before a placeholder is sent
+STREAM_JPEG_QUALITY = 95              # JPEG quality of video feed frames unless a client asks for another
+STREAM_MIN_WIDTH = 160                # smallest width a client can request
+STREAM_WIDTH_STEP = 32                # requested widths are rounded to this step so clients share encodings
+STREAM_QUALITY_STEP = 5               # requested qualities are rounded to this step so clients share encodings
+STREAM_MAX_FPS = 30                   # upper bound for a client's max_fps
+STREAM_SLOW_CLIENT_TIMEOUT = 10.0     # seconds sending one frame may take before the client is disconnected
+
+# Mosaic (multi-camera wall view) settings
+MOSAIC_TILE_WIDTH = 480               # width of one camera tile in pixels (tiles are 16:9)
+MOSAIC_INTERVAL = 0.5                 # default seconds between mosaic compositions
+MOSAIC_MIN_INTERVAL = 0.1             # shortest composition interval a client can request
+MOSAIC_MAX_INTERVAL = 10.0            # longest composition interval a client can request
+MOSAIC_INTERVAL_STEP = 0.1            # requested intervals are rounded to this step so clients share mosaics
+
+# Socket.IO video channel settings
+VIDEO_CHANNEL_WINDOW = 2              # frames a client may have unacknowledged before it skips frames
+VIDEO_CHANNEL_MAX_WINDOW = 8          # largest window a client can request
+
+# H.264 HLS preview settings
+PREVIEW_WIDTH = 640                   # width of the preview in pixels (height keeps the aspect ratio)
+PREVIEW_FPS = 10                      # frames per second fed to the preview encoder
+PREVIEW_BITRATE = 400                 # x264enc bitrate in kbit/s
+PREVIEW_SEGMENT_DURATION = 2.0        # target seconds per HLS segment (segments start at keyframes)
+PREVIEW_RING_SEGMENTS = 6             # segments kept in memory per camera
+PREVIEW_IDLE_TIMEOUT = 30.0           # seconds without playlist or segment requests before the encoder stops
+PREVIEW_START_WAIT = 8.0              # seconds a playlist request waits for the first segment
+
+# History API settings
+HISTORY_PAGE_SIZE = 100               # events per /api/history page unless a client asks for another
+HISTORY_MAX_PAGE_SIZE = 1000          # largest page a client can request
+
+# Conditional (ETag) response settings
+RESPONSE_CACHE_SIZE = 64              # serialized JSON bodies kept for unchanged zone/count endpoint responses
 
+# Pipeline job settings
+PIPELINE_JOB_HISTORY = 20             # finished start/stop/restart jobs kept for /api/jobs
@@ -0,0 +1,312 @@
+"""
+Count update broadcaster module.
+Coalesces zone count changes of all cameras and emits them to Socket.IO clients at a fixed rate,
+as per-zone deltas (changed counts, occupancy and the history events added since the last
+update) instead of the complete zone data on every frame. Every camera has a version number;
+a client that missed an update asks for a full resync.
+Deltas go to the camera's room only; overview clients can join a summary room that gets the
+counts of all cameras at a lower rate.
+Every broadcast that changes counts or occupancy also gets a sequence number and is kept in a
+short backlog of count-only updates, which the Server-Sent Events stream (count_stream) reads.
+"""
+
+import threading
+import time
+import uuid
+from collections import deque
+from config import COUNT_UPDATE_RATE, COUNT_SUMMARY_INTERVAL, COUNT_STREAM_BACKLOG
+
+# Room of the clients that want the low-rate all-cameras summary
+SUMMARY_ROOM = "summary"
+
+
+def get_camera_room(camera_id):
+    """Socket.IO room of the clients subscribed to a camera's count and zone events."""
+    return f"camera:{camera_id}"
+
+
+def _zone_state(zone_data, history):
+    """The part of a zone that is tracked for deltas."""
+    return {
+        "in_count": zone_data.get("in_count", 0),
+        "out_count": zone_data.get("out_count", 0),
+        "inside_ids": list(zone_data.get("inside_ids", [])),
+        "history_length": len(history),
+        # Compared by identity: a later history of the same zone holds the same event objects
+        "last_event": history[-1] if history else None,
+        "top_left": list(zone_data.get("top_left", [])),
+        "bottom_right": list(zone_data.get("bottom_right", [])),
+    }
+
+
+def _continues(previous, history):
+    """Whether history starts with the events of the state at the last broadcast."""
+    length = previous["history_length"]
+    return len(history) >= length and (length == 0 or history[length - 1] is previous["last_event"])
+
+
+def zone_counts(zone_data):
+    """Counts and occupancy of a zone, without history or coordinates."""
+    return {
+        "in_count": zone_data.get("in_count", 0),
+        "out_count": zone_data.get("out_count", 0),
+        "occupancy": len(zone_data.get("inside_ids", [])),
+    }
+
+
+def compute_zone_delta(previous, zone_data):
+    """
+    Compute the delta of one zone against its last broadcast state.
+
+    Args:
+        previous: State from _zone_state at the last broadcast, None for a new zone
+        zone_data: Current zone data
+
+    Returns:
+        Tuple of (delta dict or None if unchanged, new state)
+    """
+    history = zone_data.get("history", [])
+    state = _zone_state(zone_data, history)
+    # New zones, and zones whose history does not continue the broadcast one (reset or recreated zones),
+    # are sent in full
+    if previous is None or not _continues(previous, history):
+        return {"full": dict(zone_data, history=history[:state["history_length"]])}, state
+
+    delta = {}
+    for key in ("in_count", "out_count", "inside_ids", "top_left", "bottom_right"):
+        if state[key] != previous[key]:
+            delta[key] = state[key]
+    if "inside_ids" in delta:
+        delta["occupancy"] = len(state["inside_ids"])
+    if state["history_length"] > previous["history_length"]:
+        delta["events"] = history[previous["history_length"]:state["history_length"]]
+    return delta or None, state
+
+
+class CountBroadcaster:
+    """Emits coalesced per-camera zone deltas at COUNT_UPDATE_RATE to the cameras' rooms."""
+
+    def __init__(self, socketio, user_data, rate=COUNT_UPDATE_RATE, summary_interval=COUNT_SUMMARY_INTERVAL,
+                 codec=None, backlog=COUNT_STREAM_BACKLOG):
+        """
+        Args:
+            socketio: Flask-SocketIO instance
+            user_data: MultiSourceZoneVisitorCounter instance
+            rate: Broadcasts per second
+            summary_interval: Seconds between summary broadcasts
+            codec: Optional PayloadCodec; events are then emitted once per encoding in use
+            backlog: Number of count-only updates kept for stream clients resuming after a reconnect
+        """
+        self.socketio = socketio
+        self.user_data = user_data
+        self.codec = codec
+        self.interval = 1.0 / rate
+        self.summary_interval = summary_interval
+        self._last_summary = None
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._states = {}    # {camera_id: {zone: state at last broadcast}}
+        self._versions = {}  # {camera_id: version of the last broadcast}
+        self._snapshots = {} # {camera_id: zones dict the last broadcast was computed from (never modified)}
+        self._stats = {"updates": 0, "emits": 0, "summaries": 0, "full_resyncs": 0}
+        self._task = None
+        # Sequence numbers of a previous process are never resumed from
+        self.epoch = uuid.uuid4().hex[:8]
+        self._count_seq = 0
+        self._count_updates = deque(maxlen=backlog)  # (seq, {camera_id: {zone: counts or None if deleted}})
+
+    def start(self):
+        """Start the broadcast loop (once)."""
+        with self._lock:
+            if self._task is None:
+                self._task = self.socketio.start_background_task(self._broadcast_loop)
+
+    def mark_dirty(self, camera_id):
+        """Note that a camera's counts may have changed; cheap enough to call on every frame."""
+        # Under the lock, so the mark cannot land in the set flush has just taken
+        with self._lock:
+            self._dirty.add(camera_id)
+
+    def get_full_state(self, camera_ids=None):
+        """
+        Get the complete zone data of cameras together with the version it corresponds to.
+        Nothing is emitted: the zones are the snapshot the camera's last broadcast was computed
+        from, so the next count_delta applies on top of them. Cameras never broadcast yet get
+        their current zones; their first delta sends every zone in full.
+
+        Args:
+            camera_ids: Cameras to include, None for all
+
+        Returns:
+            Dict with 'cameras' {camera_id: {'version', 'zones'}} and 'active_camera'
+        """
+        data = self.user_data.get_snapshot()
+        with self._lock:
+            self._stats["full_resyncs"] += 1
+            cameras = {
+                camera_id: {
+                    "version": self._versions.get(camera_id, 0),
+                    "zones": self._snapshots.get(camera_id, camera_data["zones"]),
+                }
+                for camera_id, camera_data in data.items()
+                if camera_ids is None or camera_id in camera_ids
+            }
+        return {"cameras": cameras, "active_camera": self.user_data.active_camera}
+
+    def get_stats(self):
+        """Return update and resync counts, the current version of every camera and the clients per encoding."""
+        with self._lock:
+            stats = dict(self._stats, versions=dict(self._versions))
+        if self.codec:
+            stats["encodings"] = self.codec.get_stats()
+        return stats
+
+    def get_counts(self):
+        """
+        Get the counts and occupancy of every zone together with the sequence number they are current at.
+
+        Returns:
+            Tuple of (seq, {camera_id: {zone: {'in_count', 'out_count', 'occupancy'}}})
+        """
+        with self._lock:
+            seq = self._count_seq
+        # Read after the sequence number, so an update racing with this is resent rather than lost
+        return seq, self.get_summary()
+
+    def get_count_updates(self, since_seq):
+        """
+        Get the count changes broadcast after a sequence number, merged per zone.
+
+        Args:
+            since_seq: Sequence number the reader is current at
+
+        Returns:
+            Tuple of (seq, {camera_id: {zone: counts or None if deleted}}), or None if the backlog no
+            longer reaches back to since_seq and the reader needs the full counts (get_counts)
+        """
+        with self._lock:
+            seq = self._count_seq
+            if since_seq > seq:
+                return None
+            if since_seq == seq:
+                return seq, {}
+            if not self._count_updates or self._count_updates[0][0] > since_seq + 1:
+                return None
+            updates = [changes for update_seq, changes in self._count_updates if update_seq > since_seq]
+        merged = {}
+        for changes in updates:
+            for camera_id, zones in changes.items():
+                merged.setdefault(camera_id, {}).update(zones)
+        return seq, merged
+
+    def get_summary(self):
+        """
+        Get the counts and occupancy of every zone of every camera, without history.
+
+        Returns:
+            Dict of {camera_id: {zone: {'in_count', 'out_count', 'occupancy'}}}
+        """
+        return {
+            camera_id: {zone: zone_counts(zone_data) for zone, zone_data in list(camera_data["zones"].items())}
+            for camera_id, camera_data in list(self.user_data.data.items())
+        }
+
+    def flush(self):
+        """Compute the deltas of all dirty cameras and emit each to its camera's room."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            cameras = {}
+            for camera_id in dirty | (set(self._states) - set(self.user_data.data)):
+                delta = self._camera_delta(camera_id)
+                if delta is not None:
+                    cameras[camera_id] = delta
+            if cameras:
+                self._stats["updates"] += 1
+                self._stats["emits"] += len(cameras)
+                self._record_count_update(cameras)
+        for camera_id, delta in cameras.items():
+            self._emit("count_delta", {"cameras": {camera_id: delta}}, get_camera_room(camera_id))
+
+    def flush_summary(self):
+        """Emit count_summary to the summary room if any count or occupancy changed since the last one."""
+        try:
+            summary = self.get_summary()
+        except RuntimeError:
+            return  # zones changed while they were read; retry on the next interval
+        if summary == self._last_summary:
+            return
+        self._last_summary = summary
+        with self._lock:
+            self._stats["summaries"] += 1
+        self._emit("count_summary", {"cameras": summary}, SUMMARY_ROOM)
+
+    def _emit(self, event, payload, room):
+        if self.codec is None:
+            self.socketio.emit(event, payload, to=room)
+            return
+        for encoding in self.codec.get_active_encodings():
+            self.socketio.emit(event, self.codec.encode(payload, encoding), to=self.codec.get_room(room, encoding))
+
+    def _record_count_update(self, cameras):
+        # Count-only view of the deltas for the stream; zones whose counts and occupancy are unchanged are left out
+        changes = {}
+        for camera_id, delta in cameras.items():
+            states = self._states.get(camera_id, {})
+            for zone, zone_delta in delta["zones"].items():
+                if zone_delta is None:
+                    changes.setdefault(camera_id, {})[zone] = None
+                elif zone_delta.keys() & {"full", "in_count", "out_count", "inside_ids"}:
+                    state = states[zone]
+                    changes.setdefault(camera_id, {})[zone] = {
+                        "in_count": state["in_count"],
+                        "out_count": state["out_count"],
+                        "occupancy": len(state["inside_ids"]),
+                    }
+        if changes:
+            self._count_seq += 1
+            self._count_updates.append((self._count_seq, changes))
+
+    def _camera_delta(self, camera_id):
+        camera_data = self.user_data.data.get(camera_id)
+        previous_states = self._states.get(camera_id, {})
+        if camera_data is None:
+            if camera_id not in self._states:
+                return None
+            del self._states[camera_id]
+            self._snapshots.pop(camera_id, None)
+            zones = {zone: None for zone in previous_states}
+        else:
+            zones = {}
+            states = {}
+            try:
+                for zone, zone_data in list(camera_data["zones"].items()):
+                    delta, states[zone] = compute_zone_delta(previous_states.get(zone), zone_data)
+                    if delta is not None:
+                        zones[zone] = delta
+            except RuntimeError:
+                # The zone changed while it was read; retry on the next tick
+                self._dirty.add(camera_id)
+                return None
+            for zone in set(previous_states) - set(states):
+                zones[zone] = None  # deleted
+            self._states[camera_id] = states
+            self._snapshots[camera_id] = camera_data["zones"]
+        if not zones:
+            return None
+
+        previous_version = self._versions.get(camera_id, 0)
+        self._versions[camera_id] = previous_version + 1
+        return {"version": previous_version + 1, "previous": previous_version, "zones": zones}
+
+    def _broadcast_loop(self):
+        next_summary = time.monotonic()
+        while True:
+            started = time.monotonic()
+            try:
+                self.flush()
+                if started >= next_summary:
+                    next_summary = started + self.summary_interval
+                    self.flush_summary()
+            except Exception as e:
+                print(f"[ERROR] Failed to broadcast count updates: {e}")
+            self.socketio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
@@ -0,0 +1,141 @@
+"""
+Count stream module.
+Serves live zone counts and occupancy as Server-Sent Events for consumers that need neither a
+Socket.IO client nor the history (signage displays, dashboards). Streams read the count updates
+the CountBroadcaster already coalesces for Socket.IO, at a rate chosen per client, filtered by
+camera and zone. Event IDs carry the broadcaster's sequence number, so a client reconnecting with
+Last-Event-ID only receives what changed while it was away.
+"""
+
+import json
+import threading
+import time
+from flask import Response
+from config import COUNT_STREAM_RATE, COUNT_STREAM_HEARTBEAT, COUNT_UPDATE_RATE
+
+# Reconnect delay suggested to clients, in milliseconds
+RETRY_MS = 3000
+
+
+def format_event(data, event_id=None, event="counts"):
+    """Format one Server-Sent Event."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+class CountStreamManager:
+    """Server-Sent Events streams of zone counts fed by a CountBroadcaster."""
+
+    def __init__(self, count_broadcaster, heartbeat=COUNT_STREAM_HEARTBEAT):
+        """
+        Args:
+            count_broadcaster: CountBroadcaster whose count updates are streamed
+            heartbeat: Seconds between keep-alive comments while nothing changes
+        """
+        self.count_broadcaster = count_broadcaster
+        self.heartbeat = heartbeat
+        self._lock = threading.Lock()
+        self._stats = {"clients": 0, "connections": 0, "resumed": 0, "events": 0}
+
+    def get_event_id(self, seq):
+        return f"{self.count_broadcaster.epoch}-{seq}"
+
+    def parse_event_id(self, event_id):
+        """Sequence number of a Last-Event-ID of this process, None if it is missing or from another process."""
+        epoch, _, seq = (event_id or "").partition("-")
+        if epoch != self.count_broadcaster.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def generate_events(self, camera_ids=None, zones=None, rate=COUNT_STREAM_RATE, last_event_id=None):
+        """
+        Generate count events: the full counts first (unless resuming), then the changed zones at most
+        rate times per second. Deleted zones are sent as null.
+
+        Args:
+            camera_ids: Cameras to include, None for all
+            zones: Zone names to include, None for all
+            rate: Maximum events per second
+            last_event_id: Last-Event-ID header of a reconnecting client
+        """
+        interval = 1.0 / rate
+        seq = self.parse_event_id(last_event_id)
+        resumed = seq is not None and self.count_broadcaster.get_count_updates(seq) is not None
+        with self._lock:
+            self._stats["clients"] += 1
+            self._stats["connections"] += 1
+            self._stats["resumed"] += int(resumed)
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            if not resumed:
+                seq, counts = self._get_counts()
+                yield self._event(seq, self._filter(counts, camera_ids, zones), full=True)
+            last_sent = time.monotonic()
+            while True:
+                time.sleep(interval)
+                update = self.count_broadcaster.get_count_updates(seq)
+                if update is None:
+                    # The client fell behind the backlog; start over from the full counts
+                    seq, counts = self._get_counts()
+                    yield self._event(seq, self._filter(counts, camera_ids, zones), full=True)
+                    last_sent = time.monotonic()
+                    continue
+                seq, changes = update
+                changes = self._filter(changes, camera_ids, zones)
+                if changes:
+                    yield self._event(seq, changes, full=False)
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent >= self.heartbeat:
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+        finally:
+            with self._lock:
+                self._stats["clients"] -= 1
+
+    def get_stream_response(self, camera_ids=None, zones=None, rate=COUNT_STREAM_RATE, last_event_id=None):
+        """
+        Get the Flask Response of a count stream.
+
+        Raises:
+            ValueError: If the rate is not between 0 and COUNT_UPDATE_RATE
+        """
+        if not 0 < rate <= COUNT_UPDATE_RATE:
+            raise ValueError(f"rate must be greater than 0 and at most {COUNT_UPDATE_RATE}")
+        response = Response(self.generate_events(camera_ids, zones, rate, last_event_id),
+                            mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"  # keep reverse proxies from buffering the stream
+        return response
+
+    def get_stats(self):
+        """Return connected clients and the connection, resume and event counts."""
+        with self._lock:
+            return dict(self._stats)
+
+    def _get_counts(self):
+        try:
+            return self.count_broadcaster.get_counts()
+        except RuntimeError:
+            # Zones changed while they were read
+            return self.count_broadcaster.get_counts()
+
+    def _event(self, seq, cameras, full):
+        with self._lock:
+            self._stats["events"] += 1
+        return format_event({"full": full, "cameras": cameras}, self.get_event_id(seq))
+
+    @staticmethod
+    def _filter(cameras, camera_ids, zones):
+        filtered = {}
+        for camera_id, camera_zones in cameras.items():
+            if camera_ids is not None and camera_id not in camera_ids:
+                continue
+            if zones is not None:
+                camera_zones = {zone: counts for zone, counts in camera_zones.items() if zone in zones}
+            if camera_zones:
+                filtered[camera_id] = camera_zones
+        return filtered
@@ -0,0 +1,303 @@
+"""
+Frame hub module for broadcasting video frames to streaming clients.
+Every published frame gets a per-camera sequence number; viewers block until a newer
+sequence exists and share a single encoding of each frame per variant (width, quality, format),
+so N viewers of the same variant cost one encode. Frames are RGB.
+Publishers are GStreamer and worker threads; viewers on the gevent event loop (server mode gevent)
+wait on loop events and encode on worker threads, so they never block the loop.
+"""
+
+import threading
+import time
+import uuid
+from collections import namedtuple
+from jpeg_encoder import IMAGE_FORMATS, get_default_encoder
+from server_mode import in_server_loop, call_in_server_loop, call_blocking, create_loop_event
+from config import STREAM_JPEG_QUALITY, STREAM_MIN_WIDTH, STREAM_WIDTH_STEP, STREAM_QUALITY_STEP
+
+# Frame sources a camera can publish
+SOURCE_ANALYSIS = "analysis"
+SOURCE_MAIN = "main"
+
+# Encoding requested by a viewer; width None keeps the frame width
+StreamVariant = namedtuple('StreamVariant', ['width', 'quality', 'format'], defaults=("jpeg",))
+DEFAULT_VARIANT = StreamVariant(None, STREAM_JPEG_QUALITY)
+
+
+def variant_label(variant):
+    """Short text form of a variant, e.g. 'fullx95' or '640x60.webp'."""
+    label = f"{variant.width or 'full'}x{variant.quality}"
+    return label if variant.format == "jpeg" else f"{label}.{variant.format}"
+
+
+def make_variant(width=None, quality=None, image_format="jpeg"):
+    """
+    Build a StreamVariant from client parameters, rounded so similar requests share an encoding.
+
+    Args:
+        width: Requested frame width in pixels, or None for the full frame width
+        quality: Requested JPEG quality (1-100), or None for STREAM_JPEG_QUALITY
+        image_format: One of IMAGE_FORMATS
+
+    Returns:
+        StreamVariant
+
+    Raises:
+        ValueError: If width or quality is out of range, or the format is unknown
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(IMAGE_FORMATS)}")
+    if width is not None:
+        if width < STREAM_MIN_WIDTH:
+            raise ValueError(f"width must be at least {STREAM_MIN_WIDTH}")
+        width = int(round(width / STREAM_WIDTH_STEP)) * STREAM_WIDTH_STEP
+    if quality is None:
+        quality = STREAM_JPEG_QUALITY
+    elif not 1 <= quality <= 100:
+        raise ValueError("quality must be between 1 and 100")
+    else:
+        quality = max(STREAM_QUALITY_STEP, int(round(quality / STREAM_QUALITY_STEP)) * STREAM_QUALITY_STEP)
+    return StreamVariant(width, quality, image_format)
+
+
+def encode_frame(frame, variant=DEFAULT_VARIANT, encoder=None, camera_id=None):
+    """
+    Encode an RGB frame as JPEG (or the variant's format), downscaling it first if the variant asks for a smaller width.
+
+    Args:
+        frame: numpy array (RGB)
+        variant: StreamVariant to encode
+        encoder: JpegEncoder to use, None for the process-wide one
+        camera_id: Camera the encode is accounted to in the encoder statistics
+
+    Returns:
+        bytes
+    """
+    encoder = encoder or get_default_encoder()
+    return encoder.encode(frame, variant.width, variant.quality, variant.format, camera_id)
+
+
+class _Channel:
+    """Latest frame of one camera source, with its sequence number and cached encodings."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.encode_lock = threading.Lock()
+        self.frame = None
+        self.seq = 0
+        self.encodings = {}  # {StreamVariant: (seq, jpeg bytes)}
+        self.encodes = {}    # {StreamVariant: number of encodes}
+        self.loop_event = None  # set on the next publish, for viewers on the event loop
+
+
+class FrameHub:
+    """Per-camera broadcast hub: publishers push frames, viewers wait for newer sequence numbers."""
+
+    def __init__(self, encoder=None):
+        """
+        Args:
+            encoder: JpegEncoder used for every encode, None for the process-wide one
+        """
+        self.encoder = encoder or get_default_encoder()
+        self._lock = threading.Lock()
+        self._channels = {}  # {(camera_id, source): _Channel}
+        # Distinguishes sequence numbers of this process from those of an earlier run (used in ETags)
+        self.epoch = uuid.uuid4().hex[:8]
+
+    def _channel(self, camera_id, source):
+        """The channel of a camera source, created on first use; only publishers create channels."""
+        key = (camera_id, source)
+        with self._lock:
+            channel = self._channels.get(key)
+            if channel is None:
+                channel = self._channels[key] = _Channel()
+            return channel
+
+    def _find_channel(self, camera_id, source):
+        """The channel of a camera source, None if it never published (readers never create channels)."""
+        with self._lock:
+            return self._channels.get((camera_id, source))
+
+    def _wait_for_channel(self, camera_id, source, deadline):
+        """The channel of a camera source, polling for the first publish until the deadline (monotonic)."""
+        while True:
+            channel = self._find_channel(camera_id, source)
+            remaining = deadline - time.monotonic()
+            if channel is not None or remaining <= 0:
+                return channel
+            time.sleep(min(0.1, remaining))
+
+    def publish(self, camera_id, frame, source=SOURCE_ANALYSIS):
+        """
+        Publish a new frame and wake up every viewer waiting on the camera.
+        The frame must not be modified after publishing.
+
+        Returns:
+            int: Sequence number of the frame
+        """
+        channel = self._channel(camera_id, source)
+        with channel.condition:
+            channel.frame = frame
+            channel.seq += 1
+            channel.condition.notify_all()
+            seq = channel.seq
+            loop_event, channel.loop_event = channel.loop_event, None
+        if loop_event is not None:
+            call_in_server_loop(loop_event.set)
+        return seq
+
+    def has_frames(self, camera_id, source=SOURCE_ANALYSIS):
+        """Return True if the camera source has published at least one frame."""
+        channel = self._find_channel(camera_id, source)
+        return channel is not None and channel.frame is not None
+
+    def get_frame(self, camera_id, source=SOURCE_ANALYSIS):
+        """
+        Get the latest raw frame without waiting.
+
+        Returns:
+            Tuple of (seq, frame), (0, None) if nothing was published
+        """
+        channel = self._find_channel(camera_id, source)
+        if channel is None:
+            return 0, None
+        with channel.condition:
+            return channel.seq, channel.frame
+
+    def wait_for_frame(self, camera_id, last_seq=0, timeout=1.0, source=SOURCE_ANALYSIS, variant=DEFAULT_VARIANT):
+        """
+        Wait until a frame newer than last_seq exists and return its JPEG encoding.
+        Always returns the newest frame, so a slow viewer skips frames instead of falling behind.
+
+        Args:
+            camera_id: ID of the camera
+            last_seq: Sequence number of the last frame the viewer received
+            timeout: Seconds to wait for a newer frame
+            source: Frame source (SOURCE_ANALYSIS or SOURCE_MAIN)
+            variant: StreamVariant to encode
+
+        Returns:
+            Tuple of (seq, jpeg bytes), or (last_seq, None) on timeout
+        """
+        deadline = time.monotonic() + timeout
+        channel = self._wait_for_channel(camera_id, source, deadline)
+        if channel is None:
+            return last_seq, None
+        seq, frame = self._wait(channel, last_seq, deadline)
+        if frame is None:
+            return last_seq, None
+        encoded_seq, jpeg, _ = self._encode(camera_id, channel, seq, frame, variant)
+        return encoded_seq, jpeg
+
+    def wait_for_raw_frame(self, camera_id, last_seq=0, timeout=1.0, source=SOURCE_ANALYSIS):
+        """
+        Wait until a frame newer than last_seq exists and return it unencoded.
+
+        Returns:
+            Tuple of (seq, frame), or (last_seq, None) on timeout
+        """
+        deadline = time.monotonic() + timeout
+        channel = self._wait_for_channel(camera_id, source, deadline)
+        if channel is None:
+            return last_seq, None
+        return self._wait(channel, last_seq, deadline)
+
+    def _wait(self, channel, last_seq, deadline):
+        if in_server_loop():
+            return self._wait_on_loop(channel, last_seq, deadline)
+        with channel.condition:
+            if not channel.condition.wait_for(lambda: channel.seq > last_seq and channel.frame is not None,
+                                              max(0.0, deadline - time.monotonic())):
+                return last_seq, None
+            return channel.seq, channel.frame
+
+    def _wait_on_loop(self, channel, last_seq, deadline):
+        # The condition's lock is only held for a moment here, never waited on
+        while True:
+            with channel.condition:
+                if channel.seq > last_seq and channel.frame is not None:
+                    return channel.seq, channel.frame
+                if channel.loop_event is None:
+                    channel.loop_event = create_loop_event()
+                loop_event = channel.loop_event
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return last_seq, None
+            loop_event.wait(remaining)
+
+    def get_encoded(self, camera_id, source=SOURCE_ANALYSIS, variant=DEFAULT_VARIANT):
+        """
+        Get the JPEG encoding of the latest frame without waiting, encoding it only if no
+        viewer or earlier request has encoded this frame and variant yet.
+
+        Returns:
+            Tuple of (seq, jpeg bytes, cached: bool), (0, None, False) if there is no frame
+        """
+        channel = self._find_channel(camera_id, source)
+        if channel is None:
+            return 0, None, False
+        with channel.condition:
+            seq, frame = channel.seq, channel.frame
+        if frame is None:
+            return 0, None, False
+        return self._encode(camera_id, channel, seq, frame, variant)
+
+    def _encode(self, camera_id, channel, seq, frame, variant):
+        encoded_seq, jpeg = channel.encodings.get(variant, (0, None))
+        if encoded_seq >= seq and jpeg is not None:
+            return encoded_seq, jpeg, True
+        # Encoding (and waiting for another viewer's encode) blocks, which the event loop must not
+        return call_blocking(self._encode_once, camera_id, channel, seq, frame, variant)
+
+    def _encode_once(self, camera_id, channel, seq, frame, variant):
+        # Viewers of the same variant waiting on the same sequence number reuse the first viewer's encoding
+        with channel.encode_lock:
+            encoded_seq, jpeg = channel.encodings.get(variant, (0, None))
+            if encoded_seq >= seq and jpeg is not None:
+                return encoded_seq, jpeg, True
+            jpeg = encode_frame(frame, variant, self.encoder, camera_id)
+            channel.encodings[variant] = (seq, jpeg)
+            channel.encodes[variant] = channel.encodes.get(variant, 0) + 1
+            return seq, jpeg, False
+
+    def clear(self, camera_id=None, source=None):
+        """
+        Drop the frames of one camera (optionally only one of its sources), or of all cameras.
+        Sequence numbers keep counting so viewers never mistake an old frame for a new one.
+        """
+        with self._lock:
+            channels = [
+                channel for (channel_camera, channel_source), channel in self._channels.items()
+                if camera_id in (None, channel_camera) and source in (None, channel_source)
+            ]
+        for channel in channels:
+            with channel.condition:
+                channel.frame = None
+            with channel.encode_lock:
+                channel.encodings.clear()
+
+    def remove(self, camera_id):
+        """
+        Forget every channel of a publisher that is gone for good (e.g. a stopped mosaic), with its
+        frame and cached encodings. Only call it when no viewer waits on it any more: publishing
+        under the same id again starts over at sequence number 1.
+        """
+        with self._lock:
+            for key in [key for key in self._channels if key[0] == camera_id]:
+                del self._channels[key]
+
+    def get_stats(self):
+        """
+        Get the published frame count and the encode count per variant of every camera source.
+
+        Returns:
+            Dict of {camera_id: {source: {"seq": int, "encodes": {variant label: int}}}}
+        """
+        with self._lock:
+            channels = dict(self._channels)
+        stats = {}
+        for (camera_id, source), channel in channels.items():
+            with channel.encode_lock:
+                encodes = {variant_label(variant): count for variant, count in channel.encodes.items()}
+            stats.setdefault(camera_id, {})[source] = {"seq": channel.seq, "encodes": encodes}
+        return stats
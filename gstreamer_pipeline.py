@@ -8,6 +8,11 @@ import subprocess
 from gi.repository import Gst
 from hailo_apps_infra1.hailo_rpi_common import get_caps_from_pad, get_numpy_from_buffer
 from hailo_apps_infra1.detection_pipeline import GStreamerMultiSourceDetectionApp
+from hailo_apps_infra1.gstreamer_helper_pipelines import get_source_name_with_index, get_source_exit_element_name
+from source_supervisor import SourceSupervisor
+from latency_profiles import LatencyMonitor, get_queue_policies, get_source_options, get_pipeline_latency
+from metrics import BUFFERS_PROCESSED, CALLBACK_SECONDS, UPDATE_COUNTS_SECONDS, DISPLAY_FPS, DISPLAY_DROP_RATE
+from config import normalize_video_source, HEF_INPUT_SIZE
 
 
 class SafeGStreamerMultiSourceDetectionApp(GStreamerMultiSourceDetectionApp):
@@ -23,6 +28,11 @@ class SafeGStreamerMultiSourceDetectionApp(GStreamerMultiSourceDetectionApp):
             finally:
                 signal_module.signal = original_signal
 
+    def on_fps_measurement(self, sink, fps, droprate, avgfps):
+        DISPLAY_FPS.set(fps)
+        DISPLAY_DROP_RATE.set(droprate)
+        return super().on_fps_measurement(sink, fps, droprate, avgfps)
+
 
 def diagnose_rtsp_stream(rtsp_url):
     """Diagnose RTSP stream using GStreamer tools"""
@@ -50,16 +60,27 @@ def diagnose_rtsp_stream(rtsp_url):
         return False
 
 
-def validate_rtsp_sources(sources, timeout=20):
-    """Enhanced RTSP validation specifically for DVR compatibility"""
+def validate_rtsp_sources(sources, timeout=20, progress=None):
+    """
+    Enhanced RTSP validation specifically for DVR compatibility
+
+    Args:
+        sources: Source URLs, camera{i+1} in order
+        timeout: Seconds each validation method may take
+        progress: Optional progress reporter (PipelineJob) told the state of every source
+    """
     failed_sources = []
 
     for i, source in enumerate(sources):
         if source.startswith('/dev/video'):
             print(f"Skipping validation for local device: {source}")
+            if progress:
+                progress.set_source(f"camera{i+1}", "skipped", "Local device")
             continue
 
         print(f"\n=== Validating camera{i+1}: {source} ===")
+        if progress:
+            progress.set_source(f"camera{i+1}", "validating")
         
         # First, diagnose the stream
         diagnose_rtsp_stream(source)
@@ -104,6 +125,9 @@ def validate_rtsp_sources(sources, timeout=20):
 
         if not validation_success:
             failed_sources.append(f"camera{i+1}: All validation methods failed - stream may be incompatible with GStreamer")
+        if progress:
+            progress.set_source(f"camera{i+1}", "valid" if validation_success else "failed",
+                                None if validation_success else "All validation methods failed")
 
     if failed_sources:
         return False, "Some RTSP sources failed validation", failed_sources
@@ -310,8 +334,10 @@ def _run_validation_pipeline(test_pipeline, camera_index, timeout, method_name):
     return success
 
 
-def create_visitor_counter_callback(user_data, frame_buffers, socketio):
+def create_visitor_counter_callback(user_data, frame_buffers, socketio, latency_monitor=None, frame_hub=None,
+                                    count_broadcaster=None):
     def visitor_counter_callback(pad, info, user_data_param):
+        started = time.perf_counter()
         buffer = info.get_buffer()
         if buffer is None:
             print("Error: No buffer available")
@@ -323,17 +349,31 @@ def create_visitor_counter_callback(user_data, frame_buffers, socketio):
                 print("Error: Could not get format/dimensions from pad")
                 return Gst.PadProbeReturn.OK
 
-            np_frame = get_numpy_from_buffer(buffer, format, width, height)
-            frame = cv2.cvtColor(np_frame, cv2.COLOR_RGB2BGR)
+            # Frames stay RGB: they are only drawn on and encoded, and the encoder takes RGB directly
+            frame = get_numpy_from_buffer(buffer, format, width, height)
             camera_id = _extract_camera_id_from_pad(pad)
             detected_people = _extract_people_detections(buffer, width, height)
             _draw_zones_on_frame(frame, user_data, camera_id)
             frame_buffers[camera_id] = frame
+            if frame_hub:
+                frame_hub.publish(camera_id, frame)
+            update_started = time.perf_counter()
             user_data.update_counts(camera_id, detected_people)
-            socketio.emit("update_counts", {
-                "data": user_data.data,
-                "active_camera": user_data.active_camera
-            })
+            UPDATE_COUNTS_SECONDS.observe(time.perf_counter() - update_started, camera_id)
+            if latency_monitor:
+                latency = _measure_buffer_latency(pad, buffer)
+                if latency is not None:
+                    latency_monitor.record(camera_id, latency)
+            if count_broadcaster:
+                # Coalesced into the next count_delta broadcast
+                count_broadcaster.mark_dirty(camera_id)
+            else:
+                socketio.emit("update_counts", {
+                    "data": user_data.data,
+                    "active_camera": user_data.active_camera
+                })
+            BUFFERS_PROCESSED.inc(camera_id)
+            CALLBACK_SECONDS.observe(time.perf_counter() - started, camera_id)
         except Exception as e:
             print(f"Error in callback: {e}")
 
@@ -342,6 +382,28 @@ def create_visitor_counter_callback(user_data, frame_buffers, socketio):
     return visitor_counter_callback
 
 
+def _measure_buffer_latency(pad, buffer):
+    """
+    Glass-to-count latency of a buffer in seconds: the pipeline running time now minus the
+    running time the source stamped on the buffer at capture (live sources stamp capture time).
+    Camera-side encoding and network delay before the buffer reaches the pipeline are not included.
+    """
+    element = pad.get_parent_element()
+    clock = element.get_clock() if element else None
+    if clock is None or buffer.pts == Gst.CLOCK_TIME_NONE:
+        return None
+
+    pts = buffer.pts
+    segment_event = pad.get_sticky_event(Gst.EventType.SEGMENT, 0)
+    if segment_event is not None:
+        pts = segment_event.parse_segment().to_running_time(Gst.Format.TIME, buffer.pts)
+        if pts == Gst.CLOCK_TIME_NONE:
+            return None
+
+    running_time = clock.get_time() - element.get_base_time()
+    return max(0, running_time - pts) / Gst.SECOND
+
+
 def _extract_camera_id_from_pad(pad):
     element = pad.get_parent_element()
     element_name = element.get_name()
@@ -375,70 +437,94 @@ def _extract_people_detections(buffer, width, height):
     return detected_people
 
 
-def _draw_zones_on_frame(frame, user_data, camera_id):
+def _draw_zones_on_frame(frame, user_data, camera_id, scale=1.0):
     if camera_id not in user_data.data:
         return
     for zone, data in user_data.data[camera_id]["zones"].items():
-        top_left = tuple(map(int, data["top_left"]))
-        bottom_right = tuple(map(int, data["bottom_right"]))
-        cv2.rectangle(frame, top_left, bottom_right, (0, 0, 255), 2)
+        top_left = tuple(int(v * scale) for v in data["top_left"])
+        bottom_right = tuple(int(v * scale) for v in data["bottom_right"])
+        # Red in RGB frames
+        cv2.rectangle(frame, top_left, bottom_right, (255, 0, 0), 2)
         text = f"{zone} (In: {data['in_count']}, Out: {data['out_count']})"
-        cv2.putText(frame, text, (top_left[0], top_left[1] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+        cv2.putText(frame, text, (top_left[0], top_left[1] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1)
 
 
 class PipelineManager:
-    def __init__(self, user_data, frame_buffers, socketio):
+    def __init__(self, user_data, frame_buffers, socketio, main_stream_manager=None, frame_hub=None,
+                 count_broadcaster=None):
         self.user_data = user_data
         self.frame_buffers = frame_buffers
         self.socketio = socketio
+        self.main_stream_manager = main_stream_manager
+        self.frame_hub = frame_hub
+        self.count_broadcaster = count_broadcaster
         self.app_instance = None
+        self.source_supervisor = None
         self.video_sources = []
-
-    def start_pipeline(self, video_sources):
+        self.camera_sources = {}
+        self.latency_monitor = None
+
+    def _emit_status(self, status, message, progress=None, **details):
+        """Emit pipeline_status and report the stage to the progress reporter, if any."""
+        if self.socketio:
+            self.socketio.emit("pipeline_status", {"status": status, "message": message, **details})
+        if progress:
+            progress.set_stage(status, message)
+
+    def start_pipeline(self, video_sources, progress=None):
+        """
+        Start the detection pipeline.
+
+        Args:
+            video_sources: List of camera entries, each a URL or a dict with 'url' (analysis
+                           substream), optional 'view_url' (main stream for viewing),
+                           'inference_fps', 'decoder_skip_frame' and 'latency_profile'
+            progress: Optional progress reporter (PipelineJob) told the stage and the state of every source
+        """
         try:
+            camera_sources = [normalize_video_source(source) for source in video_sources]
+            video_sources = [source["url"] for source in camera_sources]
+
             if self.app_instance:
                 print("Stopping previous pipeline before starting a new one...")
                 self.stop_pipeline()
                 time.sleep(1)
 
             print("Validating RTSP sources...")
-            if self.socketio:
-                self.socketio.emit("pipeline_status", {
-                    "status": "validating",
-                    "message": "Validating RTSP sources..."
-                })
+            self._emit_status("validating", "Validating RTSP sources...", progress)
 
-            is_valid, message, failed_sources = validate_rtsp_sources(video_sources)
+            is_valid, message, failed_sources = validate_rtsp_sources(video_sources, progress=progress)
 
             if not is_valid:
                 print(f"RTSP validation failed: {failed_sources}")
-                if self.socketio:
-                    self.socketio.emit("pipeline_status", {
-                        "status": "error",
-                        "message": message,
-                        "details": failed_sources
-                    })
+                self._emit_status("error", message, progress, details=failed_sources)
                 return False
 
             print("RTSP sources validated successfully, creating main pipeline...")
-            if self.socketio:
-                self.socketio.emit("pipeline_status", {
-                    "status": "creating",
-                    "message": "Creating detection pipeline..."
-                })
+            self._emit_status("creating", "Creating detection pipeline...", progress)
 
             self.video_sources = video_sources
 
             camera_ids = [f"camera{i+1}" for i in range(len(video_sources))]
-            self.user_data.data = {cam_id: {"zones": {}} for cam_id in camera_ids}
-            self.user_data.inside_zones = {cam_id: {} for cam_id in camera_ids}
-            self.user_data.person_zone_history = {cam_id: {} for cam_id in camera_ids}
-            self.user_data.active_camera = camera_ids[0] if camera_ids else "camera1"
-            self.user_data.save_data()
-
-            callback = create_visitor_counter_callback(self.user_data, self.frame_buffers, self.socketio)
-
-            self.app_instance = SafeGStreamerMultiSourceDetectionApp(callback, self.user_data, video_sources)
+            self.camera_sources = dict(zip(camera_ids, camera_sources))
+            self.user_data.reset_cameras(camera_ids)
+
+            profiles = [source["latency_profile"] for source in camera_sources]
+            self.latency_monitor = LatencyMonitor(dict(zip(camera_ids, profiles)))
+            callback = create_visitor_counter_callback(
+                self.user_data, self.frame_buffers, self.socketio, self.latency_monitor, self.frame_hub,
+                self.count_broadcaster)
+
+            source_options = [
+                {"frame_rate": source["inference_fps"], "skip_frame": source["decoder_skip_frame"],
+                 **get_source_options(source["latency_profile"])}
+                for source in camera_sources
+            ]
+            self.app_instance = SafeGStreamerMultiSourceDetectionApp(
+                callback, self.user_data, video_sources, source_options,
+                queue_policies=[get_queue_policies(profile) for profile in profiles],
+                pipeline_latency=get_pipeline_latency(profiles),
+                network_size=HEF_INPUT_SIZE)
             self.app_instance.create_pipeline()
 
             for i in range(len(video_sources)):
@@ -450,33 +536,52 @@ class PipelineManager:
                         print(f"Adding pad probe to {identity_name}")
                         src_pad.add_probe(Gst.PadProbeType.BUFFER, callback, self.user_data)
 
+            self.source_supervisor = SourceSupervisor({
+                camera_id: (
+                    get_source_name_with_index(f"src_{i}", i),
+                    get_source_exit_element_name(f"src_{i}", i)
+                )
+                for i, camera_id in enumerate(camera_ids)
+            }, self.socketio)
+            self.source_supervisor.attach(self.app_instance.pipeline)
+            self.app_instance.source_supervisor = self.source_supervisor
+
             threading.Thread(target=self.app_instance.run, daemon=True).start()
 
-            if self.socketio:
-                self.socketio.emit("pipeline_status", {
-                    "status": "running",
-                    "message": "Pipeline started successfully"
+            if self.main_stream_manager:
+                self.main_stream_manager.configure({
+                    camera_id: source["view_url"]
+                    for camera_id, source in self.camera_sources.items()
+                    if source["view_url"]
                 })
 
+            if progress:
+                for camera_id in camera_ids:
+                    progress.set_source(camera_id, "started")
+            self._emit_status("running", "Pipeline started successfully", progress)
+
             print("Pipeline started successfully with validated sources")
             return True
 
         except Exception as e:
             error_msg = f"Failed to start pipeline: {str(e)}"
             print(error_msg)
-            if self.socketio:
-                self.socketio.emit("pipeline_status", {
-                    "status": "error",
-                    "message": error_msg
-                })
+            self._emit_status("error", error_msg, progress)
             return False
 
     def stop_pipeline(self):
         if self.app_instance:
             try:
+                if self.source_supervisor:
+                    self.source_supervisor.detach()
+                    self.source_supervisor = None
                 self.app_instance.pipeline.set_state(Gst.State.NULL)
                 self.app_instance = None
+                if self.main_stream_manager:
+                    self.main_stream_manager.stop_all()
                 self.frame_buffers.clear()
+                if self.frame_hub:
+                    self.frame_hub.clear()
                 if self.socketio:
                     self.socketio.emit("pipeline_status", {
                         "status": "stopped",
@@ -496,3 +601,42 @@ class PipelineManager:
 
     def is_running(self):
         return self.app_instance is not None
+
+    def get_source_status(self):
+        """Return per-camera supervision state, or an empty dict when no pipeline is running."""
+        if self.source_supervisor is None:
+            return {}
+        return self.source_supervisor.get_status()
+
+    def get_latency_stats(self):
+        """Return measured glass-to-count latency per camera and per latency profile."""
+        if self.latency_monitor is None:
+            return {"cameras": {}, "profiles": {}}
+        return self.latency_monitor.get_stats()
+
+    def get_queue_levels(self):
+        """
+        Return the fill level of every queue element of the running pipeline.
+
+        Returns:
+            Dict of {queue name: {"buffers", "max_buffers", "bytes", "time_seconds"}}, empty when no pipeline is running
+        """
+        app_instance = self.app_instance
+        if app_instance is None:
+            return {}
+        levels = {}
+        it = app_instance.pipeline.iterate_recurse()
+        while True:
+            result, element = it.next()
+            if result != Gst.IteratorResult.OK:
+                break
+            factory = element.get_factory()
+            if factory is None or factory.get_name() != "queue":
+                continue
+            levels[element.get_name()] = {
+                "buffers": element.get_property("current-level-buffers"),
+                "max_buffers": element.get_property("max-size-buffers"),
+                "bytes": element.get_property("current-level-bytes"),
+                "time_seconds": element.get_property("current-level-time") / Gst.SECOND,
+            }
+        return levels
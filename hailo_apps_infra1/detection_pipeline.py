@@ -22,8 +22,12 @@ from hailo_apps_infra1.gstreamer_helper_pipelines import(
     USER_CALLBACK_PIPELINE,
     DISPLAY_PIPELINE,
     CROP_PIPELINE,
-    
+    VideoCaps,
+    PipelineReport,
+    cropper_output_caps,
+    get_hef_input_size,
 )
+from hailo_apps_infra1.pipeline_composer import compose_multi_source_graph
 from hailo_apps_infra1.gstreamer_app import (
     GStreamerApp,
     app_callback_class,
@@ -94,6 +98,7 @@ class GStreamerDetectionApp(GStreamerApp):
         self.create_pipeline()
 
     def get_pipeline_string(self):
+        network_size = get_hef_input_size(self.hef_path)
         source_pipeline = SOURCE_PIPELINE(self.video_source, self.video_width, self.video_height)
         detection_pipeline = INFERENCE_PIPELINE(
             hef_path=self.hef_path,
@@ -101,7 +106,10 @@ class GStreamerDetectionApp(GStreamerApp):
             post_function_name=self.post_function_name,
             batch_size=self.batch_size,
             config_json=self.labels_json,
-            additional_params=self.thresholds_str)
+            additional_params=self.thresholds_str,
+            input_caps=cropper_output_caps(VideoCaps(self.video_format, self.video_width, self.video_height),
+                                           network_size),
+            network_size=network_size)
         detection_pipeline_wrapper = INFERENCE_PIPELINE_WRAPPER(detection_pipeline)
         tracker_pipeline = TRACKER_PIPELINE(class_id=1)
         user_callback_pipeline = USER_CALLBACK_PIPELINE()
@@ -118,7 +126,8 @@ class GStreamerDetectionApp(GStreamerApp):
         return pipeline_string
 
 class GStreamerMultiSourceDetectionApp(GStreamerApp):
-    def __init__(self, app_callback, user_data, video_sources):
+    def __init__(self, app_callback, user_data, video_sources, source_options=None, queue_policies=None, pipeline_latency=None,
+                 network_size=None):
         parser = get_default_parser()
         parser.add_argument(
             "--labels-json",
@@ -131,6 +140,14 @@ class GStreamerMultiSourceDetectionApp(GStreamerApp):
 
         super().__init__(args, user_data)
         self.video_sources = video_sources  # Multiple RTSP sources
+        # Extra SOURCE_PIPELINE keyword arguments per source (e.g. frame_rate)
+        self.source_options = source_options or [{} for _ in video_sources]
+        # Per source {queue name pattern: QueuePolicy}, applied within that source's branch
+        self.queue_policies = queue_policies
+        if pipeline_latency is not None:
+            self.pipeline_latency = pipeline_latency  # milliseconds
+        # (width, height) of the HEF input, None to read it from the HEF
+        self.network_size = network_size
         self.batch_size = 2
         # Determine the architecture if not specified
         if args.arch is None:
@@ -171,90 +188,31 @@ class GStreamerMultiSourceDetectionApp(GStreamerApp):
         self.create_pipeline()
 
     def get_pipeline_string(self):
-        source_pipelines = []
-        compositor_elements = []
-        cropper_so_path = os.path.join(self.current_path, '../resources/libdetection_croppers.so')
-        
-        num_sources = len(self.video_sources)
-        screen_width = 1280 if num_sources <= 2 else 1920
-        screen_height = 720 if num_sources <= 2 else 1080
-
-        for i, video_source in enumerate(self.video_sources):
-            source_pipeline = SOURCE_PIPELINE(video_source, self.video_width, self.video_height, name=f"src_{i}", source_index=i)
-
-            detection_pipeline = INFERENCE_PIPELINE(
-                hef_path=self.hef_path,
-                post_process_so=self.post_process_so,
-                post_function_name=self.post_function_name,
-                batch_size=self.batch_size,
-                config_json=self.labels_json,
-                additional_params=self.thresholds_str,
-                name=f"infer_{i}") # ✅ Unique name per source
-            
-            detection_pipeline_wrapper = INFERENCE_PIPELINE_WRAPPER(detection_pipeline, name=f"inference_wrapper_{i}")
-            tracker_pipeline = TRACKER_PIPELINE(class_id=1, keep_past_metadata=True, name=f"tracker_{i}")  # ✅ Unique tracker per source
-            cropper_pipeline = CROP_PIPELINE(
-                so_path=cropper_so_path,
-                function_name="all_detections",
-                name=f"cropper_{i}",
-                output_path=f"/tmp/crop_{i}_%05d.jpg"
-            )
-            if i == 0:
-                identity_name = "identity_callback"
-                display_name = "hailo_display"
-            else:    
-                identity_name = f"identity_callback_{i}"
-                display_name = f"source_display_{i}"
-                
-            
-            user_callback_pipeline = USER_CALLBACK_PIPELINE(name=identity_name)
-            display_pipeline = DISPLAY_PIPELINE(video_sink=self.video_sink, sync=self.sync, show_fps=self.show_fps, name=display_name)
-            
-            enhancement_pipeline = (
-                f'{QUEUE(name=f"enhance_{i}_q")} ! '
-                f'videoconvert name=enhance_{i}_convert ! '
-            )
-            
-            #user_callback_pipeline = USER_CALLBACK_PIPELINE(name=f"identity_callback_{i}")
-            '''(
-                f'{QUEUE(name=f"identity_callback_{i}_q")} ! '
-                f'identity name=identity_callback_{i} '  #  # ✅ Unique callback per source
-            )'''
-            #display_pipeline = DISPLAY_PIPELINE(video_sink=self.video_sink, sync=self.sync, show_fps=self.show_fps, name=f"source_display_{i}")
-            # Define compositor positions dynamically
-            xpos = (i % 2) * (screen_width // 2 )
-            ypos = (i // 2) * (screen_height // 2 )
-            compositor_elements.append(f"sink_{i}::xpos={xpos} sink_{i}::ypos={ypos}")
-
-            # Ensure unique queue names per pipeline
-            full_pipeline = (
-                f"{source_pipeline} ! "
-                f"{detection_pipeline_wrapper} ! "
-                f"{tracker_pipeline} ! "
-                f"{user_callback_pipeline} ! {display_pipeline}"
-            )
-
-            
-            
-            #full_pipeline = f"{source_pipeline} ! {detection_pipeline_wrapper} ! {tracker_pipeline} ! {cropper_pipeline} ! {user_callback_pipeline} ! {display_pipeline} "#! comp.sink_{i} "
-            '''full_pipeline = (
-                f'{source_pipeline} ! '
-                f'queue name=q_infer leaky=no max-size-buffers=3 max-size-bytes=0 max-size-time=0 ! '
-                f'{detection_pipeline} ! '
-                f'queue name=q_tracker leaky=no max-size-buffers=3 max-size-bytes=0 max-size-time=0 ! '
-                f'{tracker_pipeline} ! '
-                f'queue name=q_display leaky=no max-size-buffers=3 max-size-bytes=0 max-size-time=0 ! '
-                f'{display_pipeline} ! '
-                f'comp.sink_{i}'
-            )'''
-            source_pipelines.append(full_pipeline)
-
-        compositor_pipeline = f"compositor name=comp { ' '.join(compositor_elements) } ! videoconvert ! autovideosink sync=false"
-
-        pipeline_string = " ".join(source_pipelines) #+ compositor_pipeline
+        self.pipeline_report = PipelineReport()
+        self.pipeline_graph = compose_multi_source_graph(
+            self.video_sources,
+            hef_path=self.hef_path,
+            post_process_so=self.post_process_so,
+            post_function_name=self.post_function_name,
+            batch_size=self.batch_size,
+            labels_json=self.labels_json,
+            thresholds_str=self.thresholds_str,
+            video_width=self.video_width,
+            video_height=self.video_height,
+            video_format=self.video_format,
+            video_sink=self.video_sink,
+            sync=self.sync,
+            show_fps=self.show_fps,
+            source_options=self.source_options,
+            queue_policies=self.queue_policies,
+            report=self.pipeline_report,
+            network_size=self.network_size)
+        # Fail with a readable message before the launch parser sees a broken graph
+        self.pipeline_graph.assert_valid()
+        pipeline_string = self.pipeline_graph.render()
         print("Pipeline:\n", pipeline_string)
+        print(self.pipeline_report.format())
         return pipeline_string
-        #
 
 
 
@@ -81,6 +81,7 @@ class GStreamerApp:
         self.pipeline_latency = 300  # milliseconds
         self.display_process = None
         self.should_exit = False  # Add exit flag
+        self.source_supervisor = None  # Optional per-source error handler (see source_supervisor.py)
 
         # Set Hailo parameters
         self.batch_size = 1
@@ -109,7 +110,12 @@ class GStreamerApp:
 
         pipeline_string = self.get_pipeline_string()
         try:
-            self.pipeline = Gst.parse_launch(pipeline_string)
+            # Apps that compose a PipelineGraph can skip the launch parser
+            pipeline_graph = getattr(self, "pipeline_graph", None)
+            if self.options_menu.build_graph and pipeline_graph is not None:
+                self.pipeline = pipeline_graph.build()
+            else:
+                self.pipeline = Gst.parse_launch(pipeline_string)
         except Exception as e:
             print(f"Error creating pipeline: {e}", file=sys.stderr)
             sys.exit(1)
@@ -123,6 +129,9 @@ class GStreamerApp:
         self.loop = GLib.MainLoop()
 
     def bus_call(self, bus, message, loop):
+        # Errors attributed to a single supervised source restart that source only
+        if self.source_supervisor is not None and self.source_supervisor.handle_message(message):
+            return True
         t = message.type
         if t == Gst.MessageType.EOS:
             print("End-of-stream")
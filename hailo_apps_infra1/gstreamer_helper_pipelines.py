@@ -1,6 +1,79 @@
 import os
 import subprocess
 import json
+from collections import namedtuple
+from hailo_apps_infra1.pipeline_graph import Element, LaunchFragment, PipelineGraph
+
+
+# -----------------------------------------------------------------------------------------------
+# Caps model used to decide which conversion elements a stage actually needs
+# -----------------------------------------------------------------------------------------------
+# A field set to None means "unknown" for stage outputs and "any" for stage requirements.
+VideoCaps = namedtuple('VideoCaps', ['format', 'width', 'height'])
+
+# Sinks that accept any raw video, so no conversion is needed in front of them
+ANY_CAPS_SINKS = ('fakesink',)
+
+
+def conversion_plan(input_caps, output_caps):
+    """
+    Decide whether a videoscale and a videoconvert are needed between two stages.
+
+    Args:
+        input_caps (VideoCaps or None): Caps produced by the upstream stage, None if unknown.
+        output_caps (VideoCaps or None): Caps required by the downstream stage, None if unknown.
+
+    Returns:
+        tuple: (need_scale, need_convert, reason)
+    """
+    if input_caps is None or output_caps is None:
+        return True, True, 'caps unknown'
+    need_scale = output_caps.width is not None and (
+        input_caps.width is None or (input_caps.width, input_caps.height) != (output_caps.width, output_caps.height)
+    )
+    need_convert = output_caps.format is not None and input_caps.format != output_caps.format
+    return need_scale, need_convert, f'{tuple(input_caps)} -> {tuple(output_caps)}'
+
+
+def get_hef_input_size(hef_path):
+    """
+    Returns the (width, height) of the first input of a HEF file, or None if it cannot be read
+    (hailo_platform not installed, missing or unreadable file).
+    """
+    try:
+        from hailo_platform import HEF
+    except ImportError:
+        return None
+    try:
+        height, width = HEF(hef_path).get_input_vstream_infos()[0].shape[:2]
+        return int(width), int(height)
+    except Exception as e:
+        print(f"[WARN] Could not read the input size of {hef_path}: {e}")
+        return None
+
+
+class PipelineReport:
+    """Collects the conversion elements kept or removed while composing a pipeline (for dry runs)."""
+
+    def __init__(self):
+        self.kept = []
+        self.removed = []
+
+    def record(self, elements, needed, reason):
+        (self.kept if needed else self.removed).append((elements, reason))
+
+    def format(self):
+        lines = [f'Removed {len(self.removed)} conversion stage(s), kept {len(self.kept)}:']
+        for elements, reason in self.removed:
+            lines.append(f'  - removed {", ".join(elements)} ({reason})')
+        for elements, reason in self.kept:
+            lines.append(f'  + kept    {", ".join(elements)} ({reason})')
+        return '\n'.join(lines)
+
+
+def _record(report, elements, needed, reason):
+    if report is not None:
+        report.record(elements, needed, reason)
 
 
 def detect_rtsp_codec(rtsp_url):
@@ -42,8 +115,61 @@ def get_source_type(input_source):
         return 'file'
 
 
+# -----------------------------------------------------------------------------------------------
+# Graph building blocks
+# Every stage is built as a PipelineGraph; the uppercase *_PIPELINE functions render those graphs
+# to the launch strings they always returned.
+# -----------------------------------------------------------------------------------------------
+def queue_element(name, max_size_buffers=3, max_size_bytes=0, max_size_time=0, leaky='no'):
+    """Creates a queue Element with explicit limits."""
+    return Element('queue', name, leaky=leaky, max_size_buffers=max_size_buffers,
+                   max_size_bytes=max_size_bytes, max_size_time=max_size_time)
+
+
+def caps_element(caps, name=None):
+    """Creates a capsfilter Element for a caps string."""
+    return Element('capsfilter', name, caps=caps)
+
+
+def as_graph(stage):
+    """
+    Returns a stage as a PipelineGraph. Launch strings (e.g. inner pipelines built by callers)
+    are wrapped as opaque fragments.
+    """
+    if isinstance(stage, PipelineGraph):
+        return stage
+    if isinstance(stage, Element):
+        return PipelineGraph().chain(stage)
+    return PipelineGraph().chain(LaunchFragment(stage))
+
+
+def _parse_properties(params):
+    """Parses 'key=value key=value' strings (e.g. additional hailonet parameters) into a dict."""
+    properties = {}
+    for token in (params or '').split():
+        key, sep, value = token.partition('=')
+        if sep:
+            properties[key] = value
+    return properties
+
+
 def QUEUE(name, max_size_buffers=3, max_size_bytes=0, max_size_time=0, leaky='no'):
-    return f'queue name={name} leaky={leaky} max-size-buffers={max_size_buffers} max-size-bytes={max_size_bytes} max-size-time={max_size_time} '
+    return f'{queue_element(name, max_size_buffers, max_size_bytes, max_size_time, leaky).render()} '
+
+
+def get_source_name_with_index(name='source', source_index=None):
+    """
+    Returns the element name prefix SOURCE_PIPELINE uses for a source.
+    Every element of the source section is named '<prefix>' or '<prefix>_<role>'.
+    """
+    return f"{name}_{source_index}" if source_index is not None else name
+
+
+def get_source_exit_element_name(name='source', source_index=None):
+    """
+    Returns the name of the last element of the source section (the element whose src pad feeds inference).
+    """
+    return f"{get_source_name_with_index(name, source_index)}_output_caps"
 
 
 def get_camera_resolotion(video_width=640, video_height=640):
@@ -57,98 +183,256 @@ def get_camera_resolotion(video_width=640, video_height=640):
         return 3840, 2160
 
 
-def get_rtsp_codec_pipeline(video_source, name_with_index, codec_type=None):
+def videorate_element(name, frame_rate=None):
+    """
+    Creates a drop-only videorate Element capping the frame rate at frame_rate fps, or None if frame_rate is not set.
+    """
+    if not frame_rate:
+        return None
+    return Element('videorate', name, drop_only=True, max_rate=int(frame_rate), skip_to_first=True)
+
+
+def VIDEORATE_PIPELINE(name, frame_rate=None):
+    """
+    Creates a drop-only videorate stage that caps the frame rate at frame_rate fps.
+    Frames are only ever dropped (never duplicated) and the caps are left untouched,
+    so it can be placed directly after the decoder to thin out everything downstream.
+
+    Args:
+        name (str): The name of the videorate element.
+        frame_rate (int or None): Maximum frame rate. If None, an empty string is returned.
+
+    Returns:
+        str: A pipeline fragment ending with ' ! ', or an empty string.
+    """
+    videorate = videorate_element(name, frame_rate)
+    return f'{videorate.render()} ! ' if videorate else ''
+
+
+def rtsp_codec_graph(video_source, name_with_index, codec_type=None, frame_rate=None, rtsp_latency=200, rtsp_drop_on_latency=True, skip_frame=False):
+    """Creates the RTSP receive and decode section of a source: rtspsrc, depayloader, parser, decoder."""
     codec_type = codec_type.lower() if codec_type else 'h264'
-    if codec_type in ['h264', 'avc1']:
-        return (
-            f"rtspsrc location={video_source} name={name_with_index} latency=200 buffer-mode=1 "
-            f"timeout=10000000 drop-on-latency=true is-live=true udp-buffer-size=524288 protocols=udp ! "
-            f"rtph264depay ! h264parse ! avdec_h264 ! "
-            f"{QUEUE(name=f'{name_with_index}_queue', max_size_buffers=5, leaky='downstream')} ! "
-            f"video/x-raw, format=I420 ! "
-        )
-    elif codec_type in ['hevc', 'h265']:
-        return (
-            f"rtspsrc location={video_source} name={name_with_index} latency=200 buffer-mode=1 "
-            f"timeout=10000000 drop-on-latency=true is-live=true udp-buffer-size=524288 protocols=udp ! "
-            f"rtph265depay ! h265parse ! avdec_h265 ! "
-            f"{QUEUE(name=f'{name_with_index}_queue', max_size_buffers=5, leaky='downstream')} ! "
-            f"video/x-raw, format=I420 ! "
-        )
+    if codec_type in ['hevc', 'h265']:
+        codec = 'h265'
     else:
-        print(f"[WARN] Unknown codec '{codec_type}', defaulting to H264.")
-        return (
-            f"rtspsrc location={video_source} name={name_with_index} latency=200 buffer-mode=1 "
-            f"timeout=10000000 drop-on-latency=true is-live=true udp-buffer-size=524288 protocols=udp ! "
-            f"rtph264depay ! h264parse ! avdec_h264 ! "
-            f"{QUEUE(name=f'{name_with_index}_queue', max_size_buffers=5, leaky='downstream')} ! "
-            f"video/x-raw, format=I420 ! "
-        )
+        if codec_type not in ['h264', 'avc1']:
+            print(f"[WARN] Unknown codec '{codec_type}', defaulting to H264.")
+        codec = 'h264'
+
+    return PipelineGraph().chain(
+        Element('rtspsrc', name_with_index, location=video_source, latency=rtsp_latency, buffer_mode=1,
+                timeout=10000000, drop_on_latency=rtsp_drop_on_latency, is_live=True, udp_buffer_size=524288,
+                protocols='udp'),
+        Element(f'rtp{codec}depay', f'{name_with_index}_depay'),
+        Element(f'{codec}parse', f'{name_with_index}_parse'),
+        # skip-frame=1 skips decoding non-reference frames; separate from the videorate decimation below
+        Element(f'avdec_{codec}', f'{name_with_index}_decoder', skip_frame=1 if skip_frame else None),
+        videorate_element(f'{name_with_index}_videorate', frame_rate),
+        queue_element(f'{name_with_index}_queue', max_size_buffers=5, leaky='downstream'),
+        caps_element('video/x-raw, format=I420'),
+    )
+
+
+def get_rtsp_codec_pipeline(video_source, name_with_index, codec_type=None, frame_rate=None, rtsp_latency=200, rtsp_drop_on_latency=True, skip_frame=False):
+    graph = rtsp_codec_graph(video_source, name_with_index, codec_type, frame_rate, rtsp_latency, rtsp_drop_on_latency,
+                             skip_frame)
+    return f'{graph.render()} ! '
 
 
-def SOURCE_PIPELINE(video_source, video_width=640, video_height=640, video_format='RGB', name='source', no_webcam_compression=False, source_index=None):
+def source_graph(video_source, video_width=640, video_height=640, video_format='RGB', name='source', no_webcam_compression=False, source_index=None, frame_rate=None, rtsp_latency=200, rtsp_drop_on_latency=True, report=None, skip_frame=False):
+    """
+    Creates the graph for the video source, ending in scaled and converted raw video.
+    See SOURCE_PIPELINE for the arguments.
+
+    Returns:
+        PipelineGraph: The source section; its tail is the '<prefix>_output_caps' capsfilter.
+    """
+    # Caps produced by the source element when they are known up front
+    source_caps = None
     source_type = get_source_type(video_source)
-    if source_index is not None:
-        unique_suffix = f"_{source_index}"
-        name_with_index = f"{name}{unique_suffix}"
-    else:
-        unique_suffix = ""
-        name_with_index = name
+    unique_suffix = f"_{source_index}" if source_index is not None else ""
+    name_with_index = get_source_name_with_index(name, source_index)
+    videoflip = Element('videoflip', f'videoflip{unique_suffix}', video_direction='horiz')
 
+    graph = PipelineGraph()
     if source_type == 'usb':
         if no_webcam_compression:
-            source_element = (
-                f'v4l2src device={video_source} name={name_with_index} ! '
-                f'video/x-raw, format=RGB, width=640, height=480 ! '
-                f'videoflip name=videoflip{unique_suffix} video-direction=horiz ! '
+            graph.chain(
+                Element('v4l2src', name_with_index, device=video_source),
+                caps_element('video/x-raw, format=RGB, width=640, height=480'),
+                videoflip,
             )
+            source_caps = VideoCaps('RGB', 640, 480)
         else:
             width, height = get_camera_resolotion(video_width, video_height)
-            source_element = (
-                f'v4l2src device={video_source} name={name_with_index} ! image/jpeg, framerate=30/1, width={width}, height={height} ! '
-                f'{QUEUE(name=f"{name_with_index}_queue_decode")} ! '
-                f'decodebin name={name_with_index}_decodebin ! '
-                f'videoflip name=videoflip{unique_suffix} video-direction=horiz ! '
+            graph.chain(
+                Element('v4l2src', name_with_index, device=video_source),
+                caps_element(f'image/jpeg, framerate=30/1, width={width}, height={height}'),
+                queue_element(f'{name_with_index}_queue_decode'),
+                Element('decodebin', f'{name_with_index}_decodebin'),
+                videoflip,
             )
     elif source_type == 'rpi':
-        source_element = (
-            f'appsrc name=app_source{unique_suffix} is-live=true leaky-type=downstream max-buffers=3 ! '
-            f'videoflip name=videoflip{unique_suffix} video-direction=horiz ! '
-            f'video/x-raw, format={video_format}, width={video_width}, height={video_height} ! '
+        graph.chain(
+            Element('appsrc', f'app_source{unique_suffix}', is_live=True, leaky_type='downstream', max_buffers=3),
+            videoflip,
+            caps_element(f'video/x-raw, format={video_format}, width={video_width}, height={video_height}'),
         )
+        source_caps = VideoCaps(video_format, video_width, video_height)
     elif source_type == "rtsp":
         codec_type = detect_rtsp_codec(video_source)
         print(f"[INFO] Detected codec for {video_source}: {codec_type}")
-        source_element = get_rtsp_codec_pipeline(video_source, name_with_index, codec_type)
+        graph.chain(rtsp_codec_graph(video_source, name_with_index, codec_type, frame_rate,
+                                     rtsp_latency, rtsp_drop_on_latency, skip_frame))
     elif source_type == 'libcamera':
-        source_element = (
-            f'libcamerasrc name={name_with_index} ! '
-            f'video/x-raw, format={video_format}, width=1536, height=864 ! '
+        graph.chain(
+            Element('libcamerasrc', name_with_index),
+            caps_element(f'video/x-raw, format={video_format}, width=1536, height=864'),
         )
     elif source_type == 'ximage':
-        source_element = (
-            f'ximagesrc xid={video_source} ! '
-            f'{QUEUE(name=f"{name_with_index}queue_scale_")} ! '
-            f'videoscale ! '
+        graph.chain(
+            Element('ximagesrc', xid=video_source),
+            queue_element(f'{name_with_index}queue_scale_'),
+            Element('videoscale'),
         )
     else:
-        source_element = (
-            f"rtspsrc location={video_source} name={name} message-forward=true ! "
-            f"rtph264depay !"
-            f"queue name=hailo_preprocess_q_0 leaky=no max-size-buffers=5 max-size-bytes=0 max-size-time=0 ! "
-            f"decodebin ! queue leaky=downstream max-size-buffers=5 max-size-bytes=0 max-size-time=0 ! "
-            f"video/x-raw, format=I420 ! "
+        graph.chain(
+            Element('rtspsrc', name, location=video_source, message_forward=True),
+            Element('rtph264depay'),
+            queue_element('hailo_preprocess_q_0', max_size_buffers=5),
+            Element('decodebin'),
+            Element('queue', leaky='downstream', max_size_buffers=5, max_size_bytes=0, max_size_time=0),
+            caps_element('video/x-raw, format=I420'),
+        )
+
+    if source_type != "rtsp":
+        graph.chain(graph.tail, videorate_element(f'{name_with_index}_videorate', frame_rate))
+
+    need_scale, need_convert, reason = conversion_plan(source_caps, VideoCaps(video_format, video_width, video_height))
+    _record(report, [f'{name_with_index}_scale_q', f'{name_with_index}_videoscale'], need_scale, reason)
+    _record(report, [f'{name_with_index}_convert_q', f'{name_with_index}_convert'], need_convert, reason)
+
+    if need_scale:
+        graph.chain(
+            graph.tail,
+            queue_element(f'{name_with_index}_scale_q'),
+            Element('videoscale', f'{name_with_index}_videoscale', n_threads=2),
+        )
+    if need_convert:
+        graph.chain(
+            graph.tail,
+            queue_element(f'{name_with_index}_convert_q'),
+            Element('videoconvert', f'{name_with_index}_convert', n_threads=3, qos=False),
         )
+    graph.chain(
+        graph.tail,
+        caps_element(
+            f'video/x-raw, pixel-aspect-ratio=1/1, format={video_format}, width={video_width}, height={video_height}',
+            name=get_source_exit_element_name(name, source_index)),
+    )
+    return graph
+
+
+def SOURCE_PIPELINE(video_source, video_width=640, video_height=640, video_format='RGB', name='source', no_webcam_compression=False, source_index=None, frame_rate=None, rtsp_latency=200, rtsp_drop_on_latency=True, report=None, skip_frame=False):
+    """
+    Creates a GStreamer pipeline string for the video source, ending in scaled and converted raw video.
+
+    Args:
+        video_source (str): The path or device name of the video source.
+        video_width (int, optional): The width of the output video. Defaults to 640.
+        video_height (int, optional): The height of the output video. Defaults to 640.
+        video_format (str, optional): The format of the output video. Defaults to 'RGB'.
+        name (str, optional): The prefix name for the pipeline elements. Defaults to 'source'.
+        no_webcam_compression (bool, optional): Use raw instead of MJPEG caps for USB cameras. Defaults to False.
+        source_index (int or None, optional): Index appended to element names in multi-source pipelines.
+        frame_rate (int or None, optional): Target inference frame rate. When set, frames are dropped right
+            after decoding so scaling, conversion and inference only see frame_rate fps. Defaults to None.
+        rtsp_latency (int, optional): rtspsrc jitter buffer latency in ms. Defaults to 200.
+        rtsp_drop_on_latency (bool, optional): Drop RTSP packets arriving later than rtsp_latency. Defaults to True.
+        report (PipelineReport or None, optional): Collects the conversion elements kept or removed.
+        skip_frame (bool, optional): Let RTSP decoders skip non-reference frames (avdec skip-frame=1),
+            independently of frame_rate. Defaults to False.
+
+    Returns:
+        str: A string representing the GStreamer pipeline for the video source.
+    """
+    graph = source_graph(video_source, video_width, video_height, video_format, name,
+                         no_webcam_compression, source_index, frame_rate, rtsp_latency, rtsp_drop_on_latency, report,
+                         skip_frame)
+    return f'{graph.render()} '
+
 
-    source_pipeline = (
-        f'{source_element} '
-        f'{QUEUE(name=f"{name_with_index}_scale_q")} ! '
-        f'videoscale name={name_with_index}_videoscale n-threads=2 ! '
-        f'{QUEUE(name=f"{name_with_index}_convert_q")} ! '
-        f'videoconvert n-threads=3 name={name_with_index}_convert qos=false ! '
-        f'video/x-raw, pixel-aspect-ratio=1/1, format={video_format}, width={video_width}, height={video_height} '
+def inference_graph(
+    hef_path,
+    post_process_so=None,
+    batch_size=1,
+    config_json=None,
+    post_function_name=None,
+    additional_params='',
+    name='inference',
+    scheduler_timeout_ms=None,
+    scheduler_priority=None,
+    vdevice_group_id=1,
+    multi_process_service=None,
+    input_caps=None,
+    report=None,
+    network_size=None
+):
+    """
+    Creates the graph for inference and post-processing. See INFERENCE_PIPELINE for the arguments.
+
+    Returns:
+        PipelineGraph: The inference section, ending with the '<name>_output_q' queue.
+    """
+    hailonet = Element(
+        'hailonet', f'{name}_hailonet',
+        hef_path=hef_path,
+        batch_size=batch_size,
+        vdevice_group_id=vdevice_group_id,
+        multi_process_service=multi_process_service,
+        scheduler_timeout_ms=scheduler_timeout_ms,
+        scheduler_priority=scheduler_priority,
+        nms_score_threshold=0.3,
+        nms_iou_threshold=0.45,
+        output_format_type='HAILO_FORMAT_TYPE_FLOAT32',
+        force_writable=True,
     )
-    return source_pipeline
+    hailonet.set(**_parse_properties(additional_params))
+
+    # hailonet takes RGB at the network input size. The scaler is only dropped when that size is known
+    # and the upstream caps have exactly that size; an unknown size on either side keeps it
+    if network_size is None:
+        need_scale, need_convert, reason = conversion_plan(input_caps, VideoCaps('RGB', None, None))
+        need_scale, reason = True, f'{reason}, network input size unknown'
+    else:
+        need_scale, need_convert, reason = conversion_plan(input_caps, VideoCaps('RGB', *network_size))
+    _record(report, [f'{name}_scale_q', f'{name}_videoscale'], need_scale, reason)
+    _record(report, [f'{name}_convert_q', f'{name}_videoconvert'], need_convert, reason)
+
+    graph = PipelineGraph()
+    if need_scale:
+        graph.chain(
+            queue_element(f'{name}_scale_q'),
+            Element('videoscale', f'{name}_videoscale', n_threads=2, qos=False),
+        )
+    if need_convert:
+        graph.chain(
+            graph.tail,
+            queue_element(f'{name}_convert_q'),
+            caps_element('video/x-raw, pixel-aspect-ratio=1/1'),
+            Element('videoconvert', f'{name}_videoconvert', n_threads=2),
+        )
+    graph.chain(graph.tail, queue_element(f'{name}_hailonet_q'), hailonet)
+
+    if post_process_so:
+        graph.chain(
+            graph.tail,
+            queue_element(f'{name}_hailofilter_q'),
+            Element('hailofilter', f'{name}_hailofilter', so_path=post_process_so,
+                    config_path=config_json or None, function_name=post_function_name or None, qos=False),
+        )
+
+    return graph.chain(graph.tail, queue_element(f'{name}_output_q'))
 
 
 def INFERENCE_PIPELINE(
@@ -163,12 +447,17 @@ def INFERENCE_PIPELINE(
     scheduler_timeout_ms=None,
     scheduler_priority=None,
     vdevice_group_id=1,
-    multi_process_service=None
+    multi_process_service=None,
+    # Caps composition
+    input_caps=None,
+    report=None,
+    network_size=None
 ):
     """
     Creates a GStreamer pipeline string for inference and post-processing using a user-provided shared object file.
     This pipeline includes videoscale and videoconvert elements to convert the video frame to the required format.
     The format and resolution are automatically negotiated based on the HEF file requirements.
+    When input_caps shows the frames are already network-ready (see INFERENCE_PIPELINE_WRAPPER), they are omitted.
 
     Args:
         hef_path (str): Path to the HEF file.
@@ -176,7 +465,7 @@ def INFERENCE_PIPELINE(
         batch_size (int): Batch size for hailonet (default=1).
         config_json (str or None): Config JSON for post-processing (e.g., label mapping).
         post_function_name (str or None): Function name in the .so postprocess.
-        additional_params (str): Additional parameters appended to hailonet.
+        additional_params (str): Additional 'key=value' hailonet parameters, overriding the defaults.
         name (str): Prefix name for pipeline elements (default='inference').
 
         # Extra hailonet parameters
@@ -186,50 +475,71 @@ def INFERENCE_PIPELINE(
         scheduler_priority (int or None): hailonet scheduler-priority. Default=None.
         multi_process_service (bool or None): hailonet multi-process-service. Default=None.
 
+        # Caps composition
+        input_caps (VideoCaps or None): Caps arriving at the pipeline, None if unknown. Default=None.
+        report (PipelineReport or None): Collects the conversion elements kept or removed. Default=None.
+        network_size (tuple or None): (width, height) of the HEF input (see get_hef_input_size), None if
+            unknown. The videoscale is only omitted when it is known and equals the input_caps size. Default=None.
+
     Returns:
         str: A string representing the GStreamer pipeline for inference.
     """
-    # config & function strings
-    config_str = f' config-path={config_json} ' if config_json else ''
-    function_name_str = f' function-name={post_function_name} ' if post_function_name else ''
-    vdevice_group_id_str = f' vdevice-group-id={vdevice_group_id} '
-    multi_process_service_str = f' multi-process-service={str(multi_process_service).lower()} ' if multi_process_service is not None else ''
-    scheduler_timeout_ms_str = f' scheduler-timeout-ms={scheduler_timeout_ms} ' if scheduler_timeout_ms is not None else ''
-    scheduler_priority_str = f' scheduler-priority={scheduler_priority} ' if scheduler_priority is not None else ''
-
-    hailonet_str = (
-        f'hailonet name={name}_hailonet '
-        f'hef-path={hef_path} '
-        f'batch-size={batch_size} '
-        f'{vdevice_group_id_str}'
-        f'{multi_process_service_str}'
-        f'{scheduler_timeout_ms_str}'
-        f'{scheduler_priority_str}'
-        f'nms-score-threshold=0.3 nms-iou-threshold=0.45 '
-        f'output-format-type=HAILO_FORMAT_TYPE_FLOAT32 '
-        f'force-writable=true '
-        f'{additional_params} '
-    )
+    graph = inference_graph(
+        hef_path, post_process_so, batch_size, config_json, post_function_name, additional_params, name,
+        scheduler_timeout_ms, scheduler_priority, vdevice_group_id, multi_process_service, input_caps, report,
+        network_size)
+    return f'{graph.render()} '
 
-    inference_pipeline = (
-        f'{QUEUE(name=f"{name}_scale_q")} ! '
-        f'videoscale name={name}_videoscale n-threads=2 qos=false ! '
-        f'{QUEUE(name=f"{name}_convert_q")} ! '
-        f'video/x-raw, pixel-aspect-ratio=1/1 ! '
-        f'videoconvert name={name}_videoconvert n-threads=2 ! '
-        f'{QUEUE(name=f"{name}_hailonet_q")} ! '
-        f'{hailonet_str} ! '
-    )
+def cropper_output_caps(input_caps, network_size=None):
+    """
+    Returns the caps hailocropper hands to the inner pipeline of INFERENCE_PIPELINE_WRAPPER:
+    the input format, letterboxed to the network input size (width, height), or of unknown
+    size if network_size is None.
+    """
+    width, height = network_size or (None, None)
+    return VideoCaps(input_caps.format if input_caps else None, width, height)
 
-    if post_process_so:
-        inference_pipeline += (
-            f'{QUEUE(name=f"{name}_hailofilter_q")} ! '
-            f'hailofilter name={name}_hailofilter so-path={post_process_so} {config_str} {function_name_str} qos=false ! '
-        )
 
-    inference_pipeline += f'{QUEUE(name=f"{name}_output_q")} '
+def _crop_and_aggregate_graph(inner_pipeline, cropper, name, bypass_max_size_buffers):
+    """
+    Wraps an inner stage between a hailocropper and a hailoaggregator:
+    input queue -> cropper -> (bypass queue -> agg.sink_0, inner -> agg.sink_1) -> aggregator -> output queue.
+    """
+    inner = as_graph(inner_pipeline)
+    aggregator = Element('hailoaggregator', f'{name}_agg')
+    bypass_q = queue_element(f'{name}_bypass_q', max_size_buffers=bypass_max_size_buffers)
+
+    graph = PipelineGraph()
+    graph.chain(queue_element(f'{name}_input_q'), cropper)
+    graph.chain(aggregator, queue_element(f'{name}_output_q'))
+    graph.add(bypass_q)
+    graph.link(cropper, bypass_q)
+    graph.link(bypass_q, aggregator, dst_pad='sink_0')
+    graph.add(inner)
+    graph.link(cropper, inner)
+    graph.link(inner, aggregator, dst_pad='sink_1')
+    return graph
+
+
+def inference_wrapper_graph(inner_pipeline, bypass_max_size_buffers=20, name='inference_wrapper'):
+    """
+    Creates the graph wrapping an inner stage (PipelineGraph or launch string) with hailocropper and hailoaggregator.
+    See INFERENCE_PIPELINE_WRAPPER for the arguments.
+    """
+    # Get the directory for post-processing shared objects
+    tappas_post_process_dir = os.environ.get('TAPPAS_POST_PROC_DIR', '')
+    whole_buffer_crop_so = os.path.join(tappas_post_process_dir, 'cropping_algorithms/libwhole_buffer.so')
+
+    cropper = Element(
+        'hailocropper', f'{name}_crop',
+        so_path=whole_buffer_crop_so,
+        function_name='create_crops',
+        use_letterbox=True,
+        resize_method='inter-area',
+        internal_offset=True,
+    )
+    return _crop_and_aggregate_graph(inner_pipeline, cropper, name, bypass_max_size_buffers)
 
-    return inference_pipeline
 
 def INFERENCE_PIPELINE_WRAPPER(inner_pipeline, bypass_max_size_buffers=20, name='inference_wrapper'):
     """
@@ -245,21 +555,11 @@ def INFERENCE_PIPELINE_WRAPPER(inner_pipeline, bypass_max_size_buffers=20, name=
     Returns:
         str: A string representing the GStreamer pipeline for the inference wrapper.
     """
-    # Get the directory for post-processing shared objects
-    tappas_post_process_dir = os.environ.get('TAPPAS_POST_PROC_DIR', '')
-    whole_buffer_crop_so = os.path.join(tappas_post_process_dir, 'cropping_algorithms/libwhole_buffer.so')
-
-    # Construct the inference wrapper pipeline string
-    inference_wrapper_pipeline = (
-        f'{QUEUE(name=f"{name}_input_q")} ! '
-        f'hailocropper name={name}_crop so-path={whole_buffer_crop_so} function-name=create_crops use-letterbox=true resize-method=inter-area internal-offset=true '
-        f'hailoaggregator name={name}_agg '
-        f'{name}_crop. ! {QUEUE(max_size_buffers=bypass_max_size_buffers, name=f"{name}_bypass_q")} ! {name}_agg.sink_0 '
-        f'{name}_crop. ! {inner_pipeline} ! {name}_agg.sink_1 '
-        f'{name}_agg. ! {QUEUE(name=f"{name}_output_q")} '
-    )
+    return f'{inference_wrapper_graph(inner_pipeline, bypass_max_size_buffers, name).render()} '
 
-    return inference_wrapper_pipeline
+def overlay_graph(name='hailo_overlay'):
+    """Creates the graph for the hailooverlay element. See OVERLAY_PIPELINE."""
+    return PipelineGraph().chain(queue_element(f'{name}_q'), Element('hailooverlay', name))
 
 def OVERLAY_PIPELINE(name='hailo_overlay'):
     """
@@ -272,15 +572,29 @@ def OVERLAY_PIPELINE(name='hailo_overlay'):
     Returns:
         str: A string representing the GStreamer pipeline for the hailooverlay element.
     """
-    # Construct the overlay pipeline string
-    overlay_pipeline = (
-        f'{QUEUE(name=f"{name}_q")} ! '
-        f'hailooverlay name={name} '
+    return f'{overlay_graph(name).render()} '
+
+def display_graph(video_sink='autovideosink', sync='true', show_fps='false', name='hailo_display', report=None):
+    """Creates the graph for displaying the video. See DISPLAY_PIPELINE for the arguments."""
+    # Sinks that take any raw video need no conversion in front of them
+    need_convert = video_sink not in ANY_CAPS_SINKS
+    _record(report, [f'{name}_videoconvert_q', f'{name}_videoconvert'], need_convert, f'video-sink={video_sink}')
+
+    graph = PipelineGraph().chain(overlay_graph(name=f'{name}_overlay'))
+    if need_convert:
+        graph.chain(
+            graph.tail,
+            queue_element(f'{name}_videoconvert_q'),
+            Element('videoconvert', f'{name}_videoconvert', n_threads=2, qos=False),
+        )
+    return graph.chain(
+        graph.tail,
+        queue_element(f'{name}_q'),
+        Element('fpsdisplaysink', name, video_sink=video_sink, sync=sync, text_overlay=show_fps,
+                signal_fps_measurements=True),
     )
 
-    return overlay_pipeline
-
-def DISPLAY_PIPELINE(video_sink='autovideosink', sync='true', show_fps='false', name='hailo_display'):
+def DISPLAY_PIPELINE(video_sink='autovideosink', sync='true', show_fps='false', name='hailo_display', report=None):
     """
     Creates a GStreamer pipeline string for displaying the video.
     It includes the hailooverlay plugin to draw bounding boxes and labels on the video.
@@ -290,21 +604,28 @@ def DISPLAY_PIPELINE(video_sink='autovideosink', sync='true', show_fps='false',
         sync (str, optional): The sync property for the video sink. Defaults to 'true'.
         show_fps (str, optional): Whether to show the FPS on the video sink. Should be 'true' or 'false'. Defaults to 'false'.
         name (str, optional): The prefix name for the pipeline elements. Defaults to 'hailo_display'.
+        report (PipelineReport or None, optional): Collects the conversion elements kept or removed.
 
     Returns:
         str: A string representing the GStreamer pipeline for displaying the video.
     """
-    # Construct the display pipeline string
-    display_pipeline = (
-        f'{OVERLAY_PIPELINE(name=f"{name}_overlay")} ! '
-        f'{QUEUE(name=f"{name}_videoconvert_q")} ! '
-        f'videoconvert name={name}_videoconvert n-threads=2 qos=false ! '
-        f'{QUEUE(name=f"{name}_q")} ! '
-        f'fpsdisplaysink name={name} video-sink={video_sink} sync={sync} text-overlay={show_fps} signal-fps-measurements=true '
+    return f'{display_graph(video_sink, sync, show_fps, name, report).render()} '
+
+def h264_encoder_element(name=None, bitrate=5000, **properties):
+    """Creates the x264enc Element used by the file sink and preview outputs; extra properties (e.g. key_int_max) are added."""
+    return Element('x264enc', name, tune='zerolatency', bitrate=bitrate, **properties)
+
+def file_sink_graph(output_file='output.mkv', name='file_sink', bitrate=5000):
+    """Creates the graph for saving the video to a .mkv file. See FILE_SINK_PIPELINE."""
+    return PipelineGraph().chain(
+        queue_element(f'{name}_videoconvert_q'),
+        Element('videoconvert', f'{name}_videoconvert', n_threads=2, qos=False),
+        queue_element(f'{name}_encoder_q'),
+        h264_encoder_element(bitrate=bitrate),
+        Element('matroskamux'),
+        Element('filesink', location=output_file),
     )
 
-    return display_pipeline
-
 def FILE_SINK_PIPELINE(output_file='output.mkv', name='file_sink', bitrate=5000):
     """
     Creates a GStreamer pipeline string for saving the video to a file in .mkv format.
@@ -319,17 +640,43 @@ def FILE_SINK_PIPELINE(output_file='output.mkv', name='file_sink', bitrate=5000)
     Returns:
         str: A string representing the GStreamer pipeline for saving the video to a file.
     """
-    # Construct the file sink pipeline string
-    file_sink_pipeline = (
-        f'{QUEUE(name=f"{name}_videoconvert_q")} ! '
-        f'videoconvert name={name}_videoconvert n-threads=2 qos=false ! '
-        f'{QUEUE(name=f"{name}_encoder_q")} ! '
-        f'x264enc tune=zerolatency bitrate={bitrate} ! '
-        f'matroskamux ! '
-        f'filesink location={output_file} '
+    return f'{file_sink_graph(output_file, name, bitrate).render()} '
+
+def preview_graph(width, height, name='preview', bitrate=500, key_int_max=20):
+    """Creates the graph for the H.264 preview output. See PREVIEW_PIPELINE for the arguments."""
+    return PipelineGraph().chain(
+        Element('videoconvert', f'{name}_videoconvert', n_threads=2, qos=False),
+        Element('videoscale', f'{name}_videoscale', n_threads=2),
+        caps_element(f'video/x-raw, format=I420, width={width}, height={height}', f'{name}_caps'),
+        queue_element(f'{name}_encoder_q', leaky='downstream'),
+        h264_encoder_element(f'{name}_encoder', bitrate=bitrate, key_int_max=key_int_max),
+        Element('h264parse', f'{name}_parse', config_interval=-1),
+        Element('mpegtsmux', f'{name}_mux'),
+        Element('appsink', f'{name}_sink', emit_signals=True, sync=False, max_buffers=0, drop=False),
     )
 
-    return file_sink_pipeline
+def PREVIEW_PIPELINE(width, height, name='preview', bitrate=500, key_int_max=20):
+    """
+    Creates a GStreamer pipeline string that encodes raw frames into a low-bitrate H.264 MPEG-TS stream
+    for HLS previews, using the same x264enc settings as FILE_SINK_PIPELINE.
+    The muxed stream is pulled from the appsink named '{name}_sink'; every buffer that is not flagged as
+    a delta unit starts at a keyframe and can begin a new segment.
+
+    Args:
+        width (int): Width of the preview in pixels.
+        height (int): Height of the preview in pixels.
+        name (str, optional): The prefix name for the pipeline elements. Defaults to 'preview'.
+        bitrate (int, optional): The bitrate for the encoder in kbit/s. Defaults to 500.
+        key_int_max (int, optional): Maximum number of frames between keyframes. Defaults to 20.
+
+    Returns:
+        str: A string representing the GStreamer pipeline for the preview output.
+    """
+    return f'{preview_graph(width, height, name, bitrate, key_int_max).render()} '
+
+def user_callback_graph(name='identity_callback'):
+    """Creates the graph for the user callback element. See USER_CALLBACK_PIPELINE."""
+    return PipelineGraph().chain(queue_element(f'{name}_q'), Element('identity', name))
 
 def USER_CALLBACK_PIPELINE(name='identity_callback'):
     """
@@ -341,14 +688,26 @@ def USER_CALLBACK_PIPELINE(name='identity_callback'):
     Returns:
         str: A string representing the GStreamer pipeline for the user callback element.
     """
-    # Construct the user callback pipeline string
-    user_callback_pipeline = (
-        f'{QUEUE(name=f"{name}_q")} ! '
-        f'identity name={name} '
+    return f'{user_callback_graph(name).render()} '
+
+def tracker_graph(class_id, kalman_dist_thr=0.7, iou_thr=0.85, init_iou_thr=0.6, keep_new_frames=3, keep_tracked_frames=45, keep_lost_frames=20, keep_past_metadata=True, qos=False, name='hailo_tracker'):
+    """Creates the graph for the HailoTracker element. See TRACKER_PIPELINE for the arguments."""
+    return PipelineGraph().chain(
+        Element(
+            'hailotracker', name,
+            class_id=class_id,
+            kalman_dist_thr=kalman_dist_thr,
+            iou_thr=iou_thr,
+            init_iou_thr=init_iou_thr,
+            keep_new_frames=keep_new_frames,
+            keep_tracked_frames=keep_tracked_frames,
+            keep_lost_frames=keep_lost_frames,
+            keep_past_metadata=keep_past_metadata,
+            qos=qos,
+        ),
+        queue_element(f'{name}_q'),
     )
 
-    return user_callback_pipeline
-
 def TRACKER_PIPELINE(class_id, kalman_dist_thr=0.7, iou_thr=0.85, init_iou_thr=0.6, keep_new_frames=3, keep_tracked_frames=45, keep_lost_frames=20, keep_past_metadata=True, qos=False, name='hailo_tracker'):
     """
     Creates a GStreamer pipeline string for the HailoTracker element.
@@ -368,13 +727,9 @@ def TRACKER_PIPELINE(class_id, kalman_dist_thr=0.7, iou_thr=0.85, init_iou_thr=0
     Returns:
         str: A string representing the GStreamer pipeline for the HailoTracker element.
     """
-    # Construct the tracker pipeline string
-    tracker_pipeline = (
-        f'hailotracker name={name} class-id={class_id} kalman-dist-thr={kalman_dist_thr} iou-thr={iou_thr} init-iou-thr={init_iou_thr} '
-        f'keep-new-frames={keep_new_frames} keep-tracked-frames={keep_tracked_frames} keep-lost-frames={keep_lost_frames} keep-past-metadata={keep_past_metadata} qos={qos} ! '
-        f'{QUEUE(name=f"{name}_q")} '
-    )
-    return tracker_pipeline
+    graph = tracker_graph(class_id, kalman_dist_thr, iou_thr, init_iou_thr, keep_new_frames, keep_tracked_frames,
+                          keep_lost_frames, keep_past_metadata, qos, name)
+    return f'{graph.render()} '
 
 def CROPPER_PIPELINE(
     inner_pipeline,
@@ -408,30 +763,24 @@ def CROPPER_PIPELINE(
     Returns:
         str: A pipeline string representing hailocropper + aggregator around the inner_pipeline.
     """
-    return (
-        f'{QUEUE(name=f"{name}_input_q")} ! '
-        f'hailocropper name={name}_cropper '
-        f'so-path={so_path} '
-        f'function-name={function_name} '
-        f'use-letterbox={str(use_letterbox).lower()} '
-        f'no-scaling-bbox={str(no_scaling_bbox).lower()} '
-        f'internal-offset={str(internal_offset).lower()} '
-        f'resize-method={resize_method} '
-        f'hailoaggregator name={name}_agg '
-        # bypass
-        f'{name}_cropper. ! '
-        f'{QUEUE(name=f"{name}_bypass_q", max_size_buffers=bypass_max_size_buffers)} ! {name}_agg.sink_0 '
-        # pipeline for the actual inference
-        f'{name}_cropper. ! {inner_pipeline} ! {name}_agg.sink_1 '
-        # aggregator output
-        f'{name}_agg. ! {QUEUE(name=f"{name}_output_q")} '
+    cropper = Element(
+        'hailocropper', f'{name}_cropper',
+        so_path=so_path,
+        function_name=function_name,
+        use_letterbox=use_letterbox,
+        no_scaling_bbox=no_scaling_bbox,
+        internal_offset=internal_offset,
+        resize_method=resize_method,
     )
+    graph = _crop_and_aggregate_graph(inner_pipeline, cropper, name, bypass_max_size_buffers)
+    return f'{graph.render()} '
 
 def CROP_PIPELINE(so_path, function_name="crop_person_by_id", config_json=None, name="cropper", output_path="/tmp/crop_%05d.jpg"):
-    config_str = f' config-path={config_json} ' if config_json else ''
-    return (
-        f'{QUEUE(name=f"{name}_q")} ! '
-        f'hailofilter name={name} so-path={so_path} function-name={function_name}{config_str} qos=false ! '
-        f'jpegenc ! multifilesink location={output_path} '
-    ) 
-
+    graph = PipelineGraph().chain(
+        queue_element(f'{name}_q'),
+        Element('hailofilter', name, so_path=so_path, function_name=function_name,
+                config_path=config_json or None, qos=False),
+        Element('jpegenc'),
+        Element('multifilesink', location=output_path),
+    )
+    return f'{graph.render()} '
@@ -108,6 +108,10 @@ def get_default_parser():
         help="Disables the user's custom callback function in the pipeline. Use this option to run the pipeline without invoking the callback logic."
     )
     parser.add_argument("--dump-dot", action="store_true", help="Dump the pipeline graph to a dot file pipeline.dot")
+    parser.add_argument(
+        "--build-graph", action="store_true",
+        help="Create the pipeline elements directly from the pipeline graph instead of parsing the launch string. Only for apps that compose a pipeline graph."
+    )
     return parser
 
 
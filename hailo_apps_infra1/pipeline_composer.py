@@ -0,0 +1,229 @@
+"""
+Pipeline composer for the multi-source detection app.
+Builds the full pipeline graph from the helper stages, tracking the caps flowing between
+stages so only the conversion elements that are actually needed are emitted. The graph is
+validated before it is rendered to a launch string.
+
+Dry run (no Hailo device or GStreamer needed):
+    python -m hailo_apps_infra1.pipeline_composer rtsp://camera1 rtsp://camera2 --dry-run
+    (the inference videoscale is only left out with --hef <real HEF> or --network-size 640x640)
+Offline parse check with stand-in elements (needs GStreamer only):
+    python -m hailo_apps_infra1.pipeline_composer rtsp://camera1 --parse
+Structural validation (add --check-factories to also check element properties against installed plugins):
+    python -m hailo_apps_infra1.pipeline_composer rtsp://camera1 --validate
+"""
+
+import argparse
+import re
+from hailo_apps_infra1.gstreamer_helper_pipelines import (
+    source_graph,
+    inference_graph,
+    inference_wrapper_graph,
+    tracker_graph,
+    user_callback_graph,
+    display_graph,
+    VideoCaps,
+    PipelineReport,
+    cropper_output_caps,
+    get_hef_input_size,
+)
+from hailo_apps_infra1.pipeline_graph import PipelineGraph
+
+# Hailo elements and the core GStreamer elements that can stand in for them when parsing offline
+STAND_IN_ELEMENTS = {
+    'hailonet': 'identity',
+    'hailofilter': 'identity',
+    'hailotracker': 'identity',
+    'hailooverlay': 'identity',
+    'hailocropper': 'tee',
+    'hailoaggregator': 'funnel',
+}
+
+_PROPERTY_RE = re.compile(r'^[A-Za-z][\w-]*=\S*$')
+
+
+def get_callback_element_name(source_index):
+    """Returns the identity element the user callback is attached to for a source."""
+    return "identity_callback" if source_index == 0 else f"identity_callback_{source_index}"
+
+
+def get_display_element_name(source_index):
+    """Returns the display sink name for a source."""
+    return "hailo_display" if source_index == 0 else f"source_display_{source_index}"
+
+
+def compose_multi_source_graph(
+    video_sources,
+    hef_path,
+    post_process_so,
+    post_function_name,
+    batch_size,
+    labels_json,
+    thresholds_str,
+    video_width=1280,
+    video_height=720,
+    video_format='RGB',
+    video_sink='autovideosink',
+    sync='false',
+    show_fps=False,
+    source_options=None,
+    queue_policies=None,
+    report=None,
+    network_size=None
+):
+    """
+    Creates the pipeline graph with one independent detection branch per video source.
+
+    Args:
+        video_sources (list): Video source URLs or device paths.
+        source_options (list or None): Extra source_graph keyword arguments per source.
+        queue_policies (list or None): Per source, a dict of {queue name pattern: QueuePolicy}
+            applied to the queues of that source's branch only.
+        report (PipelineReport or None): Collects the conversion elements kept or removed.
+        network_size (tuple or None): (width, height) of the HEF input; None reads it from the HEF.
+            If it stays unknown, the inference videoscale is kept.
+        The remaining arguments are passed to the corresponding helper stages.
+
+    Returns:
+        PipelineGraph: The complete pipeline graph.
+    """
+    source_options = source_options or [{} for _ in video_sources]
+    queue_policies = queue_policies or [None for _ in video_sources]
+    if network_size is None:
+        network_size = get_hef_input_size(hef_path)
+    graph = PipelineGraph()
+
+    for i, video_source in enumerate(video_sources):
+        source = source_graph(
+            video_source, video_width, video_height, video_format,
+            name=f"src_{i}", source_index=i, report=report, **source_options[i])
+        source_caps = VideoCaps(video_format, video_width, video_height)
+
+        detection = inference_graph(
+            hef_path=hef_path,
+            post_process_so=post_process_so,
+            post_function_name=post_function_name,
+            batch_size=batch_size,
+            config_json=labels_json,
+            additional_params=thresholds_str,
+            name=f"infer_{i}",
+            input_caps=cropper_output_caps(source_caps, network_size),
+            report=report,
+            network_size=network_size)
+
+        branch = PipelineGraph().chain(
+            source,
+            inference_wrapper_graph(detection, name=f"inference_wrapper_{i}"),
+            tracker_graph(class_id=1, keep_past_metadata=True, name=f"tracker_{i}"),
+            user_callback_graph(name=get_callback_element_name(i)),
+            display_graph(
+                video_sink=video_sink, sync=sync, show_fps=show_fps,
+                name=get_display_element_name(i), report=report),
+        )
+        if queue_policies[i]:
+            branch.apply_queue_policies(queue_policies[i])
+        graph.add(branch)
+
+    return graph
+
+
+def compose_multi_source_pipeline(*args, **kwargs):
+    """
+    Creates the validated pipeline string with one independent detection branch per video source.
+    Takes the same arguments as compose_multi_source_graph.
+
+    Returns:
+        str: A string representing the complete GStreamer pipeline.
+    """
+    graph = compose_multi_source_graph(*args, **kwargs)
+    graph.assert_valid()
+    return graph.render()
+
+
+def to_stand_in_pipeline(pipeline_string):
+    """
+    Replace Hailo elements with core GStreamer stand-ins so the pipeline can be parsed without Hailo plugins.
+    Element names are kept, Hailo-specific properties are dropped.
+    """
+    tokens = pipeline_string.split()
+    result = []
+    skipping_properties = False
+    for token in tokens:
+        if token in STAND_IN_ELEMENTS:
+            result.append(STAND_IN_ELEMENTS[token])
+            skipping_properties = True
+            continue
+        if skipping_properties and _PROPERTY_RE.match(token):
+            if token.startswith('name='):
+                result.append(token)
+            continue
+        skipping_properties = False
+        result.append(token)
+    return ' '.join(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compose the multi-source detection pipeline")
+    parser.add_argument("sources", nargs="+", help="Video sources")
+    parser.add_argument("--video-sink", default="autovideosink", help="Display sink element")
+    parser.add_argument("--inference-fps", type=int, default=None, help="Per-camera inference frame rate")
+    parser.add_argument("--skip-frame", action="store_true", help="Let RTSP decoders skip non-reference frames")
+    parser.add_argument("--hef", default="model.hef", help="HEF file the network input size is read from")
+    parser.add_argument("--network-size", default=None,
+                        help="Network input size as WIDTHxHEIGHT, instead of reading it from the HEF")
+    parser.add_argument("--dry-run", action="store_true", help="Print the pipeline and the removed conversion elements")
+    parser.add_argument("--parse", action="store_true", help="Parse the pipeline with stand-in elements (needs GStreamer)")
+    parser.add_argument("--validate", action="store_true", help="Only validate the pipeline graph")
+    parser.add_argument("--check-factories", action="store_true",
+                        help="Also validate element factories and properties (needs GStreamer and the Hailo plugins)")
+    args = parser.parse_args()
+
+    report = PipelineReport()
+    graph = compose_multi_source_graph(
+        args.sources,
+        hef_path=args.hef,
+        post_process_so='libpostprocess.so',
+        post_function_name='filter_letterbox',
+        batch_size=2,
+        labels_json=None,
+        thresholds_str='',
+        video_sink=args.video_sink,
+        source_options=[{"frame_rate": args.inference_fps, "skip_frame": args.skip_frame} for _ in args.sources],
+        report=report,
+        network_size=tuple(int(value) for value in args.network_size.lower().split("x")) if args.network_size else None)
+
+    if args.check_factories:
+        import gi
+        gi.require_version('Gst', '1.0')
+        from gi.repository import Gst
+        Gst.init(None)
+    problems = graph.validate(check_factories=args.check_factories)
+    if args.validate or args.check_factories:
+        for problem in problems:
+            print(f"[ERROR] {problem}")
+        print(f"{len(graph.elements)} elements, {len(graph.links)} links, {len(problems)} problem(s)")
+        return
+    if problems:
+        raise SystemExit("Invalid pipeline: " + "; ".join(problems))
+    pipeline_string = graph.render()
+
+    if args.dry_run or not args.parse:
+        print(pipeline_string)
+        print()
+        print(report.format())
+
+    if args.parse:
+        import gi
+        gi.require_version('Gst', '1.0')
+        from gi.repository import Gst
+        Gst.init(None)
+        pipeline = Gst.parse_launch(to_stand_in_pipeline(pipeline_string))
+        it = pipeline.iterate_elements()
+        count = 0
+        while it.next()[0] == Gst.IteratorResult.OK:
+            count += 1
+        print(f"Parsed stand-in pipeline with {count} elements")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+"""
+Structured pipeline graph model.
+Pipelines are described as elements (factory, name, properties) and links between them.
+A graph renders to a gst-launch string or builds the elements programmatically, can apply
+queue policies per stage and is validated before anything is handed to GStreamer.
+"""
+
+import fnmatch
+import re
+from collections import namedtuple
+
+# Queue configuration applied to queue elements by name pattern
+QueuePolicy = namedtuple('QueuePolicy', ['leaky', 'max_size_buffers', 'max_size_bytes', 'max_size_time'])
+
+QUEUE_LEAKY_VALUES = ('no', 'upstream', 'downstream')
+
+# GStreamer's own queue limits, used when a queue does not set them explicitly
+QUEUE_DEFAULT_LIMITS = {'max-size-buffers': 200, 'max-size-bytes': 10485760, 'max-size-time': 1000000000}
+
+Link = namedtuple('Link', ['src', 'dst', 'src_pad', 'dst_pad'])
+
+
+class PipelineValidationError(ValueError):
+    """Raised when a pipeline graph fails validation."""
+
+
+# Characters a property value can be rendered with unquoted; anything else ('!', '=', quotes,
+# spaces, ...) would be read as launch syntax
+_UNQUOTED_VALUE = re.compile(r'[A-Za-z0-9_.:/+@%-]+')
+
+
+def _property_value(value):
+    """A property value as the string GStreamer deserializes it from."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _format_value(value):
+    text = _property_value(value)
+    if _UNQUOTED_VALUE.fullmatch(text):
+        return text
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class Element:
+    """A single GStreamer element: factory name, optional instance name and properties."""
+
+    def __init__(self, factory, name=None, **properties):
+        """
+        Args:
+            factory: GStreamer factory name (e.g. 'queue')
+            name: Element name, required for elements referenced from more than one link
+            **properties: Element properties; underscores in keys are rendered as dashes
+        """
+        self.factory = factory
+        self.name = name
+        self.properties = {}
+        self.set(**properties)
+
+    def set(self, **properties):
+        """Set properties, skipping those whose value is None."""
+        for key, value in properties.items():
+            if value is not None:
+                self.properties[key.replace('_', '-')] = value
+        return self
+
+    def render(self):
+        parts = [self.factory]
+        if self.name:
+            parts.append(f'name={self.name}')
+        parts.extend(f'{key}={_format_value(value)}' for key, value in self.properties.items())
+        return ' '.join(parts)
+
+    def __repr__(self):
+        return f'Element({self.render()})'
+
+
+class LaunchFragment(Element):
+    """An opaque, already rendered launch string fragment (kept for string-based callers)."""
+
+    def __init__(self, text):
+        super().__init__('fragment')
+        self.text = text.strip().rstrip('!').strip()
+
+    def render(self):
+        return self.text
+
+
+class PipelineGraph:
+    """A set of elements and links. A graph used as a stage also tracks its head and tail element."""
+
+    def __init__(self):
+        self.elements = []
+        self.links = []
+        self.head = None
+        self.tail = None
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+    def add(self, item):
+        """Add an Element or merge another PipelineGraph. Returns the item."""
+        if isinstance(item, PipelineGraph):
+            for element in item.elements:
+                self.add(element)
+            self.links.extend(item.links)
+        elif item not in self.elements:
+            self.elements.append(item)
+        return item
+
+    def link(self, src, dst, src_pad=None, dst_pad=None):
+        """Link two elements (or the tail of one stage to the head of another)."""
+        src = src.tail if isinstance(src, PipelineGraph) else src
+        dst = dst.head if isinstance(dst, PipelineGraph) else dst
+        self.links.append(Link(src, dst, src_pad, dst_pad))
+        return self
+
+    def chain(self, *items):
+        """Add items and link them one after the other; None items are skipped."""
+        previous = None
+        for item in items:
+            if item is None:
+                continue
+            self.add(item)
+            head = item.head if isinstance(item, PipelineGraph) else item
+            if previous is None:
+                if self.head is None:
+                    self.head = head
+            else:
+                self.link(previous, item)
+            previous = item
+        if previous is not None:
+            self.tail = previous.tail if isinstance(previous, PipelineGraph) else previous
+        return self
+
+    def get(self, name):
+        """Return the element with the given name, or None."""
+        for element in self.elements:
+            if element.name == name:
+                return element
+        return None
+
+    def queues(self, pattern='*'):
+        """Return the queue elements whose name matches the fnmatch pattern."""
+        return [
+            element for element in self.elements
+            if element.factory == 'queue' and element.name and fnmatch.fnmatch(element.name, pattern)
+        ]
+
+    def apply_queue_policies(self, policies):
+        """
+        Apply queue policies by element name pattern. Later patterns override earlier ones.
+
+        Args:
+            policies: Dict (or list of pairs) of {fnmatch pattern: QueuePolicy}
+
+        Returns:
+            int: Number of queue settings applied
+        """
+        items = policies.items() if isinstance(policies, dict) else policies
+        applied = 0
+        for pattern, policy in items:
+            for queue in self.queues(pattern):
+                queue.set(
+                    leaky=policy.leaky,
+                    max_size_buffers=policy.max_size_buffers,
+                    max_size_bytes=policy.max_size_bytes,
+                    max_size_time=policy.max_size_time,
+                )
+                applied += 1
+        return applied
+
+    # ------------------------------------------------------------------
+    # Validation
+    # ------------------------------------------------------------------
+    def validate(self, check_factories=False):
+        """
+        Check the graph for structural problems.
+
+        Args:
+            check_factories: Also check element factories and property names against the
+                             installed GStreamer plugins (requires GStreamer)
+
+        Returns:
+            List of problem descriptions (empty when valid)
+        """
+        problems = []
+        names = [element.name for element in self.elements if element.name]
+        for name in sorted(set(n for n in names if names.count(n) > 1)):
+            problems.append(f'duplicate element name: {name}')
+
+        linked = set()
+        for link in self.links:
+            for endpoint in (link.src, link.dst):
+                if endpoint not in self.elements:
+                    problems.append(f'link endpoint not in graph: {endpoint!r}')
+                linked.add(id(endpoint))
+        if len(self.elements) > 1:
+            for element in self.elements:
+                if id(element) not in linked:
+                    problems.append(f'unlinked element: {element.name or element.factory}')
+
+        try:
+            self.render()
+        except PipelineValidationError as e:
+            problems.append(str(e))
+
+        for queue in self.queues():
+            leaky = queue.properties.get('leaky', 'no')
+            if leaky not in QUEUE_LEAKY_VALUES:
+                problems.append(f'{queue.name}: invalid leaky value {leaky!r}')
+            limits = [queue.properties.get(key, default) for key, default in QUEUE_DEFAULT_LIMITS.items()]
+            if any(not isinstance(v, int) or v < 0 for v in limits):
+                problems.append(f'{queue.name}: queue limits must be non-negative integers')
+            elif all(v == 0 for v in limits):
+                problems.append(f'{queue.name}: unbounded queue (all limits are 0)')
+
+        if check_factories:
+            problems.extend(self._validate_factories())
+        return problems
+
+    def assert_valid(self, check_factories=False):
+        """Raise PipelineValidationError if validate() reports problems."""
+        problems = self.validate(check_factories)
+        if problems:
+            raise PipelineValidationError('; '.join(problems))
+
+    def _validate_factories(self):
+        from gi.repository import Gst
+        problems = []
+        for element in self.elements:
+            if isinstance(element, LaunchFragment):
+                continue
+            factory = Gst.ElementFactory.find(element.factory)
+            if factory is None:
+                problems.append(f'unknown element factory: {element.factory}')
+                continue
+            instance = factory.create(None)
+            for key in element.properties:
+                if instance.find_property(key) is None:
+                    problems.append(f'{element.name or element.factory}: unknown property {key}')
+        return problems
+
+    # ------------------------------------------------------------------
+    # Rendering
+    # ------------------------------------------------------------------
+    def _outgoing(self, element):
+        return [link for link in self.links if link.src is element]
+
+    def _incoming(self, element):
+        return [link for link in self.links if link.dst is element]
+
+    def _is_inline(self, link):
+        """A link can be written as 'a ! b' when it is the only link on both sides and uses no pad names."""
+        return (link.src_pad is None and link.dst_pad is None
+                and len(self._outgoing(link.src)) == 1 and len(self._incoming(link.dst)) == 1)
+
+    @staticmethod
+    def _reference(element, pad):
+        if not element.name:
+            raise PipelineValidationError(f'element referenced from a branch needs a name: {element!r}')
+        return f'{element.name}.{pad}' if pad else f'{element.name}.'
+
+    def render(self):
+        """
+        Render the graph to a gst-launch string.
+        Linear runs are written as 'a ! b ! c'; branches use 'name.' / 'name.pad' references.
+        """
+        chains = []
+        chained = set()
+        for element in self.elements:
+            if id(element) in chained:
+                continue
+            incoming = self._incoming(element)
+            if len(incoming) == 1 and self._is_inline(incoming[0]):
+                continue  # rendered as part of the chain of its predecessor
+            chain = [element]
+            chained.add(id(element))
+            while True:
+                outgoing = self._outgoing(chain[-1])
+                if len(outgoing) == 1 and self._is_inline(outgoing[0]) and id(outgoing[0].dst) not in chained:
+                    chain.append(outgoing[0].dst)
+                    chained.add(id(outgoing[0].dst))
+                else:
+                    break
+            chains.append(chain)
+
+        parts = []
+        rendered_links = set()
+        for chain in chains:
+            text = ' ! '.join(element.render() for element in chain)
+            incoming = self._incoming(chain[0])
+            if len(incoming) == 1:
+                link = incoming[0]
+                text = f'{self._reference(link.src, link.src_pad)} ! {text}'
+                rendered_links.add(id(link))
+            outgoing = self._outgoing(chain[-1])
+            if len(outgoing) == 1 and len(self._incoming(outgoing[0].dst)) > 1:
+                link = outgoing[0]
+                text = f'{text} ! {self._reference(link.dst, link.dst_pad)}'
+                rendered_links.add(id(link))
+            parts.append(text)
+
+        for chain in chains:
+            for element in chain:
+                for link in self._outgoing(element):
+                    if id(link) in rendered_links or self._is_inline(link):
+                        continue
+                    parts.append(f'{self._reference(link.src, link.src_pad)} ! {self._reference(link.dst, link.dst_pad)}')
+                    rendered_links.add(id(link))
+        return ' '.join(parts)
+
+    # ------------------------------------------------------------------
+    # Programmatic construction
+    # ------------------------------------------------------------------
+    def build(self, pipeline=None):
+        """
+        Create and link the elements in a Gst.Pipeline without going through the launch parser.
+        Links to pads that only appear at runtime (rtspsrc, decodebin) are completed on pad-added.
+
+        Returns:
+            Gst.Pipeline
+        """
+        from gi.repository import Gst
+        self.assert_valid()
+        pipeline = pipeline or Gst.Pipeline.new(None)
+        instances = {}
+        for element in self.elements:
+            if isinstance(element, LaunchFragment):
+                raise PipelineValidationError(f'cannot build opaque launch fragment: {element.text}')
+            instance = Gst.ElementFactory.make(element.factory, element.name)
+            if instance is None:
+                raise PipelineValidationError(f'could not create element {element.factory}')
+            for key, value in element.properties.items():
+                Gst.util_set_object_arg(instance, key, _property_value(value))
+            pipeline.add(instance)
+            instances[id(element)] = instance
+
+        for link in self.links:
+            src, dst = instances[id(link.src)], instances[id(link.dst)]
+            if src.link_pads(link.src_pad, dst, link.dst_pad):
+                continue
+            # Sometimes pads: link once the source pad shows up
+            src.connect('pad-added', _link_dynamic_pad, dst, link.dst_pad)
+        return pipeline
+
+
+def _get_sink_pad(dst, dst_pad_name, caps):
+    """
+    Return the sink pad of dst to link a source pad with caps to: the named or 'sink' static pad,
+    otherwise a new pad from its request pad template (e.g. 'sink_%u'; the one matching dst_pad_name
+    if given). Templates whose caps cannot intersect caps are skipped, so no pad is requested for
+    a source pad that could never link to it.
+
+    Returns:
+        Tuple of (pad, requested), or (None, False) if dst has no compatible sink pad
+    """
+    from gi.repository import Gst
+    sink_pad = dst.get_static_pad(dst_pad_name or 'sink')
+    if sink_pad is not None:
+        return sink_pad, False
+    for template in dst.get_pad_template_list():
+        if template.direction != Gst.PadDirection.SINK or template.presence != Gst.PadPresence.REQUEST:
+            continue
+        if dst_pad_name is not None:
+            # Only the template the requested name belongs to, e.g. sink_%u for sink_1
+            prefix = template.name_template.split('%')[0]
+            if not dst_pad_name.startswith(prefix):
+                continue
+        if not caps.can_intersect(template.get_caps()):
+            continue
+        sink_pad = dst.request_pad(template, dst_pad_name, None)
+        if sink_pad is not None:
+            return sink_pad, True
+    return None, False
+
+
+def _link_dynamic_pad(element, pad, dst, dst_pad_name):
+    from gi.repository import Gst
+    if pad.is_linked():
+        return
+    sink_pad, requested = _get_sink_pad(dst, dst_pad_name, pad.query_caps(None))
+    if sink_pad is None:
+        return  # e.g. the audio pad of a source linked to a video-only element
+    if not sink_pad.is_linked() and pad.can_link(sink_pad) and pad.link(sink_pad) == Gst.PadLinkReturn.OK:
+        return
+    if requested:
+        dst.release_request_pad(sink_pad)
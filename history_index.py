@@ -0,0 +1,224 @@
+"""
+History index module.
+Keeps a time-ordered index over the entry/exit history of every zone so history queries
+(time range, camera, zone and action filters with cursor pagination) read only the events
+they return instead of serializing every zone's complete history list.
+The index follows the history lists lazily: new events are indexed on the next query. Every
+snapshot that records events has a new history list that starts with the previous one (the same
+event objects), so new events extend the index; a zone whose history no longer starts with the
+indexed events (reset or recreated zone) is reindexed.
+"""
+
+import base64
+import bisect
+import datetime
+import heapq
+import json
+import threading
+from config import HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE
+
+# Format of the 'time' field of history events; it sorts chronologically as a string
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_AFTER_ANY_INDEX = float("inf")
+
+
+def parse_time(value):
+    """
+    Parse a time filter into the history time format.
+
+    Args:
+        value: 'YYYY-MM-DD HH:MM:SS', an ISO 8601 date/time, or Unix seconds (local time, like the history)
+
+    Returns:
+        str: The time formatted like history events
+
+    Raises:
+        ValueError: If the value is not a recognized time
+    """
+    value = str(value).strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        moment = datetime.datetime.fromisoformat(value)
+    else:
+        try:
+            moment = datetime.datetime.fromtimestamp(seconds)
+        except (OverflowError, OSError) as e:
+            raise ValueError(f"timestamp out of range: {value}") from e
+    return moment.strftime(TIME_FORMAT)
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decode a next_cursor value.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        time_str, camera_id, zone, index = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(time_str), str(camera_id), str(zone), int(index)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"invalid cursor: {e}")
+
+
+class _ZoneIndex:
+    """Sorted (time, position) keys of one zone's history list."""
+
+    def __init__(self, history):
+        self.history = history
+        self.keys = []
+        self.extend()
+
+    def continues(self, history):
+        """Whether history starts with the indexed events, i.e. is a later version of the same zone's history."""
+        indexed = len(self.keys)
+        return len(history) >= indexed and (indexed == 0 or history[indexed - 1] is self.history[indexed - 1])
+
+    def extend(self):
+        """Index the events appended since the last call."""
+        history = self.history
+        keys = self.keys
+        for position in range(len(keys), len(history)):
+            key = (history[position].get("time", ""), position)
+            if not keys or key >= keys[-1]:
+                keys.append(key)
+            else:
+                bisect.insort(keys, key)  # the clock went back; rare
+
+
+class HistoryIndex:
+    """Time index over the zone histories of a MultiSourceZoneVisitorCounter."""
+
+    def __init__(self, user_data):
+        """
+        Args:
+            user_data: MultiSourceZoneVisitorCounter instance
+        """
+        self.user_data = user_data
+        self._lock = threading.Lock()
+        self._zones = {}  # {(camera_id, zone): _ZoneIndex}
+        self._stats = {"queries": 0, "reindexed_zones": 0}
+
+    def _sync(self, camera_ids=None, zones=None):
+        """
+        Bring the index of the selected zones up to date.
+
+        Returns:
+            Dict of {(camera_id, zone): _ZoneIndex} for the selected zones that exist
+        """
+        selected = {}
+        for camera_id, camera_data in self.user_data.get_snapshot().items():
+            if camera_ids is not None and camera_id not in camera_ids:
+                continue
+            for zone, zone_data in camera_data["zones"].items():
+                if zones is not None and zone not in zones:
+                    continue
+                history = zone_data.get("history", [])
+                entry = self._zones.get((camera_id, zone))
+                if entry is None or not entry.continues(history):
+                    if entry is not None:
+                        self._stats["reindexed_zones"] += 1
+                    entry = self._zones[(camera_id, zone)] = _ZoneIndex(history)
+                elif entry.history is not history:
+                    entry.history = history
+                    entry.extend()
+                selected[(camera_id, zone)] = entry
+        # Forget deleted zones
+        if camera_ids is None and zones is None:
+            for key in set(self._zones) - set(selected):
+                del self._zones[key]
+        return selected
+
+    def query(self, camera_ids=None, zones=None, actions=None, start=None, end=None, cursor=None,
+              limit=HISTORY_PAGE_SIZE):
+        """
+        Get one page of history events, oldest first.
+
+        Args:
+            camera_ids: Cameras to include, None for all
+            zones: Zone names to include, None for all
+            actions: Actions to include ('Entered', 'Exited'), None for all
+            start: Earliest event time (inclusive), in the history time format
+            end: Latest event time (inclusive), in the history time format
+            cursor: next_cursor of the previous page
+            limit: Page size (1 to HISTORY_MAX_PAGE_SIZE)
+
+        Returns:
+            Dict with 'events' [{camera_id, zone, id, action, time}] and 'next_cursor' (None on the last page)
+
+        Raises:
+            ValueError: If the limit or the cursor is invalid
+        """
+        if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {HISTORY_MAX_PAGE_SIZE}")
+        after = decode_cursor(cursor) if cursor else None
+
+        with self._lock:
+            self._stats["queries"] += 1
+            selected = self._sync(camera_ids, zones)
+            # Events are ordered by (time, camera_id, zone, position); every zone contributes the key range
+            # between the cursor/start and the end, and the ranges are merged
+            ranges = []
+            for (camera_id, zone), entry in sorted(selected.items()):
+                keys = entry.keys
+                low = bisect.bisect_left(keys, (start,)) if start else 0
+                if after:
+                    after_time, after_camera, after_zone, after_position = after
+                    if (camera_id, zone) < (after_camera, after_zone):
+                        position = _AFTER_ANY_INDEX
+                    elif (camera_id, zone) == (after_camera, after_zone):
+                        position = after_position
+                    else:
+                        position = -1
+                    low = max(low, bisect.bisect_right(keys, (after_time, position)))
+                high = bisect.bisect_right(keys, (end, _AFTER_ANY_INDEX)) if end else len(keys)
+                if low < high:
+                    ranges.append(self._iter_range(camera_id, zone, entry, low, high))
+
+            events = []
+            last_key = None
+            for time_str, camera_id, zone, position, event in heapq.merge(*ranges, key=lambda item: item[:4]):
+                if actions is not None and event.get("action") not in actions:
+                    continue
+                if len(events) == limit:
+                    return {"events": events, "next_cursor": encode_cursor(last_key)}
+                events.append(dict(event, camera_id=camera_id, zone=zone))
+                last_key = [time_str, camera_id, zone, position]
+        return {"events": events, "next_cursor": None}
+
+    def get_zone_events(self, camera_id, zone, since):
+        """
+        Get the history events of one zone at or after a time.
+
+        Args:
+            since: Earliest event time (inclusive), in the history time format
+
+        Returns:
+            List of history events, oldest first
+        """
+        with self._lock:
+            entry = self._sync([camera_id], [zone]).get((camera_id, zone))
+            if entry is None:
+                return []
+            low = bisect.bisect_left(entry.keys, (since,))
+            return [entry.history[position] for _, position in entry.keys[low:]]
+
+    def get_stats(self):
+        """Return the number of indexed zones and events, queries served and reindexed zones."""
+        with self._lock:
+            return dict(self._stats, zones=len(self._zones),
+                        events=sum(len(entry.keys) for entry in self._zones.values()))
+
+    @staticmethod
+    def _iter_range(camera_id, zone, entry, low, high):
+        keys = entry.keys
+        history = entry.history
+        for index in range(low, high):
+            time_str, position = keys[index]
+            yield time_str, camera_id, zone, position, history[position]
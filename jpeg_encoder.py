@@ -0,0 +1,152 @@
+"""
+Image encoding service for video feeds, snapshots and placeholders.
+Runs every encode on a bounded pool of worker threads sized to the CPU count, using libjpeg-turbo
+through PyTurboJPEG when it is installed and OpenCV otherwise. Frames are RGB, as the pipeline
+produces them, so TurboJPEG encodes them without a color conversion; the OpenCV fallback converts
+after downscaling. Resize and conversion buffers are kept per worker and reused.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from server_mode import wait_future
+from metrics import ENCODE_SECONDS
+from config import JPEG_ENCODER_WORKERS, JPEG_ENCODER_TURBOJPEG, JPEG_ENCODER_STATS_WINDOW
+
+# libjpeg-turbo bindings are optional
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+except ImportError:
+    TurboJPEG = None
+
+# Image formats frames can be encoded to, with their OpenCV extension and quality flag
+IMAGE_FORMATS = {
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+
+class JpegEncoder:
+    """Bounded encoder pool with per-camera encode latency and throughput statistics."""
+
+    def __init__(self, workers=JPEG_ENCODER_WORKERS, use_turbojpeg=JPEG_ENCODER_TURBOJPEG,
+                 stats_window=JPEG_ENCODER_STATS_WINDOW):
+        """
+        Args:
+            workers: Number of encoder threads, 0 for one per CPU core
+            use_turbojpeg: Use libjpeg-turbo for JPEG when PyTurboJPEG and the library are installed
+            stats_window: Number of encodes kept per camera for the statistics
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="jpeg_encoder")
+        self._turbo = None
+        if use_turbojpeg and TurboJPEG is not None:
+            try:
+                self._turbo = TurboJPEG()
+            except Exception as e:
+                print(f"[WARN] libjpeg-turbo not usable, falling back to OpenCV: {e}")
+        self.backend = "turbojpeg" if self._turbo else "opencv"
+        self._buffers = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats_window = stats_window
+        self._stats = {}  # {camera_id: deque of (finished, seconds, size)}
+        print(f"[INFO] Image encoder: {self.backend}, {self.workers} workers")
+
+    def encode(self, frame, width=None, quality=95, image_format="jpeg", camera_id=None):
+        """
+        Encode an RGB frame on the pool and wait for the result.
+
+        Args:
+            frame: numpy array (RGB)
+            width: Downscale to this width first if the frame is wider, None to keep the width
+            quality: Encoder quality (1-100)
+            image_format: One of IMAGE_FORMATS
+            camera_id: Camera the statistics are recorded under, None for frames of no camera
+
+        Returns:
+            bytes
+
+        Raises:
+            ValueError: If the encoder fails
+        """
+        return wait_future(self._pool.submit(self._encode, frame, width, quality, image_format, camera_id))
+
+    def _buffer(self, name, shape):
+        # Per-worker scratch arrays, reallocated only when the frame size changes
+        buffers = self._buffers.__dict__
+        buffer = buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = buffers[name] = np.empty(shape, np.uint8)
+        return buffer
+
+    def _encode(self, frame, width, quality, image_format, camera_id):
+        started = time.perf_counter()
+        height, frame_width = frame.shape[:2]
+        if width is not None and width < frame_width:
+            height = max(1, int(round(height * width / frame_width)))
+            frame = cv2.resize(frame, (width, height), dst=self._buffer("resized", (height, width, 3)),
+                               interpolation=cv2.INTER_AREA)
+
+        if image_format == "jpeg" and self._turbo is not None:
+            data = self._turbo.encode(frame, quality=quality, pixel_format=TJPF_RGB)
+        else:
+            bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=self._buffer("bgr", frame.shape))
+            extension, quality_flag = IMAGE_FORMATS[image_format]
+            success, buffer = cv2.imencode(extension, bgr, [quality_flag, quality])
+            if not success:
+                raise ValueError(f"Could not encode frame as {image_format}")
+            data = buffer.tobytes()
+
+        finished = time.perf_counter()
+        ENCODE_SECONDS.observe(finished - started, camera_id or "other", image_format)
+        with self._stats_lock:
+            samples = self._stats.get(camera_id)
+            if samples is None:
+                samples = self._stats[camera_id] = deque(maxlen=self._stats_window)
+            samples.append((finished, finished - started, len(data)))
+        return data
+
+    def get_stats(self):
+        """
+        Get encode latency and throughput per camera over the last encodes.
+
+        Returns:
+            Dict with 'backend', 'workers' and 'cameras' {camera_id: stats}; frames of no camera are under 'other'
+        """
+        with self._stats_lock:
+            snapshot = {camera_id: list(samples) for camera_id, samples in self._stats.items()}
+
+        cameras = {}
+        for camera_id, samples in snapshot.items():
+            seconds = sorted(sample[1] for sample in samples)
+            span = samples[-1][0] - samples[0][0]
+            cameras[camera_id or "other"] = {
+                "samples": len(samples),
+                "mean_ms": round(1000.0 * sum(seconds) / len(seconds), 2),
+                "p95_ms": round(1000.0 * seconds[min(len(seconds) - 1, int(0.95 * len(seconds)))], 2),
+                "max_ms": round(1000.0 * seconds[-1], 2),
+                "encodes_per_second": round((len(samples) - 1) / span, 1) if span > 0 else None,
+                "mean_kbytes": round(sum(sample[2] for sample in samples) / len(samples) / 1024, 1),
+            }
+        return {"backend": self.backend, "workers": self.workers, "cameras": cameras}
+
+    def shutdown(self):
+        """Stop the worker threads once queued encodes are done."""
+        self._pool.shutdown(wait=False)
+
+
+_default_encoder = None
+_default_encoder_lock = threading.Lock()
+
+
+def get_default_encoder():
+    """Get the process-wide encoder used when no encoder is passed explicitly."""
+    global _default_encoder
+    with _default_encoder_lock:
+        if _default_encoder is None:
+            _default_encoder = JpegEncoder()
+        return _default_encoder
@@ -0,0 +1,106 @@
+"""
+Latency profile module.
+Translates the per-camera LATENCY_PROFILES into pipeline settings (queue policies,
+rtspsrc latency, pipeline latency) and measures glass-to-count latency per camera.
+"""
+
+import threading
+from collections import deque
+from hailo_apps_infra1.pipeline_graph import QueuePolicy
+from config import LATENCY_PROFILES, LATENCY_STATS_WINDOW
+
+
+def get_queue_policies(profile_name):
+    """
+    Get the queue policies of a profile.
+
+    Returns:
+        Dict of {queue name pattern: QueuePolicy}
+    """
+    return {
+        pattern: QueuePolicy(
+            leaky=spec.get("leaky", "no"),
+            max_size_buffers=spec.get("max_size_buffers", 3),
+            max_size_bytes=spec.get("max_size_bytes", 0),
+            max_size_time=spec.get("max_size_time", 0),
+        )
+        for pattern, spec in LATENCY_PROFILES[profile_name]["queues"].items()
+    }
+
+
+def get_source_options(profile_name):
+    """Get the SOURCE_PIPELINE keyword arguments of a profile."""
+    profile = LATENCY_PROFILES[profile_name]
+    return {
+        "rtsp_latency": profile["rtsp_latency"],
+        "rtsp_drop_on_latency": profile["rtsp_drop_on_latency"],
+    }
+
+
+def get_pipeline_latency(profile_names):
+    """
+    Get the pipeline latency in ms for a set of camera profiles.
+    Pipeline latency is pipeline-wide, so the largest one is used: no camera's frames arrive late at
+    its sink. The display sinks run with sync=false, so low-latency branches are not held back by it.
+    """
+    return max((LATENCY_PROFILES[name]["pipeline_latency"] for name in profile_names), default=None)
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _summarize(samples):
+    values = sorted(samples)
+    return {
+        "samples": len(values),
+        "mean_ms": round(1000.0 * sum(values) / len(values), 1),
+        "p50_ms": round(1000.0 * _percentile(values, 0.50), 1),
+        "p95_ms": round(1000.0 * _percentile(values, 0.95), 1),
+        "max_ms": round(1000.0 * values[-1], 1),
+    }
+
+
+class LatencyMonitor:
+    """Keeps a window of glass-to-count latency samples per camera."""
+
+    def __init__(self, camera_profiles, window=LATENCY_STATS_WINDOW):
+        """
+        Args:
+            camera_profiles: Dict of {camera_id: latency profile name}
+            window: Number of samples kept per camera
+        """
+        self.camera_profiles = dict(camera_profiles)
+        self._lock = threading.Lock()
+        self._samples = {camera_id: deque(maxlen=window) for camera_id in camera_profiles}
+
+    def record(self, camera_id, latency):
+        """Record one latency sample in seconds."""
+        samples = self._samples.get(camera_id)
+        if samples is not None:
+            with self._lock:
+                samples.append(latency)
+
+    def get_stats(self):
+        """
+        Get latency statistics per camera and per profile.
+
+        Returns:
+            Dict with 'cameras' {camera_id: stats} and 'profiles' {profile: stats over its cameras}
+        """
+        with self._lock:
+            snapshot = {camera_id: list(samples) for camera_id, samples in self._samples.items()}
+
+        cameras = {}
+        by_profile = {}
+        for camera_id, samples in snapshot.items():
+            profile = self.camera_profiles[camera_id]
+            cameras[camera_id] = {"profile": profile, **(_summarize(samples) if samples else {"samples": 0})}
+            by_profile.setdefault(profile, []).extend(samples)
+
+        profiles = {
+            profile: _summarize(samples) if samples else {"samples": 0}
+            for profile, samples in by_profile.items()
+        }
+        return {"cameras": cameras, "profiles": profiles}
@@ -1,3 +1,7 @@
+# In gevent mode the standard library is patched, which has to happen before anything else is imported
+from server_mode import patch_for_server_mode, create_socketio, run_server
+patch_for_server_mode()
+
 import gi
 import logging
 import sys
@@ -14,13 +18,24 @@ from gi.repository import Gst, GLib
 Gst.init(None)
 
 from flask import Flask
-from flask_socketio import SocketIO
 
 # Import custom modules
-from config import SERVER_HOST, SERVER_PORT, DEBUG_MODE, CORS_ALLOWED_ORIGINS, SOCKETIO_ASYNC_MODE, load_config, get_active_sources
+from config import SERVER_HOST, SERVER_PORT, DEBUG_MODE, CORS_ALLOWED_ORIGINS, load_config, get_active_sources
 from zone_counter import MultiSourceZoneVisitorCounter
 from gstreamer_pipeline import PipelineManager
 from video_stream import VideoStreamManager
+from main_stream import MainStreamManager
+from frame_hub import FrameHub
+from jpeg_encoder import JpegEncoder
+from mosaic import MosaicManager
+from count_broadcaster import CountBroadcaster
+from payload_codec import PayloadCodec
+from history_index import HistoryIndex
+from response_cache import ResponseCache
+from pipeline_jobs import PipelineJobManager
+from count_stream import CountStreamManager
+from video_channel import VideoChannelManager
+from preview import PreviewManager
 from socketio_handlers import register_socketio_handlers
 from web_routes import register_routes
 
@@ -67,41 +82,67 @@ def create_app():
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'your-secret-key-here'  # Change in production
     
-    # Initialize SocketIO
-    socketio = SocketIO(
+    # Initialize SocketIO (its async mode follows the server mode)
+    socketio = create_socketio(
         app, 
-        cors_allowed_origins="*",  # CORS_ALLOWED_ORIGINS,
-        async_mode=SOCKETIO_ASYNC_MODE
+        cors_allowed_origins="*"  # CORS_ALLOWED_ORIGINS,
     )
     
     # Initialize core components
     user_data = MultiSourceZoneVisitorCounter()
     frame_buffers = {}  # Global frame buffer for all camera sources
+    jpeg_encoder = JpegEncoder()  # Pooled encoder for every video feed, snapshot and placeholder frame
+    frame_hub = FrameHub(jpeg_encoder)  # Encode-once broadcast of new frames to video feed clients
     
     # Initialize managers
-    pipeline_manager = PipelineManager(user_data, frame_buffers, socketio)
-    video_stream_manager = VideoStreamManager(frame_buffers, user_data)
+    payload_codec = PayloadCodec()  # JSON or msgpack count payloads, chosen by each client
+    count_broadcaster = CountBroadcaster(socketio, user_data, codec=payload_codec)
+    main_stream_manager = MainStreamManager(user_data, frame_buffers, frame_hub=frame_hub)
+    pipeline_manager = PipelineManager(user_data, frame_buffers, socketio, main_stream_manager, frame_hub, count_broadcaster)
+    mosaic_manager = MosaicManager(frame_hub)
+    video_stream_manager = VideoStreamManager(frame_buffers, user_data, main_stream_manager, frame_hub, mosaic_manager)
+    video_channel_manager = VideoChannelManager(socketio, frame_hub, main_stream_manager)
+    preview_manager = PreviewManager(frame_hub)
+    history_index = HistoryIndex(user_data)  # Time index for /api/history queries
+    response_cache = ResponseCache()  # Serialized bodies and ETags of the polled zone/count endpoints
+    pipeline_jobs = PipelineJobManager(pipeline_manager, socketio)  # Background start/stop/restart jobs
+    count_stream = CountStreamManager(count_broadcaster)  # Server-Sent Events counts from the same broadcasts
     
     try:
         config = load_config()
         active_sources = config.get("video_sources", [])
         if active_sources:
             logging.info(f"Loaded active video sources from config: {active_sources}")
-            pipeline_manager.start_pipeline(active_sources)
+            # Started in the background so the server comes up while the sources are validated
+            pipeline_jobs.submit("start", active_sources)
     except Exception as e:
         logging.warning(f"Failed to load config or start pipeline: {e}")
     
     # Register SocketIO handlers
-    register_socketio_handlers(socketio, user_data)
+    register_socketio_handlers(socketio, user_data, video_channel_manager, count_broadcaster, payload_codec)
+    count_broadcaster.start()
     
     # Register web routes
-    register_routes(app, user_data, pipeline_manager, video_stream_manager)
+    register_routes(app, user_data, pipeline_manager, video_stream_manager, video_channel_manager, preview_manager,
+                    history_index, response_cache, pipeline_jobs, count_stream)
     
     components = {
         'user_data': user_data,
         'frame_buffers': frame_buffers,
+        'jpeg_encoder': jpeg_encoder,
+        'frame_hub': frame_hub,
+        'payload_codec': payload_codec,
+        'count_broadcaster': count_broadcaster,
+        'mosaic_manager': mosaic_manager,
         'pipeline_manager': pipeline_manager,
-        'video_stream_manager': video_stream_manager
+        'main_stream_manager': main_stream_manager,
+        'video_stream_manager': video_stream_manager,
+        'video_channel_manager': video_channel_manager,
+        'preview_manager': preview_manager,
+        'history_index': history_index,
+        'response_cache': response_cache,
+        'pipeline_jobs': pipeline_jobs,
+        'count_stream': count_stream
     }
     
     return app, socketio, components
@@ -128,13 +169,7 @@ def main():
         
         # Start the server
         logger.info(f"Starting server on {SERVER_HOST}:{SERVER_PORT}")
-        socketio_instance.run(
-            app_instance, 
-            host=SERVER_HOST, 
-            port=SERVER_PORT, 
-            debug=DEBUG_MODE,
-            allow_unsafe_werkzeug=True  # For development only
-        )
+        run_server(socketio_instance, app_instance, SERVER_HOST, SERVER_PORT, DEBUG_MODE)
         
     except KeyboardInterrupt:
         logger.info("Application interrupted by user")
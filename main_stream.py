@@ -0,0 +1,241 @@
+"""
+Main stream module for on-demand full-resolution viewing.
+Inference always runs on the camera's analysis substream; the main stream is only
+connected while a video feed or snapshot client needs it and is torn down after an idle timeout.
+The lock only guards the stream table: GStreamer pipelines are created and change state outside
+it (through call_blocking), so a slow RTSP connect or teardown never holds up other viewers or the
+gevent event loop.
+"""
+
+import threading
+import time
+import numpy as np
+from gi.repository import Gst
+from config import MAIN_STREAM_IDLE_TIMEOUT
+from gstreamer_pipeline import _draw_zones_on_frame
+from frame_hub import SOURCE_MAIN
+from server_mode import call_blocking
+
+
+class MainStreamManager:
+    """Manager class for reference-counted main stream pipelines, one per camera."""
+
+    def __init__(self, user_data, frame_buffers, idle_timeout=MAIN_STREAM_IDLE_TIMEOUT, frame_hub=None):
+        self.user_data = user_data
+        self.frame_buffers = frame_buffers
+        self.idle_timeout = idle_timeout
+        self.frame_hub = frame_hub
+        self._lock = threading.Lock()
+        self._streams = {}  # {camera_id: stream state}
+        self._reaper = threading.Thread(target=self._reap_idle_streams, daemon=True)
+        self._reaper.start()
+
+    def configure(self, view_urls):
+        """
+        Set the viewing URL of every camera, stopping streams that are no longer configured.
+
+        Args:
+            view_urls: Dict of {camera_id: view_url}; cameras without a viewing URL are omitted
+        """
+        stopped = []
+        with self._lock:
+            for camera_id in list(self._streams):
+                stream = self._streams[camera_id]
+                if view_urls.get(camera_id) != stream["url"]:
+                    stopped.append((camera_id, self._detach_pipeline(stream)))
+                    del self._streams[camera_id]
+            for camera_id, url in view_urls.items():
+                if camera_id not in self._streams:
+                    self._streams[camera_id] = {
+                        "url": url,
+                        "pipeline": None,
+                        "starting": False,
+                        "frame": None,
+                        "frame_time": None,
+                        "clients": 0,
+                        "idle_since": time.monotonic(),
+                    }
+        for camera_id, pipeline in stopped:
+            call_blocking(self._stop_pipeline, camera_id, pipeline)
+
+    def has_view_stream(self, camera_id):
+        """Return True if the camera has a separate viewing URL."""
+        return camera_id in self._streams
+
+    def acquire(self, camera_id):
+        """Register a viewer, connecting the main stream if needed."""
+        with self._lock:
+            stream = self._streams.get(camera_id)
+            if stream is None:
+                return False
+            stream["clients"] += 1
+            start = stream["pipeline"] is None and not stream["starting"]
+            if start:
+                stream["starting"] = True
+        if start:
+            call_blocking(self._start_stream, camera_id, stream)
+        return True
+
+    def release(self, camera_id):
+        """Unregister a viewer; the stream is torn down once idle for idle_timeout."""
+        with self._lock:
+            stream = self._streams.get(camera_id)
+            if stream is None:
+                return
+            stream["clients"] = max(0, stream["clients"] - 1)
+            if stream["clients"] == 0:
+                stream["idle_since"] = time.monotonic()
+
+    def get_frame(self, camera_id, timeout=0.0):
+        """
+        Get the latest main stream frame, waiting up to timeout seconds for the first one.
+
+        Returns:
+            numpy array (RGB) or None
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            stream = self._streams.get(camera_id)
+            frame = stream["frame"] if stream else None
+            if frame is not None or time.monotonic() >= deadline:
+                return frame
+            time.sleep(0.05)
+
+    def get_status(self):
+        """Return connection state and viewer count of every main stream."""
+        with self._lock:
+            return {
+                camera_id: {
+                    "connected": stream["pipeline"] is not None,
+                    "clients": stream["clients"],
+                }
+                for camera_id, stream in self._streams.items()
+            }
+
+    def stop_all(self):
+        """Disconnect every main stream and forget the configuration."""
+        self.configure({})
+
+    def _start_stream(self, camera_id, stream):
+        """Create and start a stream's pipeline; called without the lock, with stream["starting"] set."""
+        print(f"[INFO] Connecting main stream for {camera_id}")
+        try:
+            pipeline = self._build_pipeline(camera_id, stream["url"])
+            pipeline.set_state(Gst.State.PLAYING)
+        except Exception as e:
+            print(f"[ERROR] Failed to create main stream for {camera_id}: {e}")
+            pipeline = None
+        with self._lock:
+            stream["starting"] = False
+            # Reconfigured while connecting: the stream is no longer served
+            keep = pipeline is not None and self._streams.get(camera_id) is stream
+            if keep:
+                stream["pipeline"] = pipeline
+        if pipeline is not None and not keep:
+            pipeline.set_state(Gst.State.NULL)
+
+    def _build_pipeline(self, camera_id, url):
+        """
+        uridecodebin ! videoconvert ! video/x-raw,format=RGB ! appsink, built element by element:
+        the URL is set as a property, never parsed as part of a launch string, so spaces, '!' or
+        special characters in credentials cannot break the pipeline or add elements to it.
+        """
+        pipeline = Gst.Pipeline.new(f"main_stream_{camera_id}")
+        source = Gst.ElementFactory.make("uridecodebin", "view_source")
+        convert = Gst.ElementFactory.make("videoconvert", "view_convert")
+        caps_filter = Gst.ElementFactory.make("capsfilter", "view_caps")
+        sink = Gst.ElementFactory.make("appsink", "view_sink")
+        if None in (source, convert, caps_filter, sink):
+            raise RuntimeError("uridecodebin, videoconvert, capsfilter or appsink is not installed")
+        source.set_property("uri", url)
+        convert.set_property("n-threads", 2)
+        caps_filter.set_property("caps", Gst.Caps.from_string("video/x-raw, format=RGB"))
+        for name, value in (("max-buffers", 1), ("drop", True), ("sync", False), ("emit-signals", True)):
+            sink.set_property(name, value)
+        for element in (source, convert, caps_filter, sink):
+            pipeline.add(element)
+        if not (convert.link(caps_filter) and caps_filter.link(sink)):
+            raise RuntimeError("Could not link videoconvert, capsfilter and appsink")
+        source.connect("pad-added", self._on_pad_added, convert)
+        sink.connect("new-sample", self._on_new_sample, camera_id)
+        return pipeline
+
+    @staticmethod
+    def _on_pad_added(source, pad, convert):
+        # uridecodebin adds one pad per decoded stream; only the (first) video stream is viewed
+        sink_pad = convert.get_static_pad("sink")
+        if sink_pad.is_linked():
+            return
+        caps = pad.get_current_caps() or pad.query_caps(None)
+        if caps.get_size() and caps.get_structure(0).get_name().startswith("video/"):
+            pad.link(sink_pad)
+
+    @staticmethod
+    def _detach_pipeline(stream):
+        """Take a stream's pipeline out of the table; callers hold the lock and stop it after releasing it."""
+        pipeline, stream["pipeline"] = stream["pipeline"], None
+        stream["frame"] = None
+        return pipeline
+
+    def _stop_pipeline(self, camera_id, pipeline):
+        """Stop a detached pipeline; called without the lock."""
+        if pipeline is not None:
+            pipeline.set_state(Gst.State.NULL)
+        if self.frame_hub:
+            self.frame_hub.clear(camera_id, SOURCE_MAIN)
+
+    def _on_new_sample(self, appsink, camera_id):
+        sample = appsink.emit("pull-sample")
+        if sample is None:
+            return Gst.FlowReturn.OK
+
+        structure = sample.get_caps().get_structure(0)
+        width = structure.get_value("width")
+        height = structure.get_value("height")
+        buffer = sample.get_buffer()
+        success, map_info = buffer.map(Gst.MapFlags.READ)
+        if not success:
+            return Gst.FlowReturn.OK
+        try:
+            frame = np.ndarray(shape=(height, width, 3), dtype=np.uint8, buffer=map_info.data).copy()
+        finally:
+            buffer.unmap(map_info)
+
+        # Zones are defined in analysis frame coordinates
+        analysis_frame = self.frame_buffers.get(camera_id)
+        scale = width / analysis_frame.shape[1] if analysis_frame is not None else 1.0
+        _draw_zones_on_frame(frame, self.user_data, camera_id, scale)
+
+        stream = self._streams.get(camera_id)
+        if stream is not None:
+            stream["frame"] = frame
+            stream["frame_time"] = time.monotonic()
+            if self.frame_hub:
+                self.frame_hub.publish(camera_id, frame, SOURCE_MAIN)
+        return Gst.FlowReturn.OK
+
+    def _reap_idle_streams(self):
+        # A native thread: pipelines are stopped and restarted after the lock is released
+        while True:
+            time.sleep(1.0)
+            now = time.monotonic()
+            stopped = []
+            restarts = []
+            with self._lock:
+                for camera_id, stream in self._streams.items():
+                    if stream["pipeline"] is None:
+                        continue
+                    message = stream["pipeline"].get_bus().pop_filtered(Gst.MessageType.ERROR | Gst.MessageType.EOS)
+                    if message is not None:
+                        print(f"[WARN] Main stream for {camera_id} ended, reconnecting on next request")
+                        stopped.append((camera_id, self._detach_pipeline(stream)))
+                        if stream["clients"] > 0:
+                            stream["starting"] = True
+                            restarts.append((camera_id, stream))
+                    elif stream["clients"] == 0 and now - stream["idle_since"] > self.idle_timeout:
+                        print(f"[INFO] Disconnecting idle main stream for {camera_id}")
+                        stopped.append((camera_id, self._detach_pipeline(stream)))
+            for camera_id, pipeline in stopped:
+                self._stop_pipeline(camera_id, pipeline)
+            for camera_id, stream in restarts:
+                self._start_stream(camera_id, stream)
@@ -0,0 +1,213 @@
+"""
+Metrics module.
+Prometheus text-format metrics without a client library. Hot paths (the pad probe callback,
+update_counts, save_data, Socket.IO emits, encodes) update counters and histograms registered
+here, which costs a lock and a bucket search. Values other components already keep (tracks
+inside zones, viewers, queue levels, cache statistics) are read by collectors only while
+/metrics is scraped, so a scrape every few seconds stays cheap on a Raspberry Pi.
+"""
+
+import bisect
+import math
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram bucket upper bounds
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _format_value(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "NaN"
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def render_family(name, metric_type, documentation, samples):
+    """
+    Render one metric family in the Prometheus text format.
+
+    Args:
+        name: Metric name
+        metric_type: counter, gauge or histogram
+        documentation: HELP text
+        samples: Iterable of (sample name suffix, label pairs, value)
+
+    Returns:
+        List of lines
+    """
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+    lines.extend(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}" for suffix, labels, value in samples)
+    return lines
+
+
+def gauge_family(name, documentation, values, labelnames=()):
+    """
+    Lines of a gauge computed at scrape time, for collectors.
+
+    Args:
+        name: Metric name
+        documentation: HELP text
+        values: Dict of {label values tuple: value}, or a single value if there are no labels
+        labelnames: Names of the labels
+    """
+    if not labelnames:
+        values = {(): values}
+    samples = (("", tuple(zip(labelnames, key)), value) for key, value in values.items())
+    return render_family(name, "gauge", documentation, samples)
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}  # {label values tuple: value}
+
+    def _labels(self, labelvalues):
+        return tuple(zip(self.labelnames, labelvalues))
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        return render_family(self.name, self.metric_type, self.documentation, self._samples(values))
+
+    def _samples(self, values):
+        return (("", self._labels(key), value) for key, value in values.items())
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+    metric_type = "counter"
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value per label set that can go up and down."""
+    metric_type = "gauge"
+
+    def set(self, value, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets per label set."""
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, the +Inf bucket last, then the sum
+                state = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def render(self):
+        with self._lock:
+            values = {key: list(state) for key, state in self._values.items()}
+        return render_family(self.name, self.metric_type, self.documentation, self._samples(values))
+
+    def _samples(self, values):
+        for key, state in values.items():
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state):
+                cumulative += count
+                yield "_bucket", labels + (("le", _format_value(float(bound))),), cumulative
+            yield "_sum", labels, state[-1]
+            yield "_count", labels, cumulative
+
+
+class MetricsRegistry:
+    """Metrics updated in place by the components that own them."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, collectors=()):
+        """
+        Render every registered metric in the Prometheus text format.
+
+        Args:
+            collectors: Callables run for this scrape, each returning a list of lines (e.g. from gauge_family)
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                # A failing collector must not take the other metrics down with it
+                print(f"[WARN] Metrics collector {collector.__name__} failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+def payload_size(payload):
+    """Approximate serialized size of an emitted payload in bytes; binary parts count their length."""
+    if isinstance(payload, (bytes, bytearray, memoryview, str)):
+        return len(payload)
+    if isinstance(payload, dict):
+        return 2 + sum(payload_size(key) + payload_size(value) + 4 for key, value in payload.items())
+    if isinstance(payload, (list, tuple, set)):
+        return 2 + sum(payload_size(item) + 1 for item in payload)
+    return len(str(payload))
+
+
+REGISTRY = MetricsRegistry()
+
+BUFFERS_PROCESSED = REGISTRY.register(Counter(
+    "people_counter_buffers_processed_total", "Buffers processed by the pad probe callback", ("camera",)))
+CALLBACK_SECONDS = REGISTRY.register(Histogram(
+    "people_counter_callback_duration_seconds", "Duration of the pad probe callback", ("camera",)))
+UPDATE_COUNTS_SECONDS = REGISTRY.register(Histogram(
+    "people_counter_update_counts_duration_seconds", "Duration of update_counts", ("camera",)))
+SAVE_DATA_SECONDS = REGISTRY.register(Histogram(
+    "people_counter_save_data_duration_seconds", "Duration of save_data"))
+SAVE_DATA_BYTES = REGISTRY.register(Counter(
+    "people_counter_save_data_bytes_total", "Bytes written by save_data"))
+SAVE_DATA_SIZE = REGISTRY.register(Gauge(
+    "people_counter_save_data_size_bytes", "Size of the data file written by the last save_data"))
+SOCKETIO_EMITS = REGISTRY.register(Counter(
+    "people_counter_socketio_emits_total", "Server-side Socket.IO emits", ("event",)))
+SOCKETIO_EMIT_BYTES = REGISTRY.register(Histogram(
+    "people_counter_socketio_emit_payload_bytes", "Approximate payload size of server-side Socket.IO emits",
+    ("event",), SIZE_BUCKETS))
+ENCODE_SECONDS = REGISTRY.register(Histogram(
+    "people_counter_encode_duration_seconds", "Duration of frame encodes", ("camera", "format")))
+DISPLAY_FPS = REGISTRY.register(Gauge(
+    "people_counter_display_fps", "Frames per second measured by the display sink (when fps display is on)"))
+DISPLAY_DROP_RATE = REGISTRY.register(Gauge(
+    "people_counter_display_drop_rate", "Frames per second dropped at the display sink (when fps display is on)"))
@@ -0,0 +1,148 @@
+"""
+Mosaic module for multi-camera wall views.
+Composes the latest frames of several cameras into one grid image at a fixed interval and
+publishes it to the frame hub, so every mosaic viewer shares one composition and one encoding.
+Intervals are rounded to MOSAIC_INTERVAL_STEP, and a mosaic's frame hub channel is removed as soon
+as its last viewer leaves, so clients trying many selections and intervals cannot pile up channels.
+"""
+
+import math
+import threading
+import time
+import cv2
+import numpy as np
+from frame_hub import SOURCE_ANALYSIS
+from config import MOSAIC_TILE_WIDTH, MOSAIC_INTERVAL, MOSAIC_INTERVAL_STEP
+
+
+def get_grid_layout(count):
+    """
+    Get the grid used for a number of tiles: as square as possible, filled row by row.
+
+    Returns:
+        Tuple of (columns, rows)
+    """
+    if count <= 0:
+        return 0, 0
+    columns = math.ceil(math.sqrt(count))
+    return columns, math.ceil(count / columns)
+
+
+def round_interval(interval):
+    """Round a composition interval to MOSAIC_INTERVAL_STEP, so similar requests share a mosaic."""
+    return max(MOSAIC_INTERVAL_STEP, round(round(interval / MOSAIC_INTERVAL_STEP) * MOSAIC_INTERVAL_STEP, 3))
+
+
+def get_mosaic_id(camera_ids, interval):
+    """Frame hub id under which the mosaic of these cameras is published (interval already rounded)."""
+    return f"mosaic:{','.join(camera_ids)}@{interval:g}"
+
+
+class MosaicManager:
+    """Manager class for mosaic composers, one per camera selection and interval, running while viewed."""
+
+    def __init__(self, frame_hub, tile_width=MOSAIC_TILE_WIDTH):
+        self.frame_hub = frame_hub
+        self.tile_width = tile_width
+        self.tile_height = int(round(tile_width * 9 / 16))
+        self._lock = threading.Lock()
+        self._composers = {}  # {mosaic_id: {"camera_ids", "interval", "clients", "thread"}}
+
+    def acquire(self, camera_ids, interval=MOSAIC_INTERVAL):
+        """
+        Register a viewer of a mosaic, starting its composer if needed.
+        The interval is rounded with round_interval.
+
+        Returns:
+            str: Frame hub id the mosaic is published under
+        """
+        interval = round_interval(interval)
+        mosaic_id = get_mosaic_id(camera_ids, interval)
+        with self._lock:
+            composer = self._composers.get(mosaic_id)
+            if composer is None:
+                composer = self._composers[mosaic_id] = {
+                    "camera_ids": list(camera_ids),
+                    "interval": interval,
+                    "clients": 0,
+                    "stopped": False,
+                }
+                composer["thread"] = threading.Thread(target=self._compose_loop, args=(mosaic_id,), daemon=True)
+                composer["thread"].start()
+                print(f"[INFO] Started mosaic {mosaic_id}")
+            composer["clients"] += 1
+        return mosaic_id
+
+    def release(self, mosaic_id):
+        """
+        Unregister a viewer. After the last viewer leaves, the composer stops and the mosaic's
+        frame hub channel (last composition and cached encodings) is removed.
+        """
+        with self._lock:
+            composer = self._composers.get(mosaic_id)
+            if composer is None:
+                return
+            composer["clients"] = max(0, composer["clients"] - 1)
+            if composer["clients"] == 0:
+                composer["stopped"] = True
+                del self._composers[mosaic_id]
+                # Under the lock, so a composition finishing now cannot publish into a new channel
+                self.frame_hub.remove(mosaic_id)
+        if composer["stopped"]:
+            print(f"[INFO] Stopped mosaic {mosaic_id}")
+
+    def get_status(self):
+        """Return camera selection, interval and viewer count of every running mosaic."""
+        with self._lock:
+            return {
+                mosaic_id: {
+                    "cameras": composer["camera_ids"],
+                    "interval": composer["interval"],
+                    "clients": composer["clients"],
+                }
+                for mosaic_id, composer in self._composers.items()
+            }
+
+    def compose(self, camera_ids):
+        """
+        Compose the latest analysis frame of every camera into one grid image.
+
+        Returns:
+            numpy array (RGB)
+        """
+        columns, rows = get_grid_layout(len(camera_ids))
+        mosaic = np.zeros((rows * self.tile_height, columns * self.tile_width, 3), np.uint8)
+        for index, camera_id in enumerate(camera_ids):
+            x = (index % columns) * self.tile_width
+            y = (index // columns) * self.tile_height
+            _, frame = self.frame_hub.get_frame(camera_id, SOURCE_ANALYSIS)
+            if frame is not None:
+                mosaic[y:y + self.tile_height, x:x + self.tile_width] = cv2.resize(
+                    frame, (self.tile_width, self.tile_height), interpolation=cv2.INTER_AREA)
+                label = camera_id
+            else:
+                label = f"{camera_id} not available"
+            cv2.putText(mosaic, label, (x + 10, y + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        return mosaic
+
+    def _compose_loop(self, mosaic_id):
+        composer = self._composers[mosaic_id]
+        camera_ids, interval = composer["camera_ids"], composer["interval"]
+        last_seqs = None
+        while not composer["stopped"]:
+            started = time.monotonic()
+
+            # Only compose (and make viewers encode) when at least one camera has a new frame
+            seqs = [self.frame_hub.get_frame(camera_id, SOURCE_ANALYSIS)[0] for camera_id in camera_ids]
+            if seqs != last_seqs:
+                try:
+                    mosaic = self.compose(camera_ids)
+                    with self._lock:
+                        if composer["stopped"]:
+                            return
+                        self.frame_hub.publish(mosaic_id, mosaic)
+                    last_seqs = seqs
+                except Exception as e:
+                    print(f"[ERROR] Failed to compose mosaic {mosaic_id}: {e}")
+
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
@@ -0,0 +1,122 @@
+"""
+Payload codec module for real-time count events.
+Clients choose an encoding when they connect: JSON (the default) or, when the msgpack package is
+installed, msgpack with every dictionary key (field, camera and zone names) interned to a small
+integer. The name table is sent to msgpack clients separately and only grows, so payloads carry
+integers instead of repeated key strings. Payloads are encoded once per encoding, not per client.
+"""
+
+import threading
+
+# msgpack is optional; without it every client gets JSON
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+
+
+def get_available_encodings():
+    """Return the encodings this server can produce."""
+    return [ENCODING_JSON, ENCODING_MSGPACK] if msgpack is not None else [ENCODING_JSON]
+
+
+class NameTable:
+    """Append-only table of interned names; the version is the number of names."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}
+        self._names = []
+
+    @property
+    def version(self):
+        return len(self._names)
+
+    def intern(self, name):
+        """Return the integer id of a name, adding it if new."""
+        name_id = self._ids.get(name)
+        if name_id is None:
+            with self._lock:
+                name_id = self._ids.get(name)
+                if name_id is None:
+                    name_id = self._ids[name] = len(self._names)
+                    self._names.append(name)
+        return name_id
+
+    def get_names(self):
+        """
+        Returns:
+            Dict with 'version' and 'names' {id: name}
+        """
+        with self._lock:
+            return {"version": len(self._names), "names": dict(enumerate(self._names))}
+
+
+class PayloadCodec:
+    """Per-client encoding negotiation and encode-once payload encoding."""
+
+    def __init__(self):
+        self.names = NameTable()
+        self._lock = threading.Lock()
+        self._clients = {}  # {sid: encoding}
+
+    def negotiate(self, sid, requested=None):
+        """
+        Register a client's encoding; unknown or unavailable encodings fall back to JSON.
+
+        Returns:
+            str: The encoding the client gets
+        """
+        encoding = requested if requested in get_available_encodings() else ENCODING_JSON
+        with self._lock:
+            self._clients[sid] = encoding
+        return encoding
+
+    def forget(self, sid):
+        """Remove a disconnected client."""
+        with self._lock:
+            self._clients.pop(sid, None)
+
+    def get_encoding(self, sid):
+        """Return the encoding of a client (JSON for unknown clients)."""
+        return self._clients.get(sid, ENCODING_JSON)
+
+    def get_active_encodings(self):
+        """Return the encodings at least one connected client uses."""
+        with self._lock:
+            return set(self._clients.values())
+
+    def get_room(self, room, encoding):
+        """Name of the variant of a room whose members use the given encoding."""
+        return room if encoding == ENCODING_JSON else f"{room}@{encoding}"
+
+    def get_stats(self):
+        """Return the number of clients per encoding and the size of the name table."""
+        with self._lock:
+            clients = {}
+            for encoding in self._clients.values():
+                clients[encoding] = clients.get(encoding, 0) + 1
+        return {"clients": clients, "names": self.names.version}
+
+    def encode(self, payload, encoding):
+        """
+        Encode an event payload for clients of an encoding.
+
+        Returns:
+            The payload unchanged for JSON (Socket.IO serializes it), or msgpack bytes of
+            [name table version, payload with interned keys]
+        """
+        if encoding == ENCODING_JSON:
+            return payload
+        packed = self._intern_keys(payload)
+        return msgpack.packb([self.names.version, packed], use_bin_type=True)
+
+    def _intern_keys(self, value):
+        if isinstance(value, dict):
+            return {self.names.intern(key): self._intern_keys(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._intern_keys(item) for item in value]
+        return value
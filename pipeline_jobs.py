@@ -0,0 +1,205 @@
+"""
+Pipeline job module.
+Runs pipeline start, stop and restart requests as background jobs on a single worker thread, so
+HTTP requests return immediately and pipeline changes never run concurrently. Every job has an ID,
+a state, the current stage and the progress of every source. Progress is also emitted to
+Socket.IO clients as 'pipeline_job' events.
+A request identical to a queued or running job joins that job. Jobs still queued when a newer
+request arrives are superseded, because only the most recently requested pipeline state matters.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from config import PIPELINE_JOB_HISTORY, save_active_sources, get_active_sources
+
+JOB_KINDS = ("start", "stop", "restart")
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_SUPERSEDED = "superseded"
+
+
+class PipelineJob:
+    """One start, stop or restart request; also the progress reporter passed to PipelineManager."""
+
+    def __init__(self, kind, sources, on_change):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.sources = sources
+        self.state = JOB_QUEUED
+        self.stage = None
+        self.message = None
+        self.requests = 1
+        self.source_progress = OrderedDict()  # {camera_id: {"state", "message"}}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._on_change = on_change
+
+    def set_stage(self, stage, message=None):
+        """Report the pipeline stage the job has reached."""
+        self.stage = stage
+        self.message = message
+        self._on_change(self)
+
+    def set_source(self, camera_id, state, message=None):
+        """Report the state of one source (e.g. validating, valid, failed, started)."""
+        self.source_progress[camera_id] = {"state": state, "message": message}
+        self._on_change(self)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "stage": self.stage,
+            "message": self.message,
+            "requests": self.requests,
+            "sources": [dict(progress, camera_id=camera_id) for camera_id, progress in list(self.source_progress.items())],
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class PipelineJobManager:
+    """Queue of pipeline jobs executed one at a time by a background worker."""
+
+    def __init__(self, pipeline_manager, socketio=None, history_size=PIPELINE_JOB_HISTORY):
+        """
+        Args:
+            pipeline_manager: PipelineManager instance
+            socketio: Optional Flask-SocketIO instance for 'pipeline_job' progress events
+            history_size: Number of finished jobs kept for /api/jobs
+        """
+        self.pipeline_manager = pipeline_manager
+        self.socketio = socketio
+        self.history_size = history_size
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._jobs = OrderedDict()  # {job_id: PipelineJob}, oldest first
+        self._running = None
+        self._worker = threading.Thread(target=self._work_loop, daemon=True)
+        self._worker.start()
+
+    def submit(self, kind, sources=None):
+        """
+        Request a pipeline start, stop or restart.
+
+        Args:
+            kind: One of JOB_KINDS
+            sources: Camera entries for start and restart (restart defaults to the saved active sources)
+
+        Returns:
+            Tuple of (job dict, coalesced: bool); coalesced is True if the request joined an existing job
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"job kind must be one of {', '.join(JOB_KINDS)}")
+        with self._condition:
+            for job in [self._running, *self._queue]:
+                if job is not None and job.kind == kind and job.sources == sources:
+                    job.requests += 1
+                    return job.to_dict(), True
+
+            superseded = list(self._queue)
+            self._queue.clear()
+            for job in superseded:
+                job.state = JOB_SUPERSEDED
+                job.message = "Superseded by a newer request"
+                job.finished_at = time.time()
+
+            job = PipelineJob(kind, sources, self._on_change)
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            self._trim_history()
+            self._condition.notify()
+        for old_job in superseded:
+            self._on_change(old_job)
+        self._on_change(job)
+        return job.to_dict(), False
+
+    def get_job(self, job_id):
+        """Return the status of a job as a dict, or None if unknown."""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def get_jobs(self):
+        """Return the status of the known jobs, newest first."""
+        with self._condition:
+            return [job.to_dict() for job in reversed(self._jobs.values())]
+
+    def get_stats(self):
+        """
+        Get job queue statistics.
+
+        Returns:
+            Dict with the running job ID, queued job count and the number of known jobs per state
+        """
+        with self._condition:
+            states = {}
+            for job in self._jobs.values():
+                states[job.state] = states.get(job.state, 0) + 1
+            return {
+                "running": self._running.id if self._running else None,
+                "queued": len(self._queue),
+                "states": states,
+            }
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if job.state not in (JOB_QUEUED, JOB_RUNNING)]
+        for job_id in finished[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[job_id]
+
+    def _on_change(self, job):
+        if self.socketio:
+            self.socketio.emit("pipeline_job", job.to_dict())
+
+    def _work_loop(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                job = self._running = self._queue.popleft()
+                job.state = JOB_RUNNING
+                job.started_at = time.time()
+            self._on_change(job)
+
+            try:
+                success = self._run(job)
+            except Exception as e:
+                print(f"[ERROR] Pipeline {job.kind} job {job.id} failed: {e}")
+                job.message = str(e)
+                success = False
+
+            with self._condition:
+                job.state = JOB_SUCCEEDED if success else JOB_FAILED
+                job.finished_at = time.time()
+                self._running = None
+                self._trim_history()
+            print(f"[INFO] Pipeline {job.kind} job {job.id} {job.state}")
+            self._on_change(job)
+
+    def _run(self, job):
+        if job.kind == "stop":
+            job.set_stage("stopping", "Stopping pipeline...")
+            return self.pipeline_manager.stop_pipeline()
+
+        sources = job.sources
+        if sources is None:
+            sources = get_active_sources()
+            if not sources:
+                job.set_stage("error", "No saved sources to restart with")
+                return False
+        for index in range(len(sources)):
+            job.source_progress[f"camera{index + 1}"] = {"state": "pending", "message": None}
+        if not self.pipeline_manager.start_pipeline(sources, progress=job):
+            return False
+        save_active_sources(sources)
+        return True
@@ -0,0 +1,210 @@
+"""
+Preview module for low-bitrate H.264 viewing over metered links.
+Encodes a camera's analysis frames into short MPEG-TS segments kept in an in-memory ring and
+serves them as an HLS playlist, so every remote viewer shares one encoder and costs a fraction
+of the MJPEG bandwidth. A camera is only encoded while its playlist or segments are requested.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from gi.repository import Gst
+from hailo_apps_infra1.gstreamer_helper_pipelines import PREVIEW_PIPELINE
+from frame_hub import SOURCE_ANALYSIS
+from server_mode import call_blocking
+from config import (
+    PREVIEW_WIDTH, PREVIEW_FPS, PREVIEW_BITRATE, PREVIEW_SEGMENT_DURATION,
+    PREVIEW_RING_SEGMENTS, PREVIEW_IDLE_TIMEOUT, PREVIEW_START_WAIT
+)
+
+
+class PreviewManager:
+    """Manager class for on-demand HLS preview encoders, one per camera."""
+
+    def __init__(self, frame_hub, width=PREVIEW_WIDTH, fps=PREVIEW_FPS, bitrate=PREVIEW_BITRATE,
+                 segment_duration=PREVIEW_SEGMENT_DURATION, ring_size=PREVIEW_RING_SEGMENTS,
+                 idle_timeout=PREVIEW_IDLE_TIMEOUT):
+        self.frame_hub = frame_hub
+        self.width = width
+        self.fps = fps
+        self.bitrate = bitrate
+        self.segment_duration = segment_duration
+        self.ring_size = ring_size
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._previews = {}  # {camera_id: preview state}
+
+    def touch(self, camera_id):
+        """Register a viewer request, starting the camera's encoder if needed."""
+        with self._lock:
+            preview = self._previews.get(camera_id)
+            if preview is None:
+                preview = self._previews[camera_id] = {
+                    "condition": threading.Condition(),
+                    "segments": deque(maxlen=self.ring_size),  # (sequence, duration, bytes)
+                    "next_sequence": 0,
+                    "pending": bytearray(),
+                    "pending_started": None,
+                    "last_request": time.monotonic(),
+                }
+                threading.Thread(target=self._encode_loop, args=(camera_id, preview), daemon=True).start()
+                print(f"[INFO] Started H.264 preview for {camera_id}")
+            preview["last_request"] = time.monotonic()
+            return preview
+
+    def get_playlist(self, camera_id, timeout=PREVIEW_START_WAIT):
+        """
+        Get the live HLS playlist of a camera, waiting up to timeout seconds for its first segment.
+
+        Returns:
+            str: m3u8 playlist, or None if no segment is ready yet
+        """
+        preview = self.touch(camera_id)
+        segments = call_blocking(self._wait_for_segments, preview, timeout)
+        if segments is None:
+            return None
+
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{math.ceil(max(duration for _, duration, _ in segments))}",
+            f"#EXT-X-MEDIA-SEQUENCE:{segments[0][0]}",
+        ]
+        for sequence, duration, _ in segments:
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(f"segment_{sequence}.ts")
+        return "\n".join(lines) + "\n"
+
+    def get_segment(self, camera_id, sequence):
+        """
+        Get one MPEG-TS segment from the ring.
+
+        Returns:
+            bytes, or None if the segment has left the ring (or does not exist yet)
+        """
+        preview = self.touch(camera_id)
+        with preview["condition"]:
+            for segment_sequence, _, data in preview["segments"]:
+                if segment_sequence == sequence:
+                    return data
+        return None
+
+    def get_status(self):
+        """Return the ring state and recent bitrate of every running preview."""
+        now = time.monotonic()
+        with self._lock:
+            previews = dict(self._previews)
+        status = {}
+        for camera_id, preview in previews.items():
+            with preview["condition"]:
+                segments = list(preview["segments"])
+            seconds = sum(duration for _, duration, _ in segments)
+            status[camera_id] = {
+                "segments": len(segments),
+                "last_sequence": segments[-1][0] if segments else None,
+                "bitrate_kbps": round(8 * sum(len(data) for _, _, data in segments) / seconds / 1000, 1) if seconds else None,
+                "idle_seconds": round(now - preview["last_request"], 1),
+            }
+        return status
+
+    @staticmethod
+    def _wait_for_segments(preview, timeout):
+        with preview["condition"]:
+            if not preview["condition"].wait_for(lambda: preview["segments"], timeout):
+                return None
+            return list(preview["segments"])
+
+    def _start_pipeline(self, camera_id, preview, frame_shape):
+        height, width = frame_shape[:2]
+        preview_width = min(self.width, width)
+        # x264 needs even dimensions
+        preview_width -= preview_width % 2
+        preview_height = int(round(height * preview_width / width / 2)) * 2
+        key_int_max = max(1, int(self.fps * self.segment_duration))
+        try:
+            pipeline = Gst.parse_launch(
+                f"appsrc name=preview_src is-live=true format=time do-timestamp=true "
+                f"caps=\"video/x-raw, format=RGB, width={width}, height={height}, framerate=0/1\" ! "
+                + PREVIEW_PIPELINE(preview_width, preview_height, bitrate=self.bitrate, key_int_max=key_int_max)
+            )
+        except Exception as e:
+            print(f"[ERROR] Failed to create H.264 preview for {camera_id}: {e}")
+            return None
+        pipeline.get_by_name("preview_sink").connect("new-sample", self._on_new_sample, preview)
+        with preview["condition"]:
+            # A new encoder starts a new stream; segments of the previous one cannot be continued
+            preview["segments"].clear()
+            preview["pending"] = bytearray()
+            preview["pending_started"] = None
+        pipeline.set_state(Gst.State.PLAYING)
+        return pipeline
+
+    def _encode_loop(self, camera_id, preview):
+        pipeline = None
+        frame_shape = None
+        last_seq = 0
+        next_push = 0.0
+        interval = 1.0 / self.fps
+        try:
+            while True:
+                with self._lock:
+                    if time.monotonic() - preview["last_request"] > self.idle_timeout:
+                        del self._previews[camera_id]
+                        print(f"[INFO] Stopped idle H.264 preview for {camera_id}")
+                        return
+
+                seq, frame = self.frame_hub.wait_for_raw_frame(camera_id, last_seq, 1.0, SOURCE_ANALYSIS)
+                if frame is None:
+                    continue
+                last_seq = seq
+                now = time.monotonic()
+                if now < next_push:
+                    continue
+                next_push = max(now, next_push + interval)
+
+                if frame.shape != frame_shape:
+                    if pipeline is not None:
+                        pipeline.set_state(Gst.State.NULL)
+                    pipeline = self._start_pipeline(camera_id, preview, frame.shape)
+                    frame_shape = frame.shape if pipeline is not None else None
+                    if pipeline is None:
+                        time.sleep(1.0)
+                        continue
+
+                pipeline.get_by_name("preview_src").emit("push-buffer", Gst.Buffer.new_wrapped(frame.tobytes()))
+
+                message = pipeline.get_bus().pop_filtered(Gst.MessageType.ERROR | Gst.MessageType.EOS)
+                if message is not None:
+                    print(f"[WARN] H.264 preview for {camera_id} failed, restarting encoder")
+                    pipeline.set_state(Gst.State.NULL)
+                    pipeline = None
+                    frame_shape = None
+        finally:
+            if pipeline is not None:
+                pipeline.set_state(Gst.State.NULL)
+
+    def _on_new_sample(self, appsink, preview):
+        sample = appsink.emit("pull-sample")
+        if sample is None:
+            return Gst.FlowReturn.OK
+        buffer = sample.get_buffer()
+        data = buffer.extract_dup(0, buffer.get_size())
+        # The muxer flags every buffer that does not start at a keyframe as a delta unit
+        keyframe = not buffer.has_flags(Gst.BufferFlags.DELTA_UNIT)
+        now = time.monotonic()
+
+        with preview["condition"]:
+            started = preview["pending_started"]
+            if keyframe and started is not None and now - started >= self.segment_duration:
+                preview["segments"].append((preview["next_sequence"], now - started, bytes(preview["pending"])))
+                preview["next_sequence"] += 1
+                preview["pending"] = bytearray()
+                preview["pending_started"] = None
+                preview["condition"].notify_all()
+            if preview["pending_started"] is None:
+                if not keyframe:
+                    return Gst.FlowReturn.OK  # segments must start at a keyframe
+                preview["pending_started"] = now
+            preview["pending"] += data
+        return Gst.FlowReturn.OK
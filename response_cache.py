@@ -0,0 +1,91 @@
+"""
+Response cache module.
+Keeps the serialized JSON bodies of polled endpoints together with the version of the state
+they were built from. A poll of unchanged state reuses the cached body, or is answered with
+304 Not Modified when the client sends the current ETag, instead of serializing the live data.
+"""
+
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+from config import RESPONSE_CACHE_SIZE
+
+
+class ResponseCache:
+    """LRU cache of serialized response bodies keyed by request and state version."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        """
+        Args:
+            max_entries: Number of request keys (path and query) whose latest body is kept
+        """
+        self.max_entries = max_entries
+        # ETags of a previous process never match, even though the versions start over
+        self.epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # {key: (etag, body)}
+        self._stats = {"requests": 0, "not_modified": 0, "cache_hits": 0, "builds": 0}
+
+    def get_etag(self, key, version):
+        """ETag of the response to a request key at a state version."""
+        digest = hashlib.sha1(f"{key}|{version!r}".encode()).hexdigest()[:16]
+        return f"{self.epoch}-{digest}"
+
+    def get(self, key, version, build, if_none_match=None):
+        """
+        Get the body of a response, building it only if the state changed since it was cached.
+
+        Args:
+            key: Request key (e.g. path and query string)
+            version: Version of the state the response is built from; must change with the state
+                and be read before the state is
+            build: Callable returning the serialized body
+            if_none_match: ETags the client already has (e.g. request.if_none_match)
+
+        Returns:
+            Tuple of (body bytes, or None if the client's copy is current, etag)
+        """
+        etag = self.get_etag(key, version)
+        if if_none_match and etag in if_none_match:
+            self._count("not_modified")
+            return None, etag
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == etag:
+                self._entries.move_to_end(key)
+        if entry is not None and entry[0] == etag:
+            self._count("cache_hits")
+            return entry[1], etag
+
+        try:
+            body = build()
+        except RuntimeError:
+            # The live data changed while it was serialized
+            body = build()
+        self._count("builds")
+        with self._lock:
+            self._entries[key] = (etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body, etag
+
+    def _count(self, outcome):
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats[outcome] += 1
+
+    def get_stats(self):
+        """
+        Get response cache statistics.
+
+        Returns:
+            Dict with request, not-modified, cache hit and build counts, cached entries and the hit ratio
+        """
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries))
+        hits = stats["not_modified"] + stats["cache_hits"]
+        stats["hit_ratio"] = round(hits / stats["requests"], 3) if stats["requests"] else None
+        return stats
@@ -0,0 +1,158 @@
+"""
+Server mode module.
+Selects how the web server runs:
+  threading - Werkzeug server, one OS thread per request, MJPEG viewer and long-poll (the default)
+  gevent    - gevent WSGI server (with WebSocket support from gevent-websocket), every request is a
+              greenlet on one event loop; far fewer OS threads with many viewers, but higher poll
+              latency and CPU use in benchmarks/server_load_benchmark.py, so it is opt-in
+In gevent mode the standard library is patched except for threads: GStreamer's streaming threads,
+the GLib main loop, the JPEG encoder pool and the other worker threads stay real OS threads.
+Code on the event loop must never block on their locks and conditions, and they must never touch
+the loop's objects directly; the helpers below do the hand-off in both directions:
+  call_blocking       - run a blocking call on a worker thread while the calling greenlet waits
+  call_in_server_loop - run a function on the event loop from any thread (e.g. Socket.IO emits)
+  wait_future         - wait for a concurrent.futures future without blocking the loop
+  create_loop_event   - an event greenlets can wait on, set through call_in_server_loop
+  start_send_deadline - make the calling greenlet's socket writes fail after a deadline
+In threading mode all of them reduce to plain calls.
+"""
+
+import errno
+import functools
+import threading
+from metrics import SOCKETIO_EMITS, SOCKETIO_EMIT_BYTES, payload_size
+from config import SERVER_MODE, SERVER_THREADPOOL_SIZE
+
+SERVER_MODES = ("threading", "gevent")
+
+_mode = "threading"
+_loop = None          # gevent loop of the server (gevent mode only)
+_loop_thread = None   # ident of the OS thread running it
+_threadpool = None
+
+
+def patch_for_server_mode(mode=SERVER_MODE):
+    """
+    Prepare the process for a server mode; must run before any other module is imported.
+
+    Args:
+        mode: One of SERVER_MODES
+
+    Raises:
+        ValueError: If the mode is unknown
+        ImportError: If gevent mode is requested without gevent installed
+    """
+    global _mode, _loop, _loop_thread
+    if mode not in SERVER_MODES:
+        raise ValueError(f"server mode must be one of {', '.join(SERVER_MODES)}")
+    if mode == "gevent":
+        from gevent import monkey, get_hub
+        # Threads (and the queues between them, e.g. of the encoder pool) stay native: GStreamer calls
+        # into Python from its own threads, which must not share the loop's green primitives
+        monkey.patch_all(thread=False, queue=False)
+        _loop = get_hub().loop
+        _loop_thread = threading.get_ident()
+    _mode = mode
+
+
+def get_server_mode():
+    """Return the active server mode."""
+    return _mode
+
+
+def in_server_loop():
+    """Return True if the caller runs on the gevent event loop, where blocking stalls every client."""
+    return _loop_thread is not None and threading.get_ident() == _loop_thread
+
+
+def call_in_server_loop(func, *args, **kwargs):
+    """
+    Run func on the event loop. Called from another thread in gevent mode, func is scheduled and
+    this returns None immediately; otherwise func runs now and its result is returned.
+    """
+    if _loop is None or in_server_loop():
+        return func(*args, **kwargs)
+    _loop.run_callback_threadsafe(functools.partial(func, *args, **kwargs))
+    return None
+
+
+def call_blocking(func, *args, **kwargs):
+    """
+    Call a function that blocks (native waits, encodes, GStreamer state changes). On the event loop
+    it runs on a worker thread while only the calling greenlet waits; elsewhere it runs directly.
+    """
+    global _threadpool
+    if not in_server_loop():
+        return func(*args, **kwargs)
+    if _threadpool is None:
+        from gevent.threadpool import ThreadPool
+        _threadpool = ThreadPool(SERVER_THREADPOOL_SIZE)
+    return _threadpool.apply(func, args, kwargs)
+
+
+def wait_future(future):
+    """Return the result of a concurrent.futures future, waiting cooperatively on the event loop."""
+    if in_server_loop() and not future.done():
+        done = create_loop_event()
+        future.add_done_callback(lambda _: call_in_server_loop(done.set))
+        done.wait()
+    return future.result()
+
+
+def create_loop_event():
+    """Event for greenlets to wait on (gevent mode only); set it with call_in_server_loop(event.set)."""
+    from gevent.event import Event
+    return Event()
+
+
+def start_send_deadline(seconds):
+    """
+    Start a deadline for the socket writes the calling greenlet makes next (e.g. the server writing the
+    chunk a response generator yielded): once it expires, the blocked write fails like a broken
+    connection and the server drops the client.
+
+    Returns:
+        The started gevent Timeout, to be closed once the write completed; None off the event loop,
+        where writes are bounded by socket timeouts instead
+    """
+    if not in_server_loop():
+        return None
+    from gevent import Timeout
+    # EPIPE, which the gevent server treats as a client that went away rather than logging an error
+    deadline = Timeout(seconds, BrokenPipeError(errno.EPIPE, f"client did not accept data within {seconds}s"))
+    deadline.start()
+    return deadline
+
+
+def create_socketio(app, **kwargs):
+    """
+    Create the Flask-SocketIO instance for the active mode. Its server-level emit may be called
+    from any thread, including GStreamer and GLib threads, and is counted in the emit metrics.
+
+    Args:
+        app: Flask application instance
+        **kwargs: Further SocketIO options (e.g. cors_allowed_origins)
+    """
+    # Imported here so that patch_for_server_mode runs before Flask and its dependencies are loaded
+    from flask_socketio import SocketIO
+
+    class LoopSafeSocketIO(SocketIO):
+        def emit(self, event, *args, **kwargs):
+            SOCKETIO_EMITS.inc(event)
+            SOCKETIO_EMIT_BYTES.observe(payload_size(args), event)
+            if _loop is not None and not in_server_loop():
+                call_in_server_loop(super().emit, event, *args, **kwargs)
+                return
+            super().emit(event, *args, **kwargs)
+
+    return LoopSafeSocketIO(app, async_mode=_mode, **kwargs)
+
+
+def run_server(socketio, app, host, port, debug=False):
+    """Serve the application in the active mode until it is stopped."""
+    print(f"[INFO] Serving on {host}:{port} in {_mode} mode")
+    if _mode == "gevent":
+        # Flask-SocketIO runs gevent's WSGI server, with gevent-websocket's handler when installed
+        socketio.run(app, host=host, port=port, debug=debug, use_reloader=False)
+    else:
+        socketio.run(app, host=host, port=port, debug=debug, allow_unsafe_werkzeug=True)
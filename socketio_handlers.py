@@ -3,17 +3,73 @@ Socket.IO event handlers module.
 Contains all WebSocket event handlers for real-time communication.
 """
 
-from flask_socketio import SocketIO, emit
+from flask import request
+from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
+from frame_hub import make_variant
+from count_broadcaster import SUMMARY_ROOM, get_camera_room
+from payload_codec import ENCODING_JSON, get_available_encodings
+from config import VIDEO_CHANNEL_WINDOW, VIDEO_CHANNEL_MAX_WINDOW
 
-def register_socketio_handlers(socketio: SocketIO, user_data):
+def register_socketio_handlers(socketio: SocketIO, user_data, video_channel_manager=None, count_broadcaster=None,
+                               payload_codec=None):
     """
     Register all Socket.IO event handlers.
 
     Args:
         socketio: Flask-SocketIO instance
         user_data: MultiSourceZoneVisitorCounter instance
+        video_channel_manager: Optional VideoChannelManager instance for the binary video channel
+        count_broadcaster: Optional CountBroadcaster instance for count_delta updates
+        payload_codec: Optional PayloadCodec instance; without it every client gets JSON
     """
 
+    def sender_encoding():
+        return payload_codec.get_encoding(request.sid) if payload_codec else ENCODING_JSON
+
+    def emit_encoded(event, payload):
+        """Emit a count payload to the sender in the encoding it negotiated."""
+        emit(event, payload_codec.encode(payload, sender_encoding()) if payload_codec else payload)
+
+    def sender_room(room):
+        """The variant of a room the sender joins, which depends on its encoding."""
+        return payload_codec.get_room(room, sender_encoding()) if payload_codec else room
+
+    def emit_to_camera(event, payload, camera_id):
+        """Emit a zone event to the camera's room, and to the sender if it is not subscribed to it."""
+        room = get_camera_room(camera_id)
+        # Zone events stay JSON for every client, so all encoding variants of the room get the same payload
+        for encoding in get_available_encodings():
+            socketio.emit(event, payload, to=payload_codec.get_room(room, encoding) if payload_codec else room)
+        if sender_room(room) not in rooms():
+            emit(event, payload)
+
+    def zone_payload(camera_id, zone):
+        """A zone event payload: the changed zone without its history, which count_delta clients already have."""
+        zone_data = user_data.get_snapshot().get(camera_id, {}).get("zones", {}).get(zone)
+        return {
+            "camera": camera_id,
+            "zone": zone,
+            "zone_data": {key: value for key, value in zone_data.items() if key != "history"} if zone_data else None,
+        }
+
+    def mark_dirty(camera_id):
+        """Send a camera's zone change to count_delta and count stream clients in the next broadcast."""
+        if count_broadcaster:
+            count_broadcaster.mark_dirty(camera_id)
+
+    def subscribed_cameras():
+        return [room.split(":", 1)[1].split("@", 1)[0] for room in rooms() if room.startswith("camera:")]
+
+    def subscribe_cameras(camera_ids):
+        """Make the sender's camera subscriptions exactly camera_ids and send their full counts."""
+        for camera_id in subscribed_cameras():
+            if camera_id not in camera_ids:
+                leave_room(sender_room(get_camera_room(camera_id)))
+        for camera_id in camera_ids:
+            join_room(sender_room(get_camera_room(camera_id)))
+        if count_broadcaster and camera_ids:
+            emit_encoded("count_full", count_broadcaster.get_full_state(camera_ids))
+
     @socketio.on('request_pipeline_status')
     def handle_pipeline_status_request():
         status = {
@@ -40,16 +96,13 @@ def register_socketio_handlers(socketio: SocketIO, user_data):
         success = user_data.create_or_update_zone(camera_id, zone, top_left, bottom_right)
         
         if success:
+            mark_dirty(camera_id)
             zone_data = user_data.data[camera_id]["zones"][zone]
             print(f"[Socket.IO] Zone updated - Camera: {camera_id}, Zone: {zone}")
             print(f"[Socket.IO] Zone data: {zone_data}")
             
-            emit("zone_updated", {
-                "data": user_data.data,
-                "camera": camera_id,
-                "zone": zone,
-                "message": "Zone successfully updated"
-            })
+            emit_to_camera("zone_updated", dict(zone_payload(camera_id, zone), message="Zone successfully updated"),
+                           camera_id)
         else:
             print(f"[Socket.IO] Failed to update zone {zone} for camera {camera_id}")
             emit("error", {"message": "Invalid zone coordinates"})
@@ -66,11 +119,8 @@ def register_socketio_handlers(socketio: SocketIO, user_data):
 
         success = user_data.reset_zone_counts(camera_id, zone)
         if success:
-            emit("count_reset", {
-                "data": user_data.data,
-                "camera": camera_id,
-                "zone": zone
-            })
+            mark_dirty(camera_id)
+            emit_to_camera("count_reset", zone_payload(camera_id, zone), camera_id)
         else:
             emit("error", {"message": f"Zone {zone} in camera {camera_id} not found"})
 
@@ -85,6 +135,8 @@ def register_socketio_handlers(socketio: SocketIO, user_data):
 
         success = user_data.set_active_camera(camera_id)
         if success:
+            # Switching cameras moves the client to the new camera's room
+            subscribe_cameras([camera_id])
             emit("camera_changed", {
                 "active_camera": user_data.active_camera,
                 "data": user_data.data,
@@ -105,19 +157,21 @@ def register_socketio_handlers(socketio: SocketIO, user_data):
 
         success = user_data.delete_zone(camera_id, zone)
         if success:
-            emit("zone_deleted", {
-                "data": user_data.data,
-                "camera": camera_id,
-                "zone": zone
-            })
+            mark_dirty(camera_id)
+            emit_to_camera("zone_deleted", {"camera": camera_id, "zone": zone}, camera_id)
         else:
             emit("error", {"message": f"Zone {zone} in camera {camera_id} not found"})
 
     @socketio.on("connect")
-    def handle_connect():
-        """Handle client connection."""
+    def handle_connect(auth=None):
+        """Handle client connection; the client may ask for an encoding with auth {encoding: "msgpack"}."""
         print("Client connected")
-        emit("initial_data", {
+        if payload_codec:
+            requested = (auth or {}).get("encoding") or request.args.get("encoding")
+            encoding = payload_codec.negotiate(request.sid, requested)
+            # Always JSON, so the client can learn its encoding before decoding anything
+            emit("encoding", {"encoding": encoding, **payload_codec.names.get_names()})
+        emit_encoded("initial_data", {
             "data": user_data.data,
             "active_camera": user_data.active_camera,
             "cameras": list(user_data.data.keys())
@@ -127,11 +181,101 @@ def register_socketio_handlers(socketio: SocketIO, user_data):
     def handle_disconnect():
         """Handle client disconnection."""
         print("Client disconnected")
+        if payload_codec:
+            payload_codec.forget(request.sid)
+        if video_channel_manager:
+            video_channel_manager.unsubscribe(request.sid)
+
+    @socketio.on("video_subscribe")
+    def handle_video_subscribe(data):
+        """Subscribe to binary video frames of a camera: {camera_id, width?, quality?, format?, window?}."""
+        if video_channel_manager is None:
+            emit("error", {"message": "Video channel is not available"})
+            return
+
+        camera_id = data.get("camera_id")
+        if camera_id not in user_data.data:
+            emit("error", {"message": f"Camera {camera_id} not found"})
+            return
+        try:
+            variant = make_variant(data.get("width"), data.get("quality"), data.get("format", "jpeg"))
+            window = int(data.get("window", VIDEO_CHANNEL_WINDOW))
+            if not 1 <= window <= VIDEO_CHANNEL_MAX_WINDOW:
+                raise ValueError(f"window must be between 1 and {VIDEO_CHANNEL_MAX_WINDOW}")
+        except (TypeError, ValueError) as e:
+            emit("error", {"message": f"Invalid video subscription: {e}"})
+            return
+
+        previous_room = video_channel_manager.unsubscribe(request.sid)
+        if previous_room:
+            leave_room(previous_room)
+        join_room(video_channel_manager.subscribe(request.sid, camera_id, variant, window))
+        emit("video_subscribed", {"camera_id": camera_id, "format": variant.format, "window": window})
+
+    @socketio.on("video_ack")
+    def handle_video_ack(data):
+        """Acknowledge a received video frame, allowing the next one to be sent: {seq}."""
+        if video_channel_manager:
+            video_channel_manager.acknowledge(request.sid, data.get("seq"))
+
+    @socketio.on("video_unsubscribe")
+    def handle_video_unsubscribe():
+        """Stop receiving binary video frames."""
+        if video_channel_manager:
+            room = video_channel_manager.unsubscribe(request.sid)
+            if room:
+                leave_room(room)
+
+    @socketio.on("subscribe")
+    def handle_subscribe(data):
+        """
+        Set the cameras (and optionally the all-cameras summary) the client gets count and zone events for:
+        {camera_ids: [...] or camera_id, summary?: bool}. Answered with count_full for the cameras.
+        """
+        camera_ids = data.get("camera_ids", [data["camera_id"]] if data.get("camera_id") else None)
+        if camera_ids is not None:
+            unknown = [camera_id for camera_id in camera_ids if camera_id not in user_data.data]
+            if unknown:
+                emit("error", {"message": f"Cameras not found: {', '.join(unknown)}"})
+                return
+            subscribe_cameras(camera_ids)
+        if "summary" in data:
+            if data["summary"]:
+                join_room(sender_room(SUMMARY_ROOM))
+                if count_broadcaster:
+                    emit_encoded("count_summary", {"cameras": count_broadcaster.get_summary()})
+            else:
+                leave_room(sender_room(SUMMARY_ROOM))
+        emit("subscribed", {"camera_ids": subscribed_cameras(), "summary": sender_room(SUMMARY_ROOM) in rooms()})
+
+    @socketio.on("unsubscribe")
+    def handle_unsubscribe(data=None):
+        """Leave camera rooms and/or the summary room: {camera_ids?: [...], summary?: bool}; no data leaves all."""
+        data = data or {"camera_ids": subscribed_cameras(), "summary": True}
+        for camera_id in data.get("camera_ids", []):
+            leave_room(sender_room(get_camera_room(camera_id)))
+        if data.get("summary"):
+            leave_room(sender_room(SUMMARY_ROOM))
+        emit("subscribed", {"camera_ids": subscribed_cameras(), "summary": sender_room(SUMMARY_ROOM) in rooms()})
+
+    @socketio.on("request_full_counts")
+    def handle_request_full_counts():
+        """Send the complete zone data of the subscribed cameras with their versions, after which count_delta events apply."""
+        if count_broadcaster is None:
+            emit("error", {"message": "Count updates are not available"})
+            return
+        emit_encoded("count_full", count_broadcaster.get_full_state(subscribed_cameras()))
+
+    @socketio.on("request_names")
+    def handle_request_names():
+        """Send the name table msgpack payloads are decoded with."""
+        if payload_codec:
+            emit("names", payload_codec.names.get_names())
 
     @socketio.on("get_current_data")
     def handle_get_current_data():
         """Send current data to requesting client."""
-        emit("current_data", {
+        emit_encoded("current_data", {
             "data": user_data.data,
             "active_camera": user_data.active_camera,
             "cameras": list(user_data.data.keys())
@@ -0,0 +1,287 @@
+"""
+Source supervision module for per-camera failure isolation.
+Attributes pipeline errors and end-of-stream to the camera source that posted them
+and restarts only that source, with exponential backoff and jitter.
+"""
+
+import random
+import threading
+import time
+from gi.repository import Gst, GLib
+from config import (
+    SOURCE_RECONNECT_BASE_DELAY,
+    SOURCE_RECONNECT_MAX_DELAY,
+    SOURCE_RECONNECT_JITTER,
+    SOURCE_RECONNECT_MAX_ATTEMPTS,
+    SOURCE_CONNECT_TIMEOUT,
+    SOURCE_STALL_TIMEOUT,
+)
+
+STATE_CONNECTING = "connecting"
+STATE_LIVE = "live"
+STATE_BACKOFF = "backoff"
+STATE_FAILED = "failed"
+
+WATCHDOG_INTERVAL_MS = 1000
+
+
+def compute_backoff_delay(attempt, base_delay=SOURCE_RECONNECT_BASE_DELAY,
+                          max_delay=SOURCE_RECONNECT_MAX_DELAY, jitter=SOURCE_RECONNECT_JITTER):
+    """
+    Compute the delay before reconnect attempt number `attempt` (0-based).
+
+    Args:
+        attempt: Number of consecutive failed attempts so far
+        base_delay: Delay for the first attempt in seconds
+        max_delay: Upper bound of the exponential part in seconds
+        jitter: Random +/- fraction applied to the delay
+
+    Returns:
+        Delay in seconds
+    """
+    delay = min(max_delay, base_delay * (2 ** attempt))
+    return max(0.0, delay * random.uniform(1.0 - jitter, 1.0 + jitter))
+
+
+class SourceSupervisor:
+    """Supervises the source section of every camera inside a single GStreamer pipeline."""
+
+    def __init__(self, sources, socketio=None):
+        """
+        Args:
+            sources: Dict of {camera_id: (source_prefix, exit_element_name)} where source_prefix is the
+                     name prefix of the camera's source elements and exit_element_name is the last
+                     element of its source section
+            socketio: Optional SocketIO instance used to broadcast state changes
+        """
+        self.socketio = socketio
+        self.pipeline = None
+        self._lock = threading.Lock()
+        self._watchdog_id = None
+        self._sources = {}
+        for camera_id, (prefix, exit_name) in sources.items():
+            self._sources[camera_id] = {
+                "prefix": prefix,
+                "exit_name": exit_name,
+                "members": [],
+                "state": STATE_CONNECTING,
+                "reconnects": 0,
+                "attempt": 0,
+                "last_error": None,
+                "last_buffer": None,
+                "state_since": time.monotonic(),
+                "retry_at": None,
+                "timer_id": None,
+            }
+
+    def attach(self, pipeline):
+        """
+        Resolve the elements of every source section and install the supervision probes.
+        Must be called after the pipeline is created and before it goes to PLAYING.
+        """
+        self.pipeline = pipeline
+        for camera_id, source in self._sources.items():
+            exit_element = pipeline.get_by_name(source["exit_name"])
+            if exit_element is None:
+                print(f"[WARN] Source exit element {source['exit_name']} not found, {camera_id} is unsupervised")
+                continue
+
+            source["members"] = self._collect_members(pipeline, exit_element, source["prefix"])
+            for element in source["members"]:
+                if any(t.presence == Gst.PadPresence.SOMETIMES for t in element.get_pad_template_list()):
+                    element.connect("pad-added", self._on_pad_added, camera_id)
+
+            exit_pad = exit_element.get_static_pad("src")
+            exit_pad.add_probe(
+                Gst.PadProbeType.BUFFER | Gst.PadProbeType.EVENT_DOWNSTREAM,
+                self._exit_probe,
+                camera_id
+            )
+
+        self._watchdog_id = GLib.timeout_add(WATCHDOG_INTERVAL_MS, self._watchdog)
+
+    def detach(self):
+        """Cancel all pending restarts and the watchdog."""
+        with self._lock:
+            for source in self._sources.values():
+                if source["timer_id"] is not None:
+                    GLib.source_remove(source["timer_id"])
+                    source["timer_id"] = None
+            if self._watchdog_id is not None:
+                GLib.source_remove(self._watchdog_id)
+                self._watchdog_id = None
+        self.pipeline = None
+
+    def handle_message(self, message):
+        """
+        Handle a bus message if it belongs to a supervised source.
+
+        Returns:
+            bool: True if the message was consumed and must not stop the pipeline
+        """
+        if message.type != Gst.MessageType.ERROR:
+            return False
+
+        camera_id = self.camera_for_element(message.src)
+        if camera_id is None:
+            return False
+
+        err, debug = message.parse_error()
+        print(f"[WARN] Source error on {camera_id}: {err}, {debug}")
+        self._on_source_failure(camera_id, str(err))
+        return True
+
+    def camera_for_element(self, element):
+        """Return the camera whose source section contains element (or one of its parents)."""
+        while element is not None:
+            for camera_id, source in self._sources.items():
+                if element in source["members"]:
+                    return camera_id
+            element = element.get_parent()
+        return None
+
+    def get_status(self):
+        """
+        Get the supervision state of every camera.
+
+        Returns:
+            Dict of {camera_id: status dict}
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                camera_id: {
+                    "state": source["state"],
+                    "reconnects": source["reconnects"],
+                    "last_error": source["last_error"],
+                    "state_age": round(now - source["state_since"], 1),
+                    "retry_in": round(max(0.0, source["retry_at"] - now), 1) if source["retry_at"] else None,
+                }
+                for camera_id, source in self._sources.items()
+            }
+
+    def _collect_members(self, pipeline, exit_element, prefix):
+        """Walk upstream from the exit element and add every element named with the source prefix."""
+        members = []
+        pending = [exit_element]
+        while pending:
+            element = pending.pop(0)
+            if element in members:
+                continue
+            members.append(element)
+            for pad in element.sinkpads:
+                peer = pad.get_peer()
+                if peer is not None and peer.get_parent_element() is not None:
+                    pending.append(peer.get_parent_element())
+
+        # Elements with dynamic pads (rtspsrc, decodebin) are not linked yet at this point
+        it = pipeline.iterate_elements()
+        while True:
+            result, element = it.next()
+            if result != Gst.IteratorResult.OK:
+                break
+            if element not in members and (element.get_name() == prefix or element.get_name().startswith(f"{prefix}_")):
+                members.append(element)
+        return members
+
+    def _on_pad_added(self, element, pad, camera_id):
+        """Re-link dynamic pads after a restart; launch-time delayed links only fire once."""
+        if pad.direction != Gst.PadDirection.SRC or pad.is_linked():
+            return
+        for member in self._sources[camera_id]["members"]:
+            if member is element:
+                continue
+            for sink_pad in member.sinkpads:
+                if not sink_pad.is_linked() and pad.can_link(sink_pad):
+                    if pad.link(sink_pad) == Gst.PadLinkReturn.OK:
+                        print(f"[INFO] Re-linked {element.get_name()}:{pad.get_name()} for {camera_id}")
+                        return
+
+    def _exit_probe(self, pad, info, camera_id):
+        """Track buffer arrival and swallow per-source EOS so it never reaches shared elements."""
+        if info.type & Gst.PadProbeType.BUFFER:
+            source = self._sources[camera_id]
+            source["last_buffer"] = time.monotonic()
+            if source["state"] != STATE_LIVE:
+                GLib.idle_add(self._mark_live, camera_id)
+            return Gst.PadProbeReturn.OK
+
+        event = info.get_event()
+        if event is not None and event.type == Gst.EventType.EOS:
+            print(f"[WARN] End-of-stream on {camera_id}")
+            GLib.idle_add(self._on_source_failure, camera_id, "end-of-stream")
+            return Gst.PadProbeReturn.DROP
+        return Gst.PadProbeReturn.OK
+
+    def _mark_live(self, camera_id):
+        with self._lock:
+            source = self._sources[camera_id]
+            if source["state"] == STATE_LIVE:
+                return False
+            source["attempt"] = 0
+            self._set_state(camera_id, STATE_LIVE)
+        self._emit_status()
+        return False
+
+    def _on_source_failure(self, camera_id, reason):
+        with self._lock:
+            source = self._sources[camera_id]
+            if source["state"] in (STATE_BACKOFF, STATE_FAILED):
+                return False
+            source["last_error"] = reason
+
+            if SOURCE_RECONNECT_MAX_ATTEMPTS and source["attempt"] >= SOURCE_RECONNECT_MAX_ATTEMPTS:
+                print(f"[ERROR] {camera_id} failed after {source['attempt']} reconnect attempts")
+                self._stop_members(source)
+                self._set_state(camera_id, STATE_FAILED)
+            else:
+                delay = compute_backoff_delay(source["attempt"])
+                source["attempt"] += 1
+                source["retry_at"] = time.monotonic() + delay
+                print(f"[INFO] Restarting {camera_id} in {delay:.1f}s (attempt {source['attempt']})")
+                self._stop_members(source)
+                self._set_state(camera_id, STATE_BACKOFF)
+                source["timer_id"] = GLib.timeout_add(int(delay * 1000), self._restart_source, camera_id)
+        self._emit_status()
+        return False
+
+    def _restart_source(self, camera_id):
+        with self._lock:
+            source = self._sources[camera_id]
+            source["timer_id"] = None
+            source["retry_at"] = None
+            if self.pipeline is None:
+                return False
+            source["reconnects"] += 1
+            self._set_state(camera_id, STATE_CONNECTING)
+            # Members are ordered downstream first, so nothing pushes into an element that is not running yet
+            for element in source["members"]:
+                element.sync_state_with_parent()
+        self._emit_status()
+        return False
+
+    def _stop_members(self, source):
+        for element in reversed(source["members"]):
+            element.set_state(Gst.State.NULL)
+
+    def _watchdog(self):
+        """Restart sources that never produced a buffer or stopped producing them."""
+        now = time.monotonic()
+        for camera_id, source in self._sources.items():
+            last_activity = max(source["state_since"], source["last_buffer"] or 0.0)
+            if source["state"] == STATE_CONNECTING and now - last_activity > SOURCE_CONNECT_TIMEOUT:
+                self._on_source_failure(camera_id, "connect timeout")
+            elif source["state"] == STATE_LIVE and now - last_activity > SOURCE_STALL_TIMEOUT:
+                self._on_source_failure(camera_id, "stalled")
+        return self.pipeline is not None
+
+    def _set_state(self, camera_id, state):
+        source = self._sources[camera_id]
+        if source["state"] != state:
+            print(f"[INFO] {camera_id}: {source['state']} -> {state}")
+            source["state"] = state
+            source["state_since"] = time.monotonic()
+
+    def _emit_status(self):
+        if self.socketio:
+            self.socketio.emit("source_status", {"cameras": self.get_status()})
@@ -1,5 +1,64 @@
+// Options passed through from the page URL
+const pageOptions = new URLSearchParams(window.location.search);
+
+// ?encoding=msgpack asks for compact binary count payloads; only then is the MessagePack script loaded
+const MSGPACK_SCRIPT = "https://unpkg.com/@msgpack/msgpack@2.8.0/dist.es5+umd/msgpack.min.js";
+
 // Socket connection - adjust IP address if needed
-const socket = io();
+// Connected once the requested encoding can be decoded, so handlers are registered first
+const socket = io({ autoConnect: false });
+
+function connectSocket() {
+    // Falls back to JSON if the MessagePack script could not be loaded
+    socket.auth = { encoding: pageOptions.get("encoding") === "msgpack" && window.MessagePack ? "msgpack" : "json" };
+    socket.connect();
+}
+
+if (pageOptions.get("encoding") === "msgpack") {
+    const msgpackScript = document.createElement("script");
+    msgpackScript.src = MSGPACK_SCRIPT;
+    msgpackScript.onload = connectSocket;
+    msgpackScript.onerror = connectSocket;
+    document.head.appendChild(msgpackScript);
+} else {
+    connectSocket();
+}
+
+// Negotiated count payload encoding and, for msgpack, the table of interned key names
+let payloadEncoding = "json";
+let nameTable = { version: 0, names: {} };
+
+socket.on('encoding', (data) => {
+    payloadEncoding = data.encoding;
+    nameTable = { version: data.version, names: data.names };
+});
+
+socket.on('names', (data) => {
+    nameTable = { version: data.version, names: data.names };
+    // Payloads skipped while names were missing are recovered with a full resync
+    socket.emit('request_full_counts');
+});
+
+function expandNames(value) {
+    if (Array.isArray(value)) return value.map(expandNames);
+    if (value === null || typeof value !== "object") return value;
+    const expanded = {};
+    Object.entries(value).forEach(([key, item]) => {
+        expanded[nameTable.names[key] ?? key] = expandNames(item);
+    });
+    return expanded;
+}
+
+// Returns the payload of a count event, or null if it uses names we do not have yet
+function decodePayload(payload) {
+    if (payloadEncoding !== "msgpack") return payload;
+    const [version, body] = MessagePack.decode(new Uint8Array(payload));
+    if (version > nameTable.version) {
+        socket.emit('request_names');
+        return null;
+    }
+    return expandNames(body);
+}
 
 // State management
 let selectedZone = null;
@@ -25,6 +84,45 @@ const snapshotOverlay = document.getElementById("snapshot-overlay");
 const ctx = canvasOverlay.getContext("2d");
 const snapshotCtx = snapshotOverlay.getContext("2d");
 
+// Video feed options passed through from the page URL (e.g. ?width=640&quality=60&max_fps=5 for slow links)
+const videoFeedOptions = new URLSearchParams(
+    [...new URLSearchParams(window.location.search)].filter(([key]) => ["width", "quality", "max_fps"].includes(key))
+).toString();
+
+function videoFeedUrl(cameraId) {
+    return `/video_feed?camera_id=${cameraId}` + (videoFeedOptions ? `&${videoFeedOptions}` : "");
+}
+
+// ?video=socket receives frames over the Socket.IO connection instead of a multipart /video_feed request
+// (also takes ?format=webp and ?window=<unacknowledged frames>)
+const useVideoChannel = pageOptions.get("video") === "socket";
+let videoChannelCamera = null;
+if (useVideoChannel) videoFeed.removeAttribute("src");  // cancel the template's /video_feed request
+
+function showVideoFeed(cameraId) {
+    if (!useVideoChannel) {
+        videoFeed.src = videoFeedUrl(cameraId);
+        return;
+    }
+    if (!cameraId) return;
+    videoChannelCamera = cameraId;
+    const subscription = { camera_id: cameraId, format: pageOptions.get("format") || "jpeg" };
+    ["width", "quality", "window"].forEach(key => {
+        if (pageOptions.has(key)) subscription[key] = Number(pageOptions.get(key));
+    });
+    socket.emit('video_subscribe', subscription);
+}
+
+socket.on('video_frame', (frame) => {
+    // Acknowledge first so the server can send the next frame while this one is decoded
+    socket.emit('video_ack', { seq: frame.seq });
+    if (frame.camera_id !== videoChannelCamera) return;
+
+    const previousUrl = videoFeed.src;
+    videoFeed.src = URL.createObjectURL(new Blob([frame.data], { type: `image/${frame.format}` }));
+    if (previousUrl.startsWith("blob:")) URL.revokeObjectURL(previousUrl);
+});
+
 // Fixed original video dimensions
 const ORIGINAL_VIDEO_WIDTH = 1920;
 const ORIGINAL_VIDEO_HEIGHT = 1080;
@@ -85,6 +183,9 @@ function loadCameras() {
                 button.addEventListener('click', () => switchCamera(camera));
                 cameraButtonsDiv.appendChild(button);
             });
+            // Runs on every (re)connect, and subscriptions do not survive a reconnect
+            socket.emit('subscribe', { camera_ids: [currentCamera] });
+            if (useVideoChannel) showVideoFeed(currentCamera);
         })
         .catch(error => {
             console.error('Error loading cameras:', error);
@@ -105,7 +206,7 @@ function switchCamera(cameraId) {
     });
     
     // Update video feed source
-    videoFeed.src = `/video_feed?camera_id=${cameraId}`;
+    showVideoFeed(cameraId);
     currentCamera = cameraId;
     
     // Clear and redraw zones
@@ -694,21 +795,76 @@ socket.on('connect', () => {
     loadZones();
 });
 
-socket.on('update_counts', (data) => {
-    zones = data.data;
-    currentCamera = data.active_camera;
+// Version of the count data we hold per camera; count_delta events only apply on top of the version they were made for
+let countVersions = {};
+
+socket.on('count_full', (payload) => {
+    const data = decodePayload(payload);
+    if (!data) return;
+    Object.entries(data.cameras).forEach(([cameraId, camera]) => {
+        zones[cameraId] = { ...(zones[cameraId] || {}), zones: camera.zones };
+        countVersions[cameraId] = camera.version;
+    });
     updateZoneBoxes();
     updateHistory();
 });
 
+socket.on('count_delta', (payload) => {
+    const data = decodePayload(payload);
+    if (!data) return;
+    let resync = false;
+    Object.entries(data.cameras).forEach(([cameraId, camera]) => {
+        // Not subscribed yet (count_full is on its way), or already contained in the count_full we hold
+        if (countVersions[cameraId] === undefined || camera.version <= countVersions[cameraId]) return;
+        if (countVersions[cameraId] !== camera.previous || !zones[cameraId]) {
+            resync = true;  // missed an update
+            return;
+        }
+        const cameraZones = zones[cameraId].zones;
+        Object.entries(camera.zones).forEach(([zone, delta]) => {
+            if (delta === null) {
+                delete cameraZones[zone];
+            } else if (delta.full) {
+                cameraZones[zone] = delta.full;
+            } else if (cameraZones[zone]) {
+                const { events, occupancy, ...fields } = delta;
+                Object.assign(cameraZones[zone], fields);
+                if (events) cameraZones[zone].history = (cameraZones[zone].history || []).concat(events);
+            }
+        });
+        countVersions[cameraId] = camera.version;
+    });
+    if (resync) {
+        socket.emit('request_full_counts');
+        return;
+    }
+    updateZoneBoxes();
+    updateHistory();
+});
+
+// Zone events carry only the changed zone, without history (count_delta brings the history)
+function mergeZone(cameraId, zone, zoneData) {
+    if (!zoneData) return;
+    if (!zones[cameraId]) zones[cameraId] = { zones: {} };
+    const cameraZones = zones[cameraId].zones;
+    cameraZones[zone] = { history: [], ...(cameraZones[zone] || {}), ...zoneData };
+}
+
 socket.on('count_reset', (data) => {
-    zones = data.data;
+    mergeZone(data.camera, data.zone, data.zone_data);
     updateZoneBoxes();
     updateHistory();
 });
 
 socket.on('zone_updated', (data) => {
-    zones = data.data;
+    mergeZone(data.camera, data.zone, data.zone_data);
+    drawAllZones(ctx, canvasOverlay.width, canvasOverlay.height);
+});
+
+socket.on('zone_deleted', (data) => {
+    if (zones[data.camera]) delete zones[data.camera].zones[data.zone];
+    updateZoneBoxes();
+    updateHistory();
     drawAllZones(ctx, canvasOverlay.width, canvasOverlay.height);
 });
 
@@ -717,7 +873,7 @@ socket.on('camera_changed', (data) => {
     currentCamera = data.active_camera;
     
     // Update video feed
-    videoFeed.src = `/video_feed?camera_id=${currentCamera}`;
+    showVideoFeed(currentCamera);
     
     // Update active button
     const buttons = document.querySelectorAll('#camera-selector button');
@@ -736,6 +892,48 @@ socket.on('error', (data) => {
     showToast(data.message);
 });
 
+// Pipeline jobs being waited for: {job_id: callback}
+const jobWaiters = {};
+const FINISHED_JOB_STATES = ["succeeded", "failed", "superseded"];
+
+socket.on('pipeline_job', (job) => {
+    if (jobWaiters[job.id]) jobWaiters[job.id](job);
+});
+
+function showJobProgress(job) {
+    const current = job.sources.find(source => source.state === "validating");
+    const detail = current ? ` (${current.camera_id})` : "";
+    if (job.message) showToast(`${job.message}${detail}`);
+}
+
+// Resolve with the job once it has finished; progress comes from 'pipeline_job' events,
+// polling /api/jobs/<id> covers a missed event or a disconnected socket
+function waitForJob(jobId) {
+    return new Promise(resolve => {
+        let lastStage = null;
+        const poll = setInterval(async () => {
+            try {
+                const res = await fetch(`/api/jobs/${jobId}`);
+                if (res.ok) update(await res.json());
+            } catch (err) {
+                console.error("Failed to poll pipeline job:", err);
+            }
+        }, 2000);
+        function update(job) {
+            if (job.stage !== lastStage) {
+                lastStage = job.stage;
+                showJobProgress(job);
+            }
+            if (FINISHED_JOB_STATES.includes(job.state)) {
+                clearInterval(poll);
+                delete jobWaiters[jobId];
+                resolve(job);
+            }
+        }
+        jobWaiters[jobId] = update;
+    });
+}
+
 function initializeSources() {
     const form = document.getElementById("start-pipeline-form");
     const textarea = document.getElementById("source-urls");
@@ -748,10 +946,25 @@ function initializeSources() {
 
     form.addEventListener("submit", async function (e) {
         e.preventDefault();
+        // One camera per line:
+        // "<analysis url> [<main stream url>] [profile=<latency profile>] [fps=<inference fps>] [skipframe=1]"
         const sources = textarea.value
             .split("\n")
-            .map(url => url.trim())
-            .filter(url => url.length > 0);
+            .map(line => line.trim())
+            .filter(line => line.length > 0)
+            .map(line => {
+                const options = line.split(/\s+/).filter(token => /^(profile|fps|skipframe)=/.test(token));
+                const [url, viewUrl] = line.split(/\s+/).filter(token => !options.includes(token));
+                const source = { url: url };
+                if (viewUrl) source.view_url = viewUrl;
+                options.forEach(option => {
+                    const [key, value] = option.split("=");
+                    if (key === "profile") source.latency_profile = value;
+                    if (key === "fps") source.inference_fps = Number(value);
+                    if (key === "skipframe") source.decoder_skip_frame = value === "1";
+                });
+                return Object.keys(source).length > 1 ? source : url;
+            });
 
         if (sources.length === 0) {
             showToast("Please enter at least one video source.");
@@ -765,8 +978,10 @@ function initializeSources() {
                 body: JSON.stringify({ sources })
             });
             const result = await res.json();
+            // The pipeline starts in a background job; wait for it to finish
+            const job = result.success ? await waitForJob(result.job_id) : null;
 
-            if (result.success) {
+            if (job && job.state === "succeeded") {
                 // Clear existing camera buttons
                 cameraButtonsDiv.innerHTML = '';
 
@@ -793,7 +1008,7 @@ function initializeSources() {
                 // Show success toast
                 showToast(`Pipeline started with ${sources.length} camera(s)`);
             } else {
-                showToast(result.message || "Failed to start pipeline");
+                showToast((job && job.message) || result.message || "Failed to start pipeline");
             }
         } catch (err) {
             console.error("Failed to start pipeline:", err);
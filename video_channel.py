@@ -0,0 +1,133 @@
+"""
+Binary video channel module.
+Sends encoded frames over the page's existing Socket.IO connection as an alternative to the
+multipart /video_feed response. Subscribers of a camera at one variant join one room and share
+one sender task and one encoding per frame. Frames are emitted to every subscriber separately
+(to its sid), because each has its own credit: a client acknowledges frames and is only sent a
+new frame while it has fewer than its window of frames unacknowledged, so a slow client skips
+frames instead of queuing them. Credit for a frame whose acknowledgement never arrives (lost
+ack, transport reconnect) returns after STREAM_SLOW_CLIENT_TIMEOUT.
+"""
+
+import threading
+import time
+from collections import deque
+from frame_hub import SOURCE_ANALYSIS, SOURCE_MAIN, variant_label
+from config import STREAM_FRAME_WAIT_TIMEOUT, STREAM_SLOW_CLIENT_TIMEOUT, VIDEO_CHANNEL_WINDOW
+
+
+def get_video_room(camera_id, variant):
+    """Socket.IO room of the subscribers of a camera at one variant."""
+    return f"video:{camera_id}:{variant_label(variant)}"
+
+
+class VideoChannelManager:
+    """Manager class for Socket.IO video subscriptions and their per-room sender tasks."""
+
+    def __init__(self, socketio, frame_hub, main_stream_manager=None):
+        self.socketio = socketio
+        self.frame_hub = frame_hub
+        self.main_stream_manager = main_stream_manager
+        self._lock = threading.Lock()
+        self._rooms = {}    # {room: {"camera_id", "variant", "subscribers": {sid: client state}}}
+        self._clients = {}  # {sid: room}
+
+    def subscribe(self, sid, camera_id, variant, window=VIDEO_CHANNEL_WINDOW):
+        """
+        Subscribe a client to a camera, replacing its previous subscription.
+
+        Returns:
+            str: The room the client joined
+        """
+        self.unsubscribe(sid)
+        room = get_video_room(camera_id, variant)
+        with self._lock:
+            state = self._rooms.get(room)
+            start_sender = state is None
+            if start_sender:
+                state = self._rooms[room] = {"camera_id": camera_id, "variant": variant, "subscribers": {}}
+            state["subscribers"][sid] = {"window": window, "pending": deque(), "sent": 0, "skipped": 0, "expired": 0}
+            self._clients[sid] = room
+        if start_sender:
+            self.socketio.start_background_task(self._send_loop, room)
+        return room
+
+    def unsubscribe(self, sid):
+        """Remove a client's subscription. Returns the room it left, or None."""
+        with self._lock:
+            room = self._clients.pop(sid, None)
+            if room is not None:
+                self._rooms[room]["subscribers"].pop(sid, None)
+        return room
+
+    def acknowledge(self, sid, seq):
+        """Return the credit of an acknowledged frame to a client; unknown or expired frames are ignored."""
+        with self._lock:
+            room = self._clients.get(sid)
+            client = self._rooms[room]["subscribers"].get(sid) if room else None
+            if client is None:
+                return
+            pending = client["pending"]
+            for index, (pending_seq, _) in enumerate(pending):
+                if pending_seq == seq:
+                    del pending[index]
+                    client["acked_seq"] = seq
+                    return
+
+    def get_status(self):
+        """Return the subscribers and their flow control state per room."""
+        with self._lock:
+            return {
+                room: {
+                    sid: {**{key: value for key, value in client.items() if key != "pending"},
+                          "in_flight": len(client["pending"])}
+                    for sid, client in state["subscribers"].items()
+                }
+                for room, state in self._rooms.items()
+            }
+
+    @staticmethod
+    def _expire_credit(client, now):
+        """Give back the credit of frames sent longer than STREAM_SLOW_CLIENT_TIMEOUT ago and never acknowledged."""
+        pending = client["pending"]
+        while pending and now - pending[0][1] > STREAM_SLOW_CLIENT_TIMEOUT:
+            pending.popleft()
+            client["expired"] += 1
+
+    def _send_loop(self, room):
+        state = self._rooms[room]
+        camera_id, variant = state["camera_id"], state["variant"]
+        use_main_stream = self.main_stream_manager is not None and self.main_stream_manager.acquire(camera_id)
+        last_seq = {SOURCE_ANALYSIS: 0, SOURCE_MAIN: 0}
+        try:
+            while True:
+                with self._lock:
+                    if not state["subscribers"]:
+                        del self._rooms[room]
+                        return
+
+                source = SOURCE_MAIN if use_main_stream and self.frame_hub.has_frames(camera_id, SOURCE_MAIN) else SOURCE_ANALYSIS
+                seq, data = self.frame_hub.wait_for_frame(
+                    camera_id, last_seq[source], STREAM_FRAME_WAIT_TIMEOUT, source, variant)
+                if data is None:
+                    continue
+                last_seq[source] = seq
+
+                payload = {"camera_id": camera_id, "seq": seq, "format": variant.format, "data": data}
+                now = time.monotonic()
+                with self._lock:
+                    ready = []
+                    for sid, client in state["subscribers"].items():
+                        self._expire_credit(client, now)
+                        if len(client["pending"]) < client["window"]:
+                            client["pending"].append((seq, now))
+                            client["sent"] += 1
+                            ready.append(sid)
+                        else:
+                            client["skipped"] += 1
+                for sid in ready:
+                    self.socketio.emit("video_frame", payload, to=sid)
+        finally:
+            if use_main_stream:
+                self.main_stream_manager.release(camera_id)
+
@@ -3,87 +3,325 @@ Video streaming module for handling video feeds and snapshots.
 Manages frame generation and encoding for web streaming.
 """
 
+import itertools
+import threading
+import time
 import cv2
 import numpy as np
-from flask import Response
-from config import JPEG_QUALITY
+from flask import Response, request, has_request_context
+from config import MAIN_STREAM_SNAPSHOT_WAIT, STREAM_FRAME_WAIT_TIMEOUT, STREAM_SLOW_CLIENT_TIMEOUT
+from frame_hub import FrameHub, DEFAULT_VARIANT, SOURCE_ANALYSIS, SOURCE_MAIN, variant_label, encode_frame
+from server_mode import in_server_loop, start_send_deadline
 
 
 class VideoStreamManager:
     """Manager class for handling video streaming operations."""
     
-    def __init__(self, frame_buffers, user_data):
+    def __init__(self, frame_buffers, user_data, main_stream_manager=None, frame_hub=None, mosaic_manager=None):
         self.frame_buffers = frame_buffers
         self.user_data = user_data
+        self.main_stream_manager = main_stream_manager
+        self.frame_hub = frame_hub or FrameHub()
+        self.mosaic_manager = mosaic_manager
+        self._blank_frames = {}  # {camera_id: encoded placeholder}
+        self._stats_lock = threading.Lock()
+        self._snapshot_stats = {"requests": 0, "not_modified": 0, "cache_hits": 0, "encodes": 0}
+        self._clients = {}  # {client id: send statistics of one streaming connection}
+        self._client_ids = itertools.count(1)
     
-    def generate_frames(self, camera_id):
+    def generate_frames(self, camera_id, variant=DEFAULT_VARIANT, max_fps=None, remote_addr=None):
         """
         Generate video stream frames for the specified camera.
+        Uses the camera's main stream while it has frames, the analysis frames otherwise.
+        Blocks until the frame hub has a newer frame, so each frame is sent (and encoded) once.
+        A client that cannot keep up (or asked for a lower max_fps) always gets the newest frame;
+        the frames in between are skipped rather than queued.
         
         Args:
             camera_id: ID of the camera to stream from
+            variant: StreamVariant (width, JPEG quality) to stream
+            max_fps: Maximum frames per second sent to this client, None for every frame
+            remote_addr: Address of the client, reported in the client statistics
             
         Yields:
             Video frame bytes in multipart format
         """
-        while True:
-            if camera_id in self.frame_buffers and self.frame_buffers[camera_id] is not None:
-                frame = self.frame_buffers[camera_id]
-                _, buffer = cv2.imencode(".jpg", frame)
-                frame_bytes = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            else:
-                # If camera feed not available, yield a blank frame
-                blank_frame = self._create_blank_frame(camera_id)
-                _, buffer = cv2.imencode(".jpg", blank_frame)
-                frame_bytes = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        client = self._open_client(camera_id, variant, remote_addr)
+        use_main_stream = self.main_stream_manager is not None and self.main_stream_manager.acquire(camera_id)
+        last_seq = {SOURCE_ANALYSIS: 0, SOURCE_MAIN: 0}
+        last_frame_bytes = None
+        min_interval = 1.0 / max_fps if max_fps else 0.0
+        next_send = 0.0
+        try:
+            while True:
+                if min_interval:
+                    delay = next_send - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_send = time.monotonic() + min_interval
+                source = SOURCE_MAIN if use_main_stream and self.frame_hub.has_frames(camera_id, SOURCE_MAIN) else SOURCE_ANALYSIS
+                seq, frame_bytes = self.frame_hub.wait_for_frame(
+                    camera_id, last_seq[source], STREAM_FRAME_WAIT_TIMEOUT, source, variant)
+                if frame_bytes is None:
+                    if self.frame_hub.has_frames(camera_id, source) and last_frame_bytes is not None:
+                        # No new frame yet: repeat the last one so a closed connection is noticed
+                        frame_bytes = last_frame_bytes
+                    else:
+                        # If camera feed not available, yield a blank frame
+                        frame_bytes = self._get_blank_frame_bytes(camera_id)
+                skipped = seq - last_seq[source] - 1 if last_seq[source] else 0
+                last_seq[source] = seq
+                last_frame_bytes = frame_bytes
+                if not (yield from self._send_frame(client, frame_bytes, skipped)):
+                    return
+        finally:
+            self._close_client(client)
+            if use_main_stream:
+                self.main_stream_manager.release(camera_id)
+    
+    def _get_view_frame(self, camera_id, timeout=0.0):
+        """Get the latest main stream frame for a camera, or None."""
+        return self.main_stream_manager.get_frame(camera_id, timeout)
     
-    def get_video_feed_response(self, camera_id):
+    def get_video_feed_response(self, camera_id, variant=DEFAULT_VARIANT, max_fps=None):
         """
         Get Flask Response object for video streaming.
         
         Args:
             camera_id: ID of the camera to stream from
+            variant: StreamVariant (width, JPEG quality) to stream
+            max_fps: Maximum frames per second, None for every frame
             
         Returns:
             Flask Response object with video stream
         """
         return Response(
-            self.generate_frames(camera_id),
+            self.generate_frames(camera_id, variant, max_fps, self._prepare_connection()),
             mimetype="multipart/x-mixed-replace; boundary=frame"
         )
     
-    def get_snapshot(self, camera_id):
+    def generate_mosaic_frames(self, camera_ids, interval, variant=DEFAULT_VARIANT, remote_addr=None):
+        """
+        Generate mosaic stream frames for the specified cameras.
+        The mosaic is composed once per interval for all viewers of the same cameras and interval.
+        
+        Args:
+            camera_ids: IDs of the cameras in the mosaic, in grid order
+            interval: Seconds between compositions
+            variant: StreamVariant (width, JPEG quality) to stream
+            remote_addr: Address of the client, reported in the client statistics
+            
+        Yields:
+            Video frame bytes in multipart format
+        """
+        mosaic_id = self.mosaic_manager.acquire(camera_ids, interval)
+        client = self._open_client(mosaic_id, variant, remote_addr)
+        last_seq = 0
+        last_frame_bytes = None
+        try:
+            while True:
+                seq, frame_bytes = self.frame_hub.wait_for_frame(
+                    mosaic_id, last_seq, max(STREAM_FRAME_WAIT_TIMEOUT, 2 * interval), variant=variant)
+                if frame_bytes is None:
+                    if last_frame_bytes is None:
+                        continue
+                    # No camera changed: repeat the last mosaic so a closed connection is noticed
+                    frame_bytes = last_frame_bytes
+                skipped = seq - last_seq - 1 if last_seq else 0
+                last_seq = seq
+                last_frame_bytes = frame_bytes
+                if not (yield from self._send_frame(client, frame_bytes, skipped)):
+                    return
+        finally:
+            self._close_client(client)
+            self.mosaic_manager.release(mosaic_id)
+    
+    def get_mosaic_response(self, camera_ids, interval, variant=DEFAULT_VARIANT):
+        """
+        Get Flask Response object for mosaic streaming.
+        
+        Returns:
+            Flask Response object with video stream
+        """
+        return Response(
+            self.generate_mosaic_frames(camera_ids, interval, variant, self._prepare_connection()),
+            mimetype="multipart/x-mixed-replace; boundary=frame"
+        )
+    
+    def _prepare_connection(self):
+        """
+        Give the current request's connection a send timeout of STREAM_SLOW_CLIENT_TIMEOUT, so a write
+        to a client that stopped reading fails instead of blocking the worker thread forever.
+        In gevent mode the writes are bounded per frame by _send_frame instead.
+
+        Returns:
+            str: Remote address of the client, or None outside a request
+        """
+        if not has_request_context():
+            return None
+        # The threading (Werkzeug) server exposes the connection's socket
+        connection = request.environ.get("werkzeug.socket")
+        if connection is not None:
+            connection.settimeout(STREAM_SLOW_CLIENT_TIMEOUT)
+        elif not in_server_loop():
+            print(f"[WARN] Cannot bound video writes to {request.remote_addr}: the server exposes no socket; "
+                  f"a client that stops reading is only noticed if a write returns")
+        return request.remote_addr
+
+    def _open_client(self, stream_id, variant, remote_addr=None):
+        """Register a streaming connection for send statistics."""
+        client = {
+            "id": next(self._client_ids),
+            "stream": stream_id,
+            "variant": variant_label(variant),
+            "remote_addr": remote_addr,
+            "connected_at": time.monotonic(),
+            "frames_sent": 0,
+            "frames_skipped": 0,
+            "bytes_sent": 0,
+            "send_ms": 0.0,
+            "max_send_ms": 0.0,
+        }
+        with self._stats_lock:
+            self._clients[client["id"]] = client
+        return client
+
+    def _close_client(self, client):
+        with self._stats_lock:
+            self._clients.pop(client["id"], None)
+
+    def _send_frame(self, client, frame_bytes, skipped):
+        """
+        Yield one multipart frame and measure how long the server took to write it to the client.
+        The generator only resumes once the chunk was written, so the time spent in the yield is
+        the client's send time. A write that does not finish within STREAM_SLOW_CLIENT_TIMEOUT
+        fails (socket timeout in threading mode, a deadline on the greenlet in gevent mode) and
+        the server closes the generator.
+
+        Returns:
+            bool: False if the client is too slow and should be disconnected
+        """
+        started = time.monotonic()
+        deadline = start_send_deadline(STREAM_SLOW_CLIENT_TIMEOUT)
+        try:
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        except GeneratorExit:
+            if time.monotonic() - started >= STREAM_SLOW_CLIENT_TIMEOUT:
+                print(f"[WARN] Disconnected slow video client {client['remote_addr']} of {client['stream']}: "
+                      f"sending one frame did not finish within {STREAM_SLOW_CLIENT_TIMEOUT:.1f}s")
+            raise
+        finally:
+            if deadline is not None:
+                deadline.close()
+        send_seconds = time.monotonic() - started
+
+        with self._stats_lock:
+            client["frames_sent"] += 1
+            client["frames_skipped"] += max(0, skipped)
+            client["bytes_sent"] += len(frame_bytes)
+            # Exponential moving average, so the stat follows link changes within a few frames
+            client["send_ms"] += 0.2 * (1000.0 * send_seconds - client["send_ms"])
+            client["max_send_ms"] = max(client["max_send_ms"], 1000.0 * send_seconds)
+
+        if send_seconds > STREAM_SLOW_CLIENT_TIMEOUT:
+            print(f"[WARN] Disconnecting slow video client {client['remote_addr']} of {client['stream']}: "
+                  f"sending one frame took {send_seconds:.1f}s")
+            return False
+        return True
+
+    def get_client_stats(self):
+        """
+        Get send statistics of every connected video feed and mosaic client.
+
+        Returns:
+            List of dicts with stream, variant, remote address, frame and byte counts and send times in ms
+        """
+        now = time.monotonic()
+        with self._stats_lock:
+            clients = [dict(client) for client in self._clients.values()]
+        for client in clients:
+            client["connected_seconds"] = round(now - client.pop("connected_at"), 1)
+            client["send_ms"] = round(client["send_ms"], 1)
+            client["max_send_ms"] = round(client["max_send_ms"], 1)
+        return clients
+
+    def get_snapshot(self, camera_id, variant=None, if_none_match=None):
         """
         Get a snapshot from the specified camera.
+        The encoding of the latest frame is cached per variant, so repeated requests for an
+        unchanged frame are answered without encoding.
         
         Args:
             camera_id: ID of the camera to get snapshot from
+            variant: StreamVariant (width, JPEG quality); defaults to DEFAULT_VARIANT (full width at
+                     STREAM_JPEG_QUALITY), whose encoding the video feeds already share
+            if_none_match: ETags the client already has (e.g. request.if_none_match)
             
         Returns:
-            Tuple of (success: bool, data: bytes or error_message: str)
+            Tuple of (success: bool, data: bytes, None if the client's copy is current, or error_message: str,
+            etag: str or None)
         """
         # Validate camera_id
         if camera_id not in self.user_data.data:
-            return False, f"Camera {camera_id} not found"
+            return False, f"Camera {camera_id} not found", None
         
-        # Check if frame_buffers is properly initialized
-        if not hasattr(self.frame_buffers, 'get'):
-            return False, "Snapshot system not ready"
+        source = SOURCE_ANALYSIS
+        if self.main_stream_manager is not None and self.main_stream_manager.acquire(camera_id):
+            try:
+                if self._get_view_frame(camera_id, MAIN_STREAM_SNAPSHOT_WAIT) is not None:
+                    source = SOURCE_MAIN
+            finally:
+                self.main_stream_manager.release(camera_id)
         
-        frame = self.frame_buffers.get(camera_id)
+        variant = variant or DEFAULT_VARIANT
+        seq, frame = self.frame_hub.get_frame(camera_id, source)
         if frame is None:
-            return False, "No frame available for this camera"
+            return False, "No frame available for this camera", None
+        
+        etag = self._snapshot_etag(camera_id, source, seq, variant)
+        if if_none_match and etag in if_none_match:
+            self._count_snapshot("not_modified")
+            return True, None, etag
         
         try:
-            # Compress the image
-            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
-            return True, buffer.tobytes()
+            # Compress the image (or reuse the cached encoding of this frame)
+            seq, data, cached = self.frame_hub.get_encoded(camera_id, source, variant)
         except Exception as e:
-            return False, f"Could not process snapshot: {e}"
+            return False, f"Could not process snapshot: {e}", None
+        if data is None:
+            return False, "No frame available for this camera", None
+        self._count_snapshot("cache_hits" if cached else "encodes")
+        return True, data, self._snapshot_etag(camera_id, source, seq, variant)
+    
+    def _snapshot_etag(self, camera_id, source, seq, variant):
+        return f"{self.frame_hub.epoch}-{camera_id}-{source}-{seq}-{variant_label(variant)}"
+    
+    def _count_snapshot(self, outcome):
+        with self._stats_lock:
+            self._snapshot_stats["requests"] += 1
+            self._snapshot_stats[outcome] += 1
+    
+    def get_snapshot_stats(self):
+        """
+        Get snapshot cache statistics.
+        
+        Returns:
+            Dict with request, not-modified, cache hit and encode counts and the hit ratio
+        """
+        with self._stats_lock:
+            stats = dict(self._snapshot_stats)
+        hits = stats["not_modified"] + stats["cache_hits"]
+        stats["hit_ratio"] = round(hits / stats["requests"], 3) if stats["requests"] else None
+        return stats
+    
+    def _get_blank_frame_bytes(self, camera_id):
+        """Get the encoded placeholder frame for a camera, encoding it only once."""
+        frame_bytes = self._blank_frames.get(camera_id)
+        if frame_bytes is None:
+            frame_bytes = self._blank_frames[camera_id] = encode_frame(
+                self._create_blank_frame(camera_id), DEFAULT_VARIANT, self.frame_hub.encoder)
+        return frame_bytes
     
     def _create_blank_frame(self, camera_id):
         """
@@ -1,10 +1,21 @@
 from flask import Flask, render_template, jsonify, request, Response
 from video_stream import VideoStreamManager
-from config import TEMPLATE_FILE, load_config, save_active_sources
-
-
-
-def register_routes(app: Flask, user_data, pipeline_manager, video_stream_manager):
+from frame_hub import make_variant
+from history_index import parse_time
+from response_cache import ResponseCache
+from pipeline_jobs import PipelineJobManager
+from metrics import REGISTRY, CONTENT_TYPE, gauge_family
+from server_mode import get_server_mode
+from config import (
+    TEMPLATE_FILE, STREAM_MAX_FPS, MOSAIC_INTERVAL, MOSAIC_MIN_INTERVAL, MOSAIC_MAX_INTERVAL,
+    HISTORY_PAGE_SIZE, COUNT_STREAM_RATE, normalize_video_source
+)
+
+
+
+def register_routes(app: Flask, user_data, pipeline_manager, video_stream_manager, video_channel_manager=None,
+                    preview_manager=None, history_index=None, response_cache=None, pipeline_jobs=None,
+                    count_stream=None):
     """
     Register all Flask routes.
 
@@ -13,16 +24,63 @@ def register_routes(app: Flask, user_data, pipeline_manager, video_stream_manage
         user_data: MultiSourceZoneVisitorCounter instance
         pipeline_manager: PipelineManager instance
         video_stream_manager: VideoStreamManager instance
+        video_channel_manager: Optional VideoChannelManager instance
+        preview_manager: Optional PreviewManager instance for H.264 HLS previews
+        history_index: Optional HistoryIndex instance for /api/history and /get_counts?since=
+        response_cache: Optional ResponseCache instance for the conditional zone and count endpoints
+        pipeline_jobs: Optional PipelineJobManager running pipeline start/stop/restart requests
+        count_stream: Optional CountStreamManager for the /api/stream/counts Server-Sent Events
     """
+    response_cache = response_cache or ResponseCache()
+    pipeline_jobs = pipeline_jobs or PipelineJobManager(pipeline_manager)
+
+    def versioned_json(version, build):
+        """
+        JSON response with an ETag for polled state: 304 when the client has the current version,
+        otherwise the cached body of this version (build() is only called when the state changed).
+        """
+        body, etag = response_cache.get(request.full_path, version, lambda: app.json.dumps(build()).encode(),
+                                        request.if_none_match)
+        response = Response(body, mimetype="application/json") if body is not None else Response(status=304)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+    def wants_history():
+        """False when the request has history=false (or 0/no)."""
+        return request.args.get("history", "true").lower() not in ("false", "0", "no")
+
+    def mark_zones_dirty(*camera_ids):
+        """Tell Socket.IO and count stream clients about zone changes in the next count broadcast."""
+        if pipeline_manager.count_broadcaster:
+            for camera_id in camera_ids:
+                pipeline_manager.count_broadcaster.mark_dirty(camera_id)
+
+    def split_arg(name):
+        """A comma separated query parameter as a list, None when absent."""
+        value = request.args.get(name)
+        return [item for item in value.split(",") if item] if value else None
 
     @app.route("/")
     def index():
         """Serve the main application page."""
         return render_template(TEMPLATE_FILE)
 
+    def job_response(kind, sources=None):
+        """202 response for a submitted pipeline job, pointing at its status URL."""
+        job, coalesced = pipeline_jobs.submit(kind, sources)
+        message = f"Pipeline {kind} {'already in progress' if coalesced else 'queued'}"
+        response = jsonify({"success": True, "job_id": job["id"], "job": job, "message": message})
+        response.status_code = 202
+        response.headers["Location"] = f"/api/jobs/{job['id']}"
+        return response
+
     @app.route("/start_pipeline", methods=["POST"])
     def start_pipeline():
-        """Start the GStreamer pipeline with video sources."""
+        """
+        Start the GStreamer pipeline with video sources as a background job.
+        Returns 202 with the job; progress is at /api/jobs/<job_id> and in 'pipeline_job' events.
+        """
         data = request.json
         if not data or "sources" not in data:
             return jsonify({"success": False, "message": "Missing 'sources' list"}), 400
@@ -30,70 +88,193 @@ def register_routes(app: Flask, user_data, pipeline_manager, video_stream_manage
         video_sources = data["sources"]
         if not isinstance(video_sources, list) or len(video_sources) == 0:
             return jsonify({"success": False, "message": "Sources must be a non-empty list"}), 400
-
         try:
-            success = pipeline_manager.start_pipeline(video_sources)
-            if success:
-                config = load_config()
-                config["video_sources"] = video_sources
-                save_active_sources(video_sources)
-                return jsonify({"success": True, "message": "Pipeline started with validated sources"}), 200
-            else:
-                return jsonify({"success": False, "message": "Failed to start pipeline - check RTSP sources"}), 400
-        except Exception as e:
-            return jsonify({"success": False, "message": f"Failed to start pipeline: {e}"}), 500
+            for source in video_sources:
+                normalize_video_source(source)
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        return job_response("start", video_sources)
 
     @app.route("/stop_pipeline", methods=["POST"])
     def stop_pipeline():
-        """Stop the GStreamer pipeline."""
-        try:
-            success = pipeline_manager.stop_pipeline()
-            if success:
-                return jsonify({"success": True, "message": "Pipeline stopped successfully"}), 200
-            else:
-                return jsonify({"success": False, "message": "Failed to stop pipeline"}), 500
-        except Exception as e:
-            return jsonify({"success": False, "message": f"Error stopping pipeline: {e}"}), 500
+        """Stop the GStreamer pipeline as a background job."""
+        return job_response("stop")
+
+    @app.route("/restart_pipeline", methods=["POST"])
+    def restart_pipeline():
+        """
+        Restart the GStreamer pipeline as a background job, with the posted 'sources' or else the
+        saved active sources.
+        """
+        data = request.get_json(silent=True) or {}
+        video_sources = data.get("sources")
+        if video_sources is not None:
+            if not isinstance(video_sources, list) or len(video_sources) == 0:
+                return jsonify({"success": False, "message": "Sources must be a non-empty list"}), 400
+            try:
+                for source in video_sources:
+                    normalize_video_source(source)
+            except ValueError as e:
+                return jsonify({"success": False, "message": str(e)}), 400
+        return job_response("restart", video_sources)
+
+    @app.route("/api/jobs/<job_id>")
+    def get_job(job_id):
+        """Get the state, stage and per-source progress of a pipeline job."""
+        job = pipeline_jobs.get_job(job_id)
+        if job is None:
+            return jsonify({"success": False, "message": f"Unknown job '{job_id}'"}), 404
+        return jsonify(job)
+
+    @app.route("/api/jobs")
+    def get_jobs():
+        """Get the queued, running and recently finished pipeline jobs, newest first."""
+        return jsonify({"jobs": pipeline_jobs.get_jobs()})
 
     @app.route("/pipeline_status")
     def pipeline_status():
         """Get the current pipeline status."""
         return jsonify({
             "running": pipeline_manager.is_running(),
-            "sources": pipeline_manager.video_sources if pipeline_manager.is_running() else []
+            "server_mode": get_server_mode(),
+            "sources": pipeline_manager.video_sources if pipeline_manager.is_running() else [],
+            "cameras": pipeline_manager.get_source_status(),
+            "latency": pipeline_manager.get_latency_stats(),
+            "count_updates": pipeline_manager.count_broadcaster.get_stats() if pipeline_manager.count_broadcaster else {},
+            "main_streams": video_stream_manager.main_stream_manager.get_status() if video_stream_manager.main_stream_manager else {},
+            "video_frames": video_stream_manager.frame_hub.get_stats(),
+            "encoder": video_stream_manager.frame_hub.encoder.get_stats(),
+            "snapshots": video_stream_manager.get_snapshot_stats(),
+            "video_clients": video_stream_manager.get_client_stats(),
+            "mosaics": video_stream_manager.mosaic_manager.get_status() if video_stream_manager.mosaic_manager else {},
+            "video_channel": video_channel_manager.get_status() if video_channel_manager else {},
+            "previews": preview_manager.get_status() if preview_manager else {},
+            "history_index": history_index.get_stats() if history_index else {},
+            "responses": response_cache.get_stats(),
+            "jobs": pipeline_jobs.get_stats()
         })
 
     @app.route("/video_feed")
     def video_feed():
-        """Stream video feed from specified camera."""
+        """
+        Stream video feed from specified camera.
+        Optional query parameters: width (pixels), quality (1-100) and max_fps.
+        """
         camera_id = request.args.get("camera_id", user_data.active_camera)
-        return video_stream_manager.get_video_feed_response(camera_id)
+        if camera_id not in user_data.data:
+            return jsonify({"error": f"Camera {camera_id} not found"}), 404
+        max_fps = request.args.get("max_fps", type=float)
+        try:
+            variant = make_variant(request.args.get("width", type=int), request.args.get("quality", type=int))
+            if max_fps is not None and not 0 < max_fps <= STREAM_MAX_FPS:
+                raise ValueError(f"max_fps must be between 0 and {STREAM_MAX_FPS}")
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return video_stream_manager.get_video_feed_response(camera_id, variant, max_fps)
+
+    @app.route("/video_mosaic")
+    def video_mosaic():
+        """
+        Stream a grid of all cameras (or of a comma separated 'cameras' subset).
+        Optional query parameters: interval (seconds between compositions), width and quality.
+        """
+        if video_stream_manager.mosaic_manager is None:
+            return jsonify({"error": "Mosaic view not available"}), 503
+        cameras = request.args.get("cameras")
+        camera_ids = [c for c in cameras.split(",") if c] if cameras else list(user_data.data.keys())
+        unknown = [c for c in camera_ids if c not in user_data.data]
+        if unknown:
+            return jsonify({"error": f"Unknown cameras: {', '.join(unknown)}"}), 404
+        if not camera_ids:
+            return jsonify({"error": "No cameras configured"}), 404
+
+        interval = request.args.get("interval", MOSAIC_INTERVAL, type=float)
+        try:
+            if not MOSAIC_MIN_INTERVAL <= interval <= MOSAIC_MAX_INTERVAL:
+                raise ValueError(f"interval must be between {MOSAIC_MIN_INTERVAL} and {MOSAIC_MAX_INTERVAL}")
+            variant = make_variant(request.args.get("width", type=int), request.args.get("quality", type=int))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return video_stream_manager.get_mosaic_response(camera_ids, interval, variant)
+
+    @app.route("/preview/<camera_id>/index.m3u8")
+    def preview_playlist(camera_id):
+        """Live HLS playlist of a camera's low-bitrate H.264 preview (starts the encoder on demand)."""
+        if preview_manager is None:
+            return jsonify({"error": "H.264 preview not available"}), 503
+        if camera_id not in user_data.data:
+            return jsonify({"error": f"Camera {camera_id} not found"}), 404
+
+        playlist = preview_manager.get_playlist(camera_id)
+        if playlist is None:
+            response = jsonify({"error": "Preview is starting, retry shortly"})
+            response.status_code = 503
+            response.headers["Retry-After"] = "2"
+            return response
+        response = Response(playlist, mimetype="application/vnd.apple.mpegurl")
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    @app.route("/preview/<camera_id>/segment_<int:sequence>.ts")
+    def preview_segment(camera_id, sequence):
+        """One MPEG-TS segment of a camera's H.264 preview."""
+        if preview_manager is None:
+            return jsonify({"error": "H.264 preview not available"}), 503
+        if camera_id not in user_data.data:
+            return jsonify({"error": f"Camera {camera_id} not found"}), 404
+
+        data = preview_manager.get_segment(camera_id, sequence)
+        if data is None:
+            return jsonify({"error": f"Segment {sequence} not available"}), 404
+        response = Response(data, mimetype="video/mp2t")
+        # Segments never change once written
+        response.headers["Cache-Control"] = "private, max-age=60"
+        return response
 
     @app.route("/get_snapshot")
     def get_snapshot():
-        """Get a snapshot from the specified camera."""
+        """
+        Get a snapshot from the specified camera.
+        Optional query parameters: width (pixels) and quality (1-100, default STREAM_JPEG_QUALITY).
+        """
         camera_id = request.args.get("camera_id", user_data.active_camera)
-        success, data = video_stream_manager.get_snapshot(camera_id)
+        width = request.args.get("width", type=int)
+        quality = request.args.get("quality", type=int)
+        variant = None
+        if width is not None or quality is not None:
+            try:
+                variant = make_variant(width, quality)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        success, data, etag = video_stream_manager.get_snapshot(camera_id, variant, request.if_none_match)
 
         if success:
-            return Response(data, mimetype='image/jpeg')
+            response = Response(data, mimetype='image/jpeg') if data is not None else Response(status=304)
+            response.set_etag(etag)
+            # Clients may keep the image but must revalidate it, which is answered with 304 until the frame changes
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
         else:
             return jsonify({"error": data}), 404 if "not found" in data else 500
 
     @app.route("/get_cameras")
     def get_cameras():
         """Return list of available cameras."""
-        return jsonify({
-            "cameras": list(user_data.data.keys()),
-            "active_camera": user_data.active_camera,
-            "available_feeds": video_stream_manager.get_available_cameras(),
-            "processing_count": len(pipeline_manager.video_sources)
-        })
+        available_feeds = video_stream_manager.get_available_cameras()
+        processing_count = len(pipeline_manager.video_sources)
+        return versioned_json(
+            (user_data.zones_version, user_data.active_camera, tuple(available_feeds), processing_count),
+            lambda: {
+                "cameras": list(user_data.data.keys()),
+                "active_camera": user_data.active_camera,
+                "available_feeds": available_feeds,
+                "processing_count": processing_count
+            })
 
     @app.route("/get_zones")
     def get_zones():
         """Return zones for all cameras."""
-        return jsonify({"data": user_data.data})
+        return versioned_json(user_data.get_version(), lambda: {"data": user_data.data})
 
     @app.route("/api/camera/<camera_id>/zones", methods=["GET"])
     def get_camera_zones(camera_id):
@@ -101,7 +282,7 @@ def register_routes(app: Flask, user_data, pipeline_manager, video_stream_manage
         if camera_id not in user_data.data:
             return jsonify({"error": f"Camera {camera_id} not found"}), 404
 
-        return jsonify({
+        return versioned_json(user_data.get_version(camera_id), lambda: {
             "camera_id": camera_id,
             "zones": user_data.data[camera_id]["zones"]
         })
@@ -109,6 +290,7 @@ def register_routes(app: Flask, user_data, pipeline_manager, video_stream_manage
         success = user_data.create_or_update_zone(camera_id, zone, top_left, bottom_right)
 
         if success:
+            mark_zones_dirty(camera_id)
             return jsonify({
                 "success": True,
                 "message": f"Zone '{zone}' created/updated for camera {camera_id}",
@@ -136,6 +318,7 @@ def register_routes(app: Flask, user_data, pipeline_manager, video_stream_manage
         success = user_data.create_or_update_zone(camera_id, zone, top_left, bottom_right)
 
         if success:
+            mark_zones_dirty(camera_id)
             return jsonify({
                 "success": True,
                 "message": f"Zone '{zone}' created/updated for camera {camera_id}",
@@ -144,12 +327,70 @@ def register_routes(app: Flask, user_data, pipeline_manager, video_stream_manage
         else:
             return jsonify({"error": "Invalid zone coordinates"}), 400
 
+    def apply_zone_changes(operations, dry_run):
+        """Apply bulk zone operations and tell Socket.IO clients about them in the next count broadcast."""
+        applied, results = user_data.apply_zone_changes(operations, dry_run)
+        if applied:
+            mark_zones_dirty(*{result["camera_id"] for result in results if result["status"] != "unchanged"})
+        summary = {}
+        for result in results:
+            summary[result["status"]] = summary.get(result["status"], 0) + 1
+        failed = summary.get("error", 0) > 0
+        return jsonify({
+            "success": not failed,
+            "applied": applied,
+            "dry_run": dry_run,
+            "summary": summary,
+            "results": results
+        }), 400 if failed else 200
+
+    @app.route("/api/zones/bulk", methods=["POST"])
+    def bulk_zones():
+        """
+        Create, update and delete zones across cameras at once: all operations are validated first and
+        applied together with a single save, or none is applied (400 with the per-operation errors).
+        Body: {"operations": [{"op": "upsert"|"delete", "camera_id", "zone", "top_left", "bottom_right"}],
+        "dry_run": false}
+        """
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get("operations"), list):
+            return jsonify({"error": "Missing 'operations' list"}), 400
+        return apply_zone_changes(data["operations"], bool(data.get("dry_run", False)))
+
+    @app.route("/api/zones/layout", methods=["GET"])
+    def export_zone_layout():
+        """
+        Export the zone layout (coordinates only) of all cameras, or of the cameras in camera_id
+        (comma separated). The result can be imported with PUT /api/zones/layout.
+        """
+        camera_ids = split_arg("camera_id")
+        if camera_ids:
+            unknown = [c for c in camera_ids if c not in user_data.data]
+            if unknown:
+                return jsonify({"error": f"Unknown cameras: {', '.join(unknown)}"}), 404
+        return jsonify(user_data.export_zone_layout(camera_ids))
+
+    @app.route("/api/zones/layout", methods=["PUT"])
+    def import_zone_layout():
+        """
+        Import a zone layout as one bulk change. Zones with unchanged coordinates keep their counts;
+        other zones of the listed cameras are deleted unless replace=false. Optional query param dry_run.
+        """
+        replace = request.args.get("replace", "true").lower() not in ("false", "0", "no")
+        dry_run = request.args.get("dry_run", "false").lower() in ("true", "1", "yes")
+        try:
+            operations = user_data.get_layout_operations(request.get_json(silent=True), replace)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return apply_zone_changes(operations, dry_run)
+
     @app.route("/api/camera/<camera_id>/zones/<zone>", methods=["DELETE"])
     def delete_camera_zone(camera_id, zone):
         """Delete a specific zone from a camera."""
         success = user_data.delete_zone(camera_id, zone)
 
         if success:
+            mark_zones_dirty(camera_id)
             return jsonify({
                 "success": True,
                 "message": f"Zone '{zone}' deleted from camera {camera_id}"
@@ -163,6 +404,7 @@ def register_routes(app: Flask, user_data, pipeline_manager, video_stream_manage
         success = user_data.reset_zone_counts(camera_id, zone)
 
         if success:
+            mark_zones_dirty(camera_id)
             return jsonify({
                 "success": True,
                 "message": f"Counts reset for zone '{zone}' in camera {camera_id}",
@@ -175,19 +417,34 @@ def register_routes(app: Flask, user_data, pipeline_manager, video_stream_manage
     def get_counts():
         """
         Return only live in/out count data for each zone.
-        Optional query param: ?camera_id=camera1
+        Optional query params: ?camera_id=camera1, ?history=false to leave out the history lists,
+        ?since=<time> to include only the history events at or after a time.
         """
-
-        def extract_counts(zones):
-            """Helper to return only in/out counts from zones dict"""
-            return {
-                zone_name: {
+        include_history = wants_history()
+        since = request.args.get("since")
+        if since is not None:
+            if history_index is None:
+                return jsonify({"error": "History index not available"}), 503
+            try:
+                since = parse_time(since)
+            except ValueError as e:
+                return jsonify({"error": f"Invalid since: {e}"}), 400
+
+        def extract_counts(camera_id, zones):
+            """Helper to return only in/out counts (and the requested history) from zones dict"""
+            counts = {}
+            for zone_name, zone_data in list(zones.items()):
+                counts[zone_name] = {
                     "in_count": zone_data.get("in_count", 0),
-                    "out_count": zone_data.get("out_count", 0),
-                    "history": zone_data.get("history", [])
+                    "out_count": zone_data.get("out_count", 0)
                 }
-                for zone_name, zone_data in zones.items()
-            }
+                if not include_history:
+                    continue
+                if since is not None:
+                    counts[zone_name]["history"] = history_index.get_zone_events(camera_id, zone_name, since)
+                else:
+                    counts[zone_name]["history"] = zone_data.get("history", [])
+            return counts
 
         camera_id = request.args.get("camera_id")
 
@@ -195,41 +452,193 @@ def register_routes(app: Flask, user_data, pipeline_manager, video_stream_manage
             if camera_id not in user_data.data:
                 return jsonify({"error": f"Camera {camera_id} not found"}), 404
 
-            zone_counts = extract_counts(user_data.data[camera_id]["zones"])
-            return jsonify({
+            return versioned_json(user_data.get_version(camera_id), lambda: {
                 "camera_id": camera_id,
-                "counts": zone_counts
+                "counts": extract_counts(camera_id, user_data.data[camera_id]["zones"])
             })
 
-        all_counts = {
-            cam_id: extract_counts(cam_data["zones"])
-            for cam_id, cam_data in user_data.data.items()
-        }
-
-        return jsonify({
-            "counts": all_counts
+        return versioned_json(user_data.get_version(), lambda: {
+            "counts": {
+                cam_id: extract_counts(cam_id, cam_data["zones"])
+                for cam_id, cam_data in list(user_data.data.items())
+            }
         })
 
     @app.route("/get_all_data", methods=["GET"])
     def get_all_data():
         """
         Return the complete data structure for all cameras or a specific one.
-        Optional query param: ?camera_id=camera1
+        Optional query params: ?camera_id=camera1, ?history=false to leave out the history lists.
         """
         camera_id = request.args.get("camera_id")
 
+        def without_history(camera_data):
+            return dict(camera_data, zones={
+                zone: {key: value for key, value in zone_data.items() if key != "history"}
+                for zone, zone_data in list(camera_data["zones"].items())
+            })
+
+        strip = without_history if not wants_history() else (lambda camera_data: camera_data)
+
         if camera_id:
             if camera_id not in user_data.data:
                 return jsonify({"error": f"Camera {camera_id} not found"}), 404
-            return jsonify({
+            return versioned_json(user_data.get_version(camera_id), lambda: {
                 "camera_id": camera_id,
-                "data": user_data.data[camera_id]
+                "data": strip(user_data.data[camera_id])
             })
 
-        return jsonify({
-            "data": user_data.data
+        return versioned_json(user_data.get_version(), lambda: {
+            "data": {cam_id: strip(cam_data) for cam_id, cam_data in list(user_data.data.items())}
         })
 
+    @app.route("/api/history", methods=["GET"])
+    def get_history():
+        """
+        Return one page of entry/exit events, oldest first.
+        Optional query params: camera_id and zone (comma separated lists), action (Entered/Exited),
+        start and end (inclusive times: 'YYYY-MM-DD HH:MM:SS', ISO 8601 or Unix seconds),
+        limit (page size) and cursor (next_cursor of the previous page).
+        """
+        if history_index is None:
+            return jsonify({"error": "History index not available"}), 503
+
+        camera_ids = split_arg("camera_id")
+        if camera_ids:
+            unknown = [c for c in camera_ids if c not in user_data.data]
+            if unknown:
+                return jsonify({"error": f"Unknown cameras: {', '.join(unknown)}"}), 404
+        actions = split_arg("action")
+        if actions:
+            actions = [action.capitalize() for action in actions]
+            invalid = [action for action in actions if action not in ("Entered", "Exited")]
+            if invalid:
+                return jsonify({"error": f"Invalid action: {', '.join(invalid)}"}), 400
+
+        try:
+            start = parse_time(request.args["start"]) if "start" in request.args else None
+            end = parse_time(request.args["end"]) if "end" in request.args else None
+            page = history_index.query(
+                camera_ids=camera_ids,
+                zones=split_arg("zone"),
+                actions=actions,
+                start=start,
+                end=end,
+                cursor=request.args.get("cursor"),
+                limit=request.args.get("limit", HISTORY_PAGE_SIZE, type=int)
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(page)
+
+    @app.route("/api/stream/counts")
+    def stream_counts():
+        """
+        Server-Sent Events stream of zone counts and occupancy (no history).
+        Optional query params: camera_id and zone (comma separated lists) and rate (events per second).
+        Reconnecting clients resume from the Last-Event-ID header.
+        """
+        if count_stream is None:
+            return jsonify({"error": "Count stream not available"}), 503
+
+        camera_ids = split_arg("camera_id")
+        if camera_ids:
+            unknown = [c for c in camera_ids if c not in user_data.data]
+            if unknown:
+                return jsonify({"error": f"Unknown cameras: {', '.join(unknown)}"}), 404
+        last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+        try:
+            return count_stream.get_stream_response(
+                camera_ids=camera_ids,
+                zones=split_arg("zone"),
+                rate=request.args.get("rate", COUNT_STREAM_RATE, type=float),
+                last_event_id=last_event_id
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    def stats_families(prefix, documentation, stats):
+        """One gauge per numeric value of a get_stats() dict, e.g. people_counter_responses_cache_hits."""
+        lines = []
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.extend(gauge_family(f"{prefix}_{key}", f"{documentation}: {key.replace('_', ' ')}", value))
+        return lines
+
+    def collect_zones():
+        tracks, entries, exits = {}, {}, {}
+        for camera_id, camera_data in list(user_data.data.items()):
+            for zone, zone_data in list(camera_data["zones"].items()):
+                tracks[camera_id, zone] = len(zone_data.get("inside_ids", []))
+                entries[camera_id, zone] = zone_data.get("in_count", 0)
+                exits[camera_id, zone] = zone_data.get("out_count", 0)
+        labels = ("camera", "zone")
+        return (gauge_family("people_counter_zone_live_tracks", "People currently counted inside a zone", tracks, labels)
+                + gauge_family("people_counter_zone_entries", "Entries counted in a zone", entries, labels)
+                + gauge_family("people_counter_zone_exits", "Exits counted in a zone", exits, labels))
+
+    def collect_pipeline():
+        lines = gauge_family("people_counter_pipeline_running", "1 if the pipeline is running", pipeline_manager.is_running())
+        sources = pipeline_manager.get_source_status()
+        lines += gauge_family("people_counter_source_state", "Supervision state of a source (1 for the current state)",
+                              {(camera_id, status["state"]): 1 for camera_id, status in sources.items()}, ("camera", "state"))
+        lines += gauge_family("people_counter_source_reconnects", "Reconnects of a source",
+                              {(camera_id,): status["reconnects"] for camera_id, status in sources.items()}, ("camera",))
+        latency = pipeline_manager.get_latency_stats()["cameras"]
+        lines += gauge_family("people_counter_latency_p95_seconds", "p95 glass-to-count latency over the last buffers",
+                              {(camera_id,): stats["p95_ms"] / 1000.0 for camera_id, stats in latency.items()
+                               if stats["samples"]}, ("camera",))
+        queues = pipeline_manager.get_queue_levels()
+        lines += gauge_family("people_counter_queue_level_buffers", "Buffers in a pipeline queue",
+                              {(name,): level["buffers"] for name, level in queues.items()}, ("queue",))
+        lines += gauge_family("people_counter_queue_max_buffers", "Buffer limit of a pipeline queue (0 = none)",
+                              {(name,): level["max_buffers"] for name, level in queues.items()}, ("queue",))
+        lines += gauge_family("people_counter_queue_level_seconds", "Duration of the data in a pipeline queue",
+                              {(name,): level["time_seconds"] for name, level in queues.items()}, ("queue",))
+        if pipeline_manager.count_broadcaster:
+            lines += stats_families("people_counter_count_updates", "Count broadcaster",
+                                    pipeline_manager.count_broadcaster.get_stats())
+        return lines
+
+    def collect_video():
+        frame_hub = video_stream_manager.frame_hub
+        frames = {(camera_id, source): stats["seq"]
+                  for camera_id, sources in frame_hub.get_stats().items() for source, stats in sources.items()}
+        lines = gauge_family("people_counter_frames_published", "Frames published to viewers", frames, ("camera", "source"))
+        viewers = {}
+        for client in video_stream_manager.get_client_stats():
+            key = (client["stream"],)
+            viewers[key] = viewers.get(key, 0) + 1
+        lines += gauge_family("people_counter_mjpeg_viewers", "Connected MJPEG video feed and mosaic clients",
+                              viewers, ("stream",))
+        lines += gauge_family("people_counter_encoder_workers", "Encoder threads", frame_hub.encoder.workers)
+        if video_channel_manager:
+            subscribers = {(room,): len(clients) for room, clients in video_channel_manager.get_status().items()}
+            lines += gauge_family("people_counter_video_channel_subscribers", "Socket.IO video channel subscribers",
+                                  subscribers, ("room",))
+        lines += stats_families("people_counter_snapshots", "Snapshot requests", video_stream_manager.get_snapshot_stats())
+        return lines
+
+    def collect_services():
+        lines = stats_families("people_counter_responses", "Conditional zone and count responses",
+                               response_cache.get_stats())
+        if history_index:
+            lines += stats_families("people_counter_history_index", "History index", history_index.get_stats())
+        if count_stream:
+            lines += stats_families("people_counter_count_stream", "Server-Sent Events count streams",
+                                    count_stream.get_stats())
+        jobs = pipeline_jobs.get_stats()
+        lines += gauge_family("people_counter_pipeline_jobs_queued", "Pipeline jobs waiting to run", jobs["queued"])
+        lines += gauge_family("people_counter_pipeline_jobs", "Known pipeline jobs by state",
+                              {(state,): count for state, count in jobs["states"].items()}, ("state",))
+        return lines
+
+    @app.route("/metrics")
+    def metrics():
+        """Prometheus metrics: hot-path counters and histograms plus component state read at scrape time."""
+        body = REGISTRY.render((collect_zones, collect_pipeline, collect_video, collect_services))
+        return Response(body, content_type=CONTENT_TYPE)
+
     @app.route("/health")
     def health_check():
         """Health check endpoint."""
@@ -4,12 +4,19 @@ Enhanced Multi-Camera Zone Visitor Counter
 - Maintains complete camera isolation through separate tracking structures
 - Includes dwell time requirements and state stability checks
 - Fixed camera switching and snapshot functionality
+- Copy-on-write state: self.data is an immutable snapshot that readers use without locks
+  (see get_snapshot); writers are serialized per camera and publish a new snapshot per update.
+  A zone's history list is copied only on updates that record events
 """
 
 import json
+import time
 import datetime
+import threading
+from contextlib import ExitStack
 from typing import Dict, Set, List, Tuple, Any, Optional
 from hailo_apps_infra.hailo_rpi_common import app_callback_class
+from metrics import SAVE_DATA_SECONDS, SAVE_DATA_BYTES, SAVE_DATA_SIZE
 from config import HISTORY_FILE, DEFAULT_ZONE_CONFIG
 
 
@@ -27,6 +34,19 @@ class MultiSourceZoneVisitorCounter(app_callback_class):
         self.person_state_buffer = {}   # {camera_id: {zone: {person_id: state_data}}}
         self.person_dwell_tracker = {}  # {camera_id: {zone: {person_id: dwell_data}}}
         
+        # Copy-on-write publishing: published dicts and lists are never modified; writers copy the zones
+        # they change (sharing the others) and replace self.data with a new top-level dict
+        self._camera_locks = {}         # {camera_id: lock serializing the writers of that camera}
+        self._camera_locks_lock = threading.Lock()
+        self._publish_lock = threading.Lock()  # serializes replacing the top-level dict
+        self._save_lock = threading.Lock()
+        
+        # Version counters, increased on every change (read by the ETag/conditional endpoints).
+        # Writers of different cameras run concurrently, so increments are made under _version_lock
+        self._version_lock = threading.Lock()
+        self.zones_version = 0          # zone configuration (cameras, zones, coordinates)
+        self.count_versions = {}        # {camera_id: version of counts, occupancy and history}
+        
         # Configuration
         self.zone_padding = 30          # pixels buffer inside zone boundaries
         self.min_dwell_frames = 3       # frames for stable state
@@ -53,6 +73,36 @@ class MultiSourceZoneVisitorCounter(app_callback_class):
             self.person_state_buffer[camera_id][zone] = {}
             self.person_dwell_tracker[camera_id][zone] = {}
 
+    def _camera_lock(self, camera_id: str) -> threading.Lock:
+        """Lock held by every writer of a camera's zones and tracking structures."""
+        lock = self._camera_locks.get(camera_id)
+        if lock is None:
+            with self._camera_locks_lock:
+                lock = self._camera_locks.setdefault(camera_id, threading.Lock())
+        return lock
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """
+        Get the current state, {camera_id: {"zones": {zone: zone_data}}}, for reading without locks.
+        A snapshot never changes after it was published and must not be modified; updates
+        publish a new one (self.data always refers to the latest).
+        """
+        return self.data
+
+    def _publish(self, zones_by_camera: Dict[str, Dict[str, Any]]) -> None:
+        """Publish new zone dicts of cameras in a new snapshot; callers hold the cameras' locks."""
+        with self._publish_lock:
+            data = dict(self.data)
+            for camera_id, zones in zones_by_camera.items():
+                data[camera_id] = dict(data.get(camera_id, {}), zones=zones)
+            self.data = data
+
+    def _replace_zone(self, camera_id: str, zone: str, zone_data: Dict[str, Any]) -> None:
+        """Publish one changed zone; callers hold the camera's lock."""
+        zones = dict(self.data[camera_id]["zones"])
+        zones[zone] = zone_data
+        self._publish({camera_id: zones})
+
     def load_data(self) -> Dict[str, Any]:
         """Load zone configurations from file or initialize defaults."""
         try:
@@ -64,8 +114,15 @@ class MultiSourceZoneVisitorCounter(app_callback_class):
     def save_data(self) -> None:
         """Persist zone configurations and counts."""
         try:
-            with open(HISTORY_FILE, "w") as f:
+            started = time.perf_counter()
+            with self._save_lock, open(HISTORY_FILE, "w") as f:
+                # Read under the lock, so a writer holding an older snapshot cannot save after a newer one.
+                # It is a snapshot, so serializing it cannot race with writers
                 json.dump(self.data, f, indent=4)
+                size = f.tell()
+            SAVE_DATA_SECONDS.observe(time.perf_counter() - started)
+            SAVE_DATA_BYTES.inc(amount=size)
+            SAVE_DATA_SIZE.set(size)
         except Exception as e:
             print(f"[ERROR] Failed to save data: {e}")
 
@@ -103,81 +160,97 @@ class MultiSourceZoneVisitorCounter(app_callback_class):
         return 0.0, 0.0
 
     def update_counts(self, camera_id: str, detected_people: Set[Tuple]) -> None:
-        """Main update method for processing detections and updating counts."""
+        """
+        Main update method for processing detections and updating counts.
+        Zones whose counts or occupancy changed are copied and published in one new snapshot.
+        """
         try:
-            # Initialize camera if new
-            if camera_id not in self.data:
-                self.data[camera_id] = {"zones": DEFAULT_ZONE_CONFIG.copy()}
-                self._init_camera(camera_id)
-            
-            active_ids = {p[0] for p in detected_people if len(p) >= 1}
-            current_time = datetime.datetime.now()
+            with self._camera_lock(camera_id):
+                self._update_counts(camera_id, detected_people)
+        except Exception as e:
+            print(f"[ERROR] Failed to update counts for {camera_id}: {e}")
+
+    def _update_counts(self, camera_id: str, detected_people: Set[Tuple]) -> None:
+        # Initialize camera if new
+        if camera_id not in self.data:
+            # Own lists per zone, so the published zones never share them with the config constant
+            self._publish({camera_id: {
+                zone: dict(zone_data, inside_ids=[], history=[]) for zone, zone_data in DEFAULT_ZONE_CONFIG.items()
+            }})
+            self._init_camera(camera_id)
+            self.mark_zones_changed(camera_id)
+        
+        camera_zones = self.data[camera_id]["zones"]
+        new_zones = None  # copy of camera_zones once a zone changed
+        active_ids = {p[0] for p in detected_people if len(p) >= 1}
+        current_time = datetime.datetime.now()
+        
+        # Process each zone for this camera
+        for zone, zone_data in camera_zones.items():
+            zone_coords = (zone_data["top_left"], zone_data["bottom_right"])
+            current_inside = set()
+            entries_to_count = []
+            exits_to_count = []
             
-            # Process each zone for this camera
-            for zone, zone_data in self.data[camera_id]["zones"].items():
-                zone_coords = (zone_data["top_left"], zone_data["bottom_right"])
-                current_inside = set()
-                entries_to_count = []
-                exits_to_count = []
-                
-                # Check each person against this zone
-                for person_data in detected_people:
-                    if len(person_data) < 1:
-                        continue
-                        
-                    person_id = person_data[0]
-                    position = self._get_person_position(person_data)
-                    is_inside = self._is_in_zone(position, zone_coords)
+            # Check each person against this zone
+            for person_data in detected_people:
+                if len(person_data) < 1:
+                    continue
                     
-                    # Update state buffer and check stability
-                    if self._update_state_buffer(camera_id, zone, person_id, is_inside):
-                        if is_inside:
-                            current_inside.add(person_id)
-                        
-                        # Update dwell tracking
-                        dwell_result = self._update_dwell_tracker(
-                            camera_id, zone, person_id, is_inside, current_time
-                        )
-                        
-                        if dwell_result['should_count']:
-                            if dwell_result['action'] == 'qualified_entry':
-                                entries_to_count.append(person_id)
-                            elif dwell_result['action'] == 'confirmed_exit':
-                                exits_to_count.append(person_id)
+                person_id = person_data[0]
+                position = self._get_person_position(person_data)
+                is_inside = self._is_in_zone(position, zone_coords)
                 
-                # Check for people who left the frame entirely
-                for person_id in list(self.person_dwell_tracker[camera_id][zone].keys()):
-                    if person_id not in active_ids:
-                        dwell_result = self._update_dwell_tracker(
-                            camera_id, zone, person_id, False, current_time
-                        )
-                        if dwell_result['should_count'] and dwell_result['action'] == 'confirmed_exit':
+                # Update state buffer and check stability
+                if self._update_state_buffer(camera_id, zone, person_id, is_inside):
+                    if is_inside:
+                        current_inside.add(person_id)
+                    
+                    # Update dwell tracking
+                    dwell_result = self._update_dwell_tracker(
+                        camera_id, zone, person_id, is_inside, current_time
+                    )
+                    
+                    if dwell_result['should_count']:
+                        if dwell_result['action'] == 'qualified_entry':
+                            entries_to_count.append(person_id)
+                        elif dwell_result['action'] == 'confirmed_exit':
                             exits_to_count.append(person_id)
-                
-                # Apply count updates
-                timestamp = current_time.strftime("%Y-%m-%d %H:%M:%S")
-                if entries_to_count:
-                    zone_data["in_count"] += len(entries_to_count)
-                    for pid in entries_to_count:
-                        zone_data["history"].append({
-                            "id": pid, "action": "Entered", "time": timestamp
-                        })
-                
-                if exits_to_count:
-                    zone_data["out_count"] += len(exits_to_count)
-                    for pid in exits_to_count:
-                        zone_data["history"].append({
-                            "id": pid, "action": "Exited", "time": timestamp
-                        })
-                
-                # Update current occupancy
-                self.inside_zones[camera_id][zone] = current_inside
-                zone_data["inside_ids"] = list(current_inside)
             
-            self.save_data()
+            # Check for people who left the frame entirely
+            for person_id in list(self.person_dwell_tracker[camera_id][zone].keys()):
+                if person_id not in active_ids:
+                    dwell_result = self._update_dwell_tracker(
+                        camera_id, zone, person_id, False, current_time
+                    )
+                    if dwell_result['should_count'] and dwell_result['action'] == 'confirmed_exit':
+                        exits_to_count.append(person_id)
             
-        except Exception as e:
-            print(f"[ERROR] Failed to update counts for {camera_id}: {e}")
+            # Apply count updates and current occupancy to a copy of the zone
+            previous_inside = self.inside_zones[camera_id].get(zone)
+            self.inside_zones[camera_id][zone] = current_inside
+            if entries_to_count or exits_to_count or current_inside != previous_inside:
+                timestamp = current_time.strftime("%Y-%m-%d %H:%M:%S")
+                events = (
+                    [{"id": pid, "action": "Entered", "time": timestamp} for pid in entries_to_count]
+                    + [{"id": pid, "action": "Exited", "time": timestamp} for pid in exits_to_count]
+                )
+                if new_zones is None:
+                    new_zones = dict(camera_zones)
+                new_zones[zone] = dict(
+                    zone_data,
+                    in_count=zone_data["in_count"] + len(entries_to_count),
+                    out_count=zone_data["out_count"] + len(exits_to_count),
+                    inside_ids=list(current_inside),
+                    # Occupancy-only changes keep sharing the published history list
+                    history=zone_data["history"] + events if events else zone_data["history"]
+                )
+        
+        # Unchanged frames publish nothing and skip the save
+        if new_zones is not None:
+            self._publish({camera_id: new_zones})
+            self.mark_counts_changed(camera_id)
+            self.save_data()
 
     def _update_state_buffer(self, camera_id: str, zone: str, 
                            person_id: int, is_inside: bool) -> bool:
@@ -304,61 +377,113 @@ class MultiSourceZoneVisitorCounter(app_callback_class):
     def reset_zone_counts(self, camera_id: str, zone: str) -> bool:
         """Reset all counts and tracking for a zone."""
         try:
-            if camera_id not in self.data or zone not in self.data[camera_id]["zones"]:
-                return False
-                
-            # Comprehensive reset of zone data
-            zone_data = self.data[camera_id]["zones"][zone]
-            zone_data["in_count"] = 0
-            zone_data["out_count"] = 0
-            zone_data["inside_ids"] = []
-            
-            # Clear tracking structures
-            if camera_id in self.inside_zones and zone in self.inside_zones[camera_id]:
-                self.inside_zones[camera_id][zone] = set()
-                
-            if camera_id in self.person_zone_history and zone in self.person_zone_history[camera_id]:
-                self.person_zone_history[camera_id][zone] = {}
-            
-            if zone in self.person_state_buffer.get(camera_id, {}):
-                self.person_state_buffer[camera_id][zone] = {}
-            if zone in self.person_dwell_tracker.get(camera_id, {}):
-                self.person_dwell_tracker[camera_id][zone] = {}
-            
-            self.save_data()
-            return True
+            with self._camera_lock(camera_id):
+                return self._reset_zone_counts(camera_id, zone)
         except Exception as e:
             print(f"[ERROR] Failed to reset zone {zone}: {e}")
             return False
 
+    def _reset_zone_counts(self, camera_id: str, zone: str) -> bool:
+        if camera_id not in self.data or zone not in self.data[camera_id]["zones"]:
+            return False
+            
+        # Comprehensive reset of zone data
+        zone_data = self.data[camera_id]["zones"][zone]
+        self._replace_zone(camera_id, zone, dict(zone_data, in_count=0, out_count=0, inside_ids=[]))
+        
+        # Clear tracking structures
+        if camera_id in self.inside_zones and zone in self.inside_zones[camera_id]:
+            self.inside_zones[camera_id][zone] = set()
+            
+        if camera_id in self.person_zone_history and zone in self.person_zone_history[camera_id]:
+            self.person_zone_history[camera_id][zone] = {}
+        
+        if zone in self.person_state_buffer.get(camera_id, {}):
+            self.person_state_buffer[camera_id][zone] = {}
+        if zone in self.person_dwell_tracker.get(camera_id, {}):
+            self.person_dwell_tracker[camera_id][zone] = {}
+        
+        self.mark_counts_changed(camera_id)
+        self.save_data()
+        return True
+
     def delete_zone(self, camera_id: str, zone: str) -> bool:
         """Delete a zone from a specific camera."""
         try:
-            if camera_id not in self.data or zone not in self.data[camera_id]["zones"]:
-                return False
-                
-            # Remove zone data
-            del self.data[camera_id]["zones"][zone]
-            
-            # Remove from all tracking structures
-            if camera_id in self.inside_zones and zone in self.inside_zones[camera_id]:
-                del self.inside_zones[camera_id][zone]
-                
-            if camera_id in self.person_zone_history and zone in self.person_zone_history[camera_id]:
-                del self.person_zone_history[camera_id][zone]
-                
-            if camera_id in self.person_state_buffer and zone in self.person_state_buffer[camera_id]:
-                del self.person_state_buffer[camera_id][zone]
-                
-            if camera_id in self.person_dwell_tracker and zone in self.person_dwell_tracker[camera_id]:
-                del self.person_dwell_tracker[camera_id][zone]
-                
-            self.save_data()
-            return True
+            with self._camera_lock(camera_id):
+                return self._delete_zone(camera_id, zone)
         except Exception as e:
             print(f"[ERROR] Failed to delete zone {zone}: {e}")
             return False
 
+    def _delete_zone(self, camera_id: str, zone: str) -> bool:
+        if camera_id not in self.data or zone not in self.data[camera_id]["zones"]:
+            return False
+            
+        # Remove zone data
+        zones = dict(self.data[camera_id]["zones"])
+        del zones[zone]
+        self._publish({camera_id: zones})
+        
+        # Remove from all tracking structures
+        if camera_id in self.inside_zones and zone in self.inside_zones[camera_id]:
+            del self.inside_zones[camera_id][zone]
+            
+        if camera_id in self.person_zone_history and zone in self.person_zone_history[camera_id]:
+            del self.person_zone_history[camera_id][zone]
+            
+        if camera_id in self.person_state_buffer and zone in self.person_state_buffer[camera_id]:
+            del self.person_state_buffer[camera_id][zone]
+            
+        if camera_id in self.person_dwell_tracker and zone in self.person_dwell_tracker[camera_id]:
+            del self.person_dwell_tracker[camera_id][zone]
+        
+        self.mark_zones_changed(camera_id)
+        self.save_data()
+        return True
+
+    def reset_cameras(self, camera_ids: List[str]) -> None:
+        """Replace all cameras with new cameras without zones (when a pipeline starts)."""
+        with ExitStack() as stack:
+            for camera_id in sorted(set(camera_ids) | set(self.data)):
+                stack.enter_context(self._camera_lock(camera_id))
+            with self._publish_lock:
+                self.data = {camera_id: {"zones": {}} for camera_id in camera_ids}
+            # Track state of the previous cameras must not carry over into the new ones
+            self.inside_zones = {camera_id: {} for camera_id in camera_ids}
+            self.person_zone_history = {camera_id: {} for camera_id in camera_ids}
+            self.person_state_buffer = {camera_id: {} for camera_id in camera_ids}
+            self.person_dwell_tracker = {camera_id: {} for camera_id in camera_ids}
+            self.active_camera = camera_ids[0] if camera_ids else "camera1"
+            self.mark_zones_changed()
+            self.save_data()
+
+    def mark_counts_changed(self, camera_id: str) -> None:
+        """Increase the count version of a camera."""
+        with self._version_lock:
+            self.count_versions[camera_id] = self.count_versions.get(camera_id, 0) + 1
+
+    def mark_zones_changed(self, *camera_ids: str) -> None:
+        """Increase the zone configuration version (and the count versions of the cameras whose zones changed)."""
+        with self._version_lock:
+            self.zones_version += 1
+            for camera_id in camera_ids:
+                self.count_versions[camera_id] = self.count_versions.get(camera_id, 0) + 1
+
+    def get_version(self, camera_id: Optional[str] = None) -> Tuple[int, int]:
+        """
+        Get the version of the zone data of one camera or of all cameras.
+        Every change of zones, counts, occupancy or history increases it.
+
+        Returns:
+            Tuple of (zone configuration version, count version); the count version of all
+            cameras is the sum of the per-camera versions, which only grows
+        """
+        if camera_id is not None:
+            return self.zones_version, self.count_versions.get(camera_id, 0)
+        with self._version_lock:
+            return self.zones_version, sum(self.count_versions.values())
+
     def set_active_camera(self, camera_id: str) -> bool:
         """Set the active camera for UI display."""
         if camera_id in self.data:
@@ -378,46 +503,211 @@ class MultiSourceZoneVisitorCounter(app_callback_class):
             if x1 >= x2 or y1 >= y2:
                 print(f"[ERROR] Invalid coordinates for zone {zone}: top_left must be less than bottom_right")
                 return False
-                
-            # Initialize camera if new
-            if camera_id not in self.data:
-                self.data[camera_id] = {"zones": {}}
-                self._init_camera(camera_id)
-                print(f"[INFO] Initialized new camera: {camera_id}")
-            
-            # Create/update zone
-            self.data[camera_id]["zones"][zone] = {
-                "top_left": [x1, y1],
-                "bottom_right": [x2, y2],
-                "in_count": 0,
-                "out_count": 0,
-                "inside_ids": [],
-                "history": []
-            }
             
-            # Initialize tracking structures if they don't exist
-            if camera_id not in self.inside_zones:
-                self.inside_zones[camera_id] = {}
-            if camera_id not in self.person_zone_history:
-                self.person_zone_history[camera_id] = {}
-            if camera_id not in self.person_state_buffer:
-                self.person_state_buffer[camera_id] = {}
-            if camera_id not in self.person_dwell_tracker:
-                self.person_dwell_tracker[camera_id] = {}
-            
-            # Initialize zone-specific tracking
-            self.inside_zones[camera_id][zone] = set()
-            self.person_zone_history[camera_id][zone] = {}
-            self.person_state_buffer[camera_id][zone] = {}
-            self.person_dwell_tracker[camera_id][zone] = {}
-            
-            self.save_data()
+            with self._camera_lock(camera_id):
+                # Initialize camera if new
+                new_camera = camera_id not in self.data
+                if new_camera:
+                    print(f"[INFO] Initialized new camera: {camera_id}")
+                
+                # Initialize tracking structures if they don't exist (always for a new camera)
+                if new_camera or camera_id not in self.inside_zones:
+                    self.inside_zones[camera_id] = {}
+                if new_camera or camera_id not in self.person_zone_history:
+                    self.person_zone_history[camera_id] = {}
+                if new_camera or camera_id not in self.person_state_buffer:
+                    self.person_state_buffer[camera_id] = {}
+                if new_camera or camera_id not in self.person_dwell_tracker:
+                    self.person_dwell_tracker[camera_id] = {}
+                
+                # Initialize zone-specific tracking
+                self.inside_zones[camera_id][zone] = set()
+                self.person_zone_history[camera_id][zone] = {}
+                self.person_state_buffer[camera_id][zone] = {}
+                self.person_dwell_tracker[camera_id][zone] = {}
+                
+                # Create/update zone
+                zones = {} if new_camera else dict(self.data[camera_id]["zones"])
+                zones[zone] = {
+                    "top_left": [x1, y1],
+                    "bottom_right": [x2, y2],
+                    "in_count": 0,
+                    "out_count": 0,
+                    "inside_ids": [],
+                    "history": []
+                }
+                self._publish({camera_id: zones})
+                
+                self.mark_zones_changed(camera_id)
+                self.save_data()
             print(f"[INFO] Created/updated zone '{zone}' for camera '{camera_id}'")
             return True
         except Exception as e:
             print(f"[ERROR] Failed to create/update zone {zone}: {e}")
             return False
 
+    @staticmethod
+    def _validate_zone_coordinates(top_left: Any, bottom_right: Any) -> Tuple[List[int], List[int]]:
+        """
+        Validate zone corners.
+
+        Raises:
+            ValueError: If a corner is not an [x, y] pair or top_left is not above and left of bottom_right
+        """
+        try:
+            x1, y1 = map(int, top_left)
+            x2, y2 = map(int, bottom_right)
+        except (TypeError, ValueError):
+            raise ValueError("top_left and bottom_right must be [x, y] pairs")
+        if x1 >= x2 or y1 >= y2:
+            raise ValueError("top_left must be less than bottom_right")
+        return [x1, y1], [x2, y2]
+
+    def apply_zone_changes(self, operations: List[Dict[str, Any]],
+                           dry_run: bool = False) -> Tuple[bool, List[Dict[str, Any]]]:
+        """
+        Validate and apply zone creates, updates and deletes across cameras all at once.
+        Either every operation is applied, with one version change and one save, or none is.
+        The new zones of all cameras are published in one snapshot, so readers never see half of
+        the changes; the locks of every camera involved are held throughout.
+
+        Args:
+            operations: List of {"op": "upsert" (default) or "delete", "camera_id", "zone",
+                        "top_left", "bottom_right"}; an upsert that changes the coordinates of an
+                        existing zone resets it like create_or_update_zone, one with unchanged
+                        coordinates leaves its counts alone
+            dry_run: Only validate
+
+        Returns:
+            Tuple of (applied: bool, results) with one {"index", "op", "camera_id", "zone",
+            "status" (created, updated, unchanged, deleted or error), "error"} per operation
+        """
+        camera_ids = {operation.get("camera_id") for operation in operations if isinstance(operation, dict)}
+        with ExitStack() as stack:
+            # Always in the same order, so two bulk changes cannot deadlock
+            for camera_id in sorted(camera_id for camera_id in camera_ids if isinstance(camera_id, str)):
+                stack.enter_context(self._camera_lock(camera_id))
+            return self._apply_zone_changes(operations, dry_run)
+
+    def _apply_zone_changes(self, operations: List[Dict[str, Any]],
+                            dry_run: bool) -> Tuple[bool, List[Dict[str, Any]]]:
+        results = []
+        new_zones = {}  # {camera_id: zones dict after the operations so far}
+        for index, operation in enumerate(operations):
+            result = {"index": index}
+            try:
+                if not isinstance(operation, dict):
+                    raise ValueError("Operation must be an object")
+                op = operation.get("op", "upsert")
+                camera_id = operation.get("camera_id")
+                zone = operation.get("zone")
+                result.update(op=op, camera_id=camera_id, zone=zone)
+                if not isinstance(camera_id, str) or not camera_id or not isinstance(zone, str) or not zone:
+                    raise ValueError("camera_id and zone are required")
+                if camera_id not in new_zones:
+                    new_zones[camera_id] = dict(self.data[camera_id]["zones"]) if camera_id in self.data else {}
+                zones = new_zones[camera_id]
+
+                if op == "upsert":
+                    top_left, bottom_right = self._validate_zone_coordinates(
+                        operation.get("top_left"), operation.get("bottom_right"))
+                    current = zones.get(zone)
+                    if current is not None and current["top_left"] == top_left and current["bottom_right"] == bottom_right:
+                        result["status"] = "unchanged"
+                    else:
+                        zones[zone] = {
+                            "top_left": top_left,
+                            "bottom_right": bottom_right,
+                            "in_count": 0,
+                            "out_count": 0,
+                            "inside_ids": [],
+                            "history": []
+                        }
+                        result["status"] = "updated" if current is not None else "created"
+                elif op == "delete":
+                    if zone not in zones:
+                        raise ValueError(f"Zone {zone} not found in camera {camera_id}")
+                    del zones[zone]
+                    result["status"] = "deleted"
+                else:
+                    raise ValueError("op must be 'upsert' or 'delete'")
+            except ValueError as e:
+                result.update(status="error", error=str(e))
+            results.append(result)
+
+        if dry_run or any(result["status"] == "error" for result in results):
+            return False, results
+
+        changed_cameras = {result["camera_id"] for result in results if result["status"] in ("created", "updated", "deleted")}
+        for camera_id in changed_cameras:
+            zones = new_zones[camera_id]
+            old_zones = self.data[camera_id]["zones"] if camera_id in self.data else {}
+            replaced = {zone for zone, zone_data in zones.items() if old_zones.get(zone) is not zone_data}
+            # Tracking first, so every zone a reader finds has tracking structures
+            for structure, empty in ((self.inside_zones, set), (self.person_zone_history, dict),
+                                     (self.person_state_buffer, dict), (self.person_dwell_tracker, dict)):
+                current = structure.get(camera_id, {})
+                structure[camera_id] = {
+                    zone: empty() if zone in replaced or zone not in current else current[zone]
+                    for zone in zones
+                }
+            if camera_id not in self.data:
+                print(f"[INFO] Initialized new camera: {camera_id}")
+
+        if changed_cameras:
+            self._publish({camera_id: new_zones[camera_id] for camera_id in changed_cameras})
+            self.mark_zones_changed(*changed_cameras)
+            self.save_data()
+        print(f"[INFO] Applied {len(operations)} zone operations to {len(changed_cameras)} cameras")
+        return True, results
+
+    def export_zone_layout(self, camera_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Get the zone coordinates of cameras, without counts or history.
+
+        Returns:
+            Dict of {"cameras": {camera_id: {"zones": {zone: {"top_left", "bottom_right"}}}}}
+        """
+        return {"cameras": {
+            camera_id: {"zones": {
+                zone: {"top_left": list(zone_data["top_left"]), "bottom_right": list(zone_data["bottom_right"])}
+                for zone, zone_data in list(camera_data["zones"].items())
+            }}
+            for camera_id, camera_data in list(self.data.items())
+            if camera_ids is None or camera_id in camera_ids
+        }}
+
+    def get_layout_operations(self, layout: Dict[str, Any], replace: bool = True) -> List[Dict[str, Any]]:
+        """
+        Turn a layout from export_zone_layout into apply_zone_changes operations.
+
+        Args:
+            layout: {"cameras": {camera_id: {"zones": {zone: {"top_left", "bottom_right"}}}}}
+            replace: Also delete the zones of the layout's cameras that the layout does not list;
+                     cameras missing from the layout are never touched
+
+        Raises:
+            ValueError: If the layout is not shaped like an export
+        """
+        cameras = layout.get("cameras") if isinstance(layout, dict) else None
+        if not isinstance(cameras, dict):
+            raise ValueError("Layout must have a 'cameras' object")
+        operations = []
+        for camera_id, camera_layout in cameras.items():
+            zones = camera_layout.get("zones") if isinstance(camera_layout, dict) else None
+            if not isinstance(zones, dict):
+                raise ValueError(f"Camera {camera_id} must have a 'zones' object")
+            for zone, coordinates in zones.items():
+                if not isinstance(coordinates, dict):
+                    raise ValueError(f"Zone {zone} of camera {camera_id} must be an object")
+                operations.append({"op": "upsert", "camera_id": camera_id, "zone": zone,
+                                   "top_left": coordinates.get("top_left"),
+                                   "bottom_right": coordinates.get("bottom_right")})
+            if replace and camera_id in self.data:
+                operations.extend({"op": "delete", "camera_id": camera_id, "zone": zone}
+                                  for zone in list(self.data[camera_id]["zones"]) if zone not in zones)
+        return operations
+
     def get_zone_stats(self, camera_id: str, zone: str) -> Optional[Dict[str, Any]]:
         """Get current statistics for a zone."""
         try:
@@ -477,13 +767,10 @@ class MultiSourceZoneVisitorCounter(app_callback_class):
         
         # Update count and log only real new entries
         if real_new_entries:
-            self.data[camera_id]["zones"][zone]["in_count"] += len(real_new_entries)
-            for p_id in real_new_entries:
-                self.data[camera_id]["zones"][zone]["history"].append({
-                    "id": p_id, 
-                    "action": "Entered", 
-                    "time": timestamp_str
-                })
+            zone_data = self.data[camera_id]["zones"][zone]
+            events = [{"id": p_id, "action": "Entered", "time": timestamp_str} for p_id in real_new_entries]
+            self._replace_zone(camera_id, zone, dict(zone_data, in_count=zone_data["in_count"] + len(real_new_entries),
+                                                     history=zone_data["history"] + events))
         
         return real_new_entries
 
@@ -504,12 +791,9 @@ class MultiSourceZoneVisitorCounter(app_callback_class):
         
         # Update count and log only real new exits
         if real_new_exits:
-            self.data[camera_id]["zones"][zone]["out_count"] += len(real_new_exits)
-            for p_id in real_new_exits:
-                self.data[camera_id]["zones"][zone]["history"].append({
-                    "id": p_id, 
-                    "action": "Exited", 
-                    "time": timestamp_str
-                })
+            zone_data = self.data[camera_id]["zones"][zone]
+            events = [{"id": p_id, "action": "Exited", "time": timestamp_str} for p_id in real_new_exits]
+            self._replace_zone(camera_id, zone, dict(zone_data, out_count=zone_data["out_count"] + len(real_new_exits),
+                                                      history=zone_data["history"] + events))
         
         return real_new_exits